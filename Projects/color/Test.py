@@ -1,16 +1,52 @@
+import argparse
 import cv2
 import numpy as np
 import time
-from datetime import datetime
 import threading
-import queue
+from datetime import datetime
 import sys
 
+from capture_config import DEFAULT_FPS, configure_capture, describe_capture, parse_size
+from color_lut import ColorLUT, LUTHighlightEngine, get_thread_lut_engine
+from color_match import COLOR_SPACES, ColorMatcher, parse_colors
+from cv_backend import calibrate, create_engine, describe, get_backend_engine
+from highlight_engine import color_ratio
+from incremental import IncrementalHighlighter
+from layout import LayoutCompositor, layout_geometry
+from overlay import OverlayRenderer
+from params import ParamStore, param_property
+from pipeline import END_OF_STREAM, POLICY_LATEST, POLICY_LOSSLESS, FramePipeline, PipelineFrame
+from profiler import Profiler
+from process_pool import ENGINE_LUT, ProcessHighlighter
+from proxy import ProxyScaler, proxy_size
+from recorder import AsyncRecorder
+from region_stats import RegionRecorder, get_thread_analyzer
+from snapshot import SnapshotService
+
 class ColorHighlightVideoProcessor:
     """多功能颜色突显视频处理器"""
     
-    def __init__(self):
-        """初始化"""
+    # 处理参数保存在 self.params 的不可变快照中：按键修改时整体替换快照，
+    # 处理线程每帧只取一次快照，一帧之内不会读到修改了一半的参数
+    mode = param_property("mode")
+    color_sensitivity = param_property("color_sensitivity")
+    min_brightness = param_property("min_brightness")
+    custom_color = param_property("custom_color")
+    use_lut = param_property("use_lut")
+    use_incremental = param_property("use_incremental")
+    
+    def __init__(self, trace_path=None, processes=None, camera_size=None, camera_fps=DEFAULT_FPS):
+        """
+        初始化
+        
+        参数:
+        - trace_path: 退出时把分阶段计时写成 Chrome trace JSON 的路径，None 表示不记录
+        - processes: 多进程后端的工作进程数，None 表示在处理线程中直接计算
+        - camera_size: 摄像头的目标分辨率 (宽, 高)，None 表示驱动默认分辨率
+        - camera_fps: 摄像头的目标帧率
+        """
+        self.params = ParamStore()
+        
         # 处理模式
         self.mode = "red"  # 默认突显红色
         self.modes = {
@@ -31,7 +67,11 @@ class ColorHighlightVideoProcessor:
         # 视频相关
         self.video_source = None     # 视频源
         self.cap = None              # 视频捕获对象
-        self.output_writer = None    # 视频写入对象
+        self.camera_size = camera_size
+        self.camera_fps = camera_fps
+        self.capture_config = None   # 摄像头协商后的采集模式
+        self.recorder = None         # 异步录制器（编码线程 + 预录缓冲）
+        self.preroll_seconds = 3     # 预录时长（秒），按下 V 时一并保存之前的画面
         self.is_recording = False    # 是否正在录制
         self.recording_path = None   # 录制保存路径
         
@@ -40,19 +80,49 @@ class ColorHighlightVideoProcessor:
         self.current_frame = 0
         self.total_frames = 0
         self.fps = 0
-        self.frame_queue = queue.Queue(maxsize=30)
-        self.display_queue = queue.Queue(maxsize=10)
-        
-        # 性能跟踪
-        self.processing_times = []
+        self.pipeline = None         # 解码/处理/显示流水线
+        self.workers = None          # 处理线程数，None 表示按 CPU 核数
+        self.processes = processes   # 多进程后端的工作进程数
+        self.process_pool = None     # 多进程后端（帧经共享内存交给工作进程）
+        self.snapshots = SnapshotService(self.build_snapshot, save_dir=".", prefix="snapshot_",
+                                         detach=self.detach_snapshot)
+        self.burst_frames = 10       # 连拍帧数
+        self.region_recorder = None  # 颜色区域统计记录（None 表示未开启）
+        
+        # 性能跟踪（各阶段耗时记录在定长环形缓冲区中）
+        self.profiler = Profiler(trace=trace_path is not None)
+        self.trace_path = trace_path
+        self.show_profile = True
         self.frame_count = 0
         self.start_time = None
         
         # 自定义颜色 (B, G, R)
-        self.custom_color = (255, 0, 0)  # 默认蓝色
+        self.custom_color = ColorMatcher([(255, 0, 0)])  # 默认蓝色，可以有多个目标颜色
+        
+        # 查找表加速（表按模式和参数缓存）
+        self.lut = ColorLUT()
+        self.use_lut = False
+        
+        # 计算后端（NumPy 参考实现 / OpenCV 原语），启动时按本机实测选择
+        self.calibration = calibrate()
+        self.backend = self.calibration["backend"]
+        
+        # 摄像头增量模式：静态区域沿用上一帧结果（按是否使用查找表与帧尺寸各一份状态，
+        # 代理预览帧与原分辨率录制帧交替处理时不会互相冲掉缓冲区）
+        self.incremental = {}
+        self.incremental_lock = threading.Lock()
+        self.use_incremental = False
+        
+        # 代理预览：缩小后处理与显示，录制和截图在原分辨率上重新处理
+        self.proxy = ProxyScaler()
+        self.use_proxy = False
+        self.proxy_max_size = (960, 540)
         
         # 显示设置
         self.display_mode = "side_by_side"  # side_by_side, split_screen, processed_only, original_only
+        self.layouts = LayoutCompositor()   # 按布局与分辨率复用的显示画布
+        self.wait_image = None
+        self.overlay = OverlayRenderer()    # 覆盖层文字贴图缓存
         self.show_info = True
         self.show_mask = False
         
@@ -64,6 +134,10 @@ class ColorHighlightVideoProcessor:
             source_id = int(source)
             self.cap = cv2.VideoCapture(source_id)
             print(f"打开摄像头 {source_id}")
+            if self.cap.isOpened():
+                # 协商采集模式（优先目标帧率下的 MJPG），驱动内部只缓冲最新一帧
+                self.capture_config = configure_capture(self.cap, self.camera_size, self.camera_fps)
+                print(f"采集模式: {describe_capture(self.capture_config)}")
         else:  # 视频文件
             self.cap = cv2.VideoCapture(source)
             print(f"打开视频文件: {source}")
@@ -80,6 +154,8 @@ class ColorHighlightVideoProcessor:
         self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.recorder = AsyncRecorder(self.fps, self.preroll_seconds)
+        self.recorder.profiler = self.profiler
         
         print(f"视频信息: {self.width}x{self.height}, {self.fps}FPS")
         if self.total_frames > 0:
@@ -87,208 +163,198 @@ class ColorHighlightVideoProcessor:
         
         return True
     
+    def get_incremental(self, use_lut, size):
+        """
+        取增量处理状态（调用方持有 incremental_lock）
+        
+        参数:
+        - use_lut: 是否使用查找表
+        - size: 帧尺寸 (宽, 高)
+        """
+        key = (use_lut, size)
+        highlighter = self.incremental.get(key)
+        if highlighter is None:
+            engine = LUTHighlightEngine(self.lut) if use_lut else create_engine(self.backend)
+            highlighter = self.incremental[key] = IncrementalHighlighter(engine)
+        return highlighter
+    
+    def get_engine(self, params=None):
+        """获取当前线程使用的突显引擎（流水线的每个处理线程各有一份缓冲区）"""
+        if (params or self.params.current).use_lut:
+            return get_thread_lut_engine(self.lut)
+        return get_backend_engine(self.backend)
+    
     def get_color_mask(self, frame, target_color):
         """
         获取颜色掩码
         
         参数:
         - frame: 输入帧 (BGR格式)
-        - target_color: 目标颜色 ('red', 'green', 'blue', 'custom')
+        - target_color: 目标颜色 ('red', 'green', 'blue', 'custom', 'complement', 'dual', 'warm', 'cool')
         
         返回:
-        - 颜色掩码 (True表示匹配目标颜色)
+        - 颜色掩码 (True表示匹配目标颜色，引擎内部缓冲区，下一帧会被覆盖)
         """
-        b, g, r = cv2.split(frame)
-        
-        if target_color == "red":
-            # 红色突出: R > G + sensitivity 且 R > B + sensitivity
-            mask = (r > g + self.color_sensitivity) & (r > b + self.color_sensitivity)
-            
-        elif target_color == "green":
-            # 绿色突出: G > R + sensitivity 且 G > B + sensitivity
-            mask = (g > r + self.color_sensitivity) & (g > b + self.color_sensitivity)
-            
-        elif target_color == "blue":
-            # 蓝色突出: B > R + sensitivity 且 B > G + sensitivity
-            mask = (b > r + self.color_sensitivity) & (b > g + self.color_sensitivity)
-            
-        elif target_color == "custom":
-            # 自定义颜色
-            target_b, target_g, target_r = self.custom_color
-            # 计算颜色距离
-            color_diff = np.sqrt(
-                (b.astype(float) - target_b) ** 2 +
-                (g.astype(float) - target_g) ** 2 +
-                (r.astype(float) - target_r) ** 2
-            )
-            mask = color_diff < self.color_sensitivity
-            
-        elif target_color == "complement":
-            # 互补色模式：保留目标颜色，其他转为互补色
-            # 这里简化为保留暖色调
-            mask = (r > 150) & (g > 100) & (b < 100)
-            
-        elif target_color == "dual":
-            # 双色模式：突出红色和蓝色
-            mask_red = (r > g + self.color_sensitivity) & (r > b + self.color_sensitivity)
-            mask_blue = (b > r + self.color_sensitivity) & (b > g + self.color_sensitivity)
-            mask = mask_red | mask_blue
-            
-        elif target_color == "warm":
-            # 暖色系：红色和黄色
-            mask_red = (r > g + self.color_sensitivity) & (r > b + self.color_sensitivity)
-            mask_yellow = (r > 150) & (g > 150) & (b < 100)
-            mask = mask_red | mask_yellow
-            
-        elif target_color == "cool":
-            # 冷色系：蓝色和青色
-            mask_blue = (b > r + self.color_sensitivity) & (b > g + self.color_sensitivity)
-            mask_cyan = (g > 150) & (b > 150) & (r < 100)
-            mask = mask_blue | mask_cyan
-            
-        else:
-            mask = np.ones(frame.shape[:2], dtype=bool)
-        
-        # 应用亮度阈值
-        brightness = 0.299 * r + 0.587 * g + 0.114 * b
-        mask = mask & (brightness > self.min_brightness)
-        
-        return mask
+        params = self.params.current
+        return self.get_engine(params).compute_mask(frame, target_color, params.color_sensitivity,
+                                              params.min_brightness, params.custom_color,
+                                              version=params.version)
     
-    def process_frame(self, frame):
-        """处理单帧图像"""
-        start_time = time.time()
-        
-        # 获取原始帧的副本
-        original = frame.copy()
-        
-        # 获取颜色掩码
-        color_mask = self.get_color_mask(frame, self.mode)
-        
-        # 计算灰度值
-        b, g, r = cv2.split(frame)
-        gray_values = (0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
-        
-        # 创建结果图像
-        result = np.zeros_like(frame)
+    def process_frame(self, frame, params, original=None, out=None):
+        """
+        处理单帧图像
         
-        # 保留目标颜色的像素
-        result[color_mask] = frame[color_mask]
+        参数:
+        - frame: 输入帧
+        - params: 本帧使用的参数快照（self.params.current）
+        - original: 原图的写入位置（布局画布上的视图），None 时复制一份
+        - out: 处理结果的写入位置，None 时分配新图像
+        """
+        start_time = time.perf_counter()
         
-        # 其他像素转为黑白
-        non_color_mask = ~color_mask
-        if np.any(non_color_mask):
-            result[non_color_mask, 0] = gray_values[non_color_mask]
-            result[non_color_mask, 1] = gray_values[non_color_mask]
-            result[non_color_mask, 2] = gray_values[non_color_mask]
+        # 获取原始帧的副本
+        if original is None:
+            original = frame.copy()
+        else:
+            np.copyto(original, frame)
+        
+        # 结果会进入显示队列，因此每帧写入独立的输出图像
+        result = np.empty_like(frame) if out is None else out
+        split_end = self.profiler.lap("split", start_time)
+        
+        # 一次完成掩码计算与灰度/彩色混合
+        if params.use_incremental and self.video_source.isdigit() and self.pipeline.processing_in_order():
+            # 增量状态必须按帧顺序更新：流水线在增量模式下按解码顺序逐帧处理，
+            # 切换前已经取走、不保证顺序的帧用普通引擎处理（锁只防止与叠加层统计并发读取）
+            with self.incremental_lock:
+                output, mask = self.get_incremental(params.use_lut, frame.shape[1::-1]).apply(
+                    frame, params.mode, params.color_sensitivity, params.min_brightness,
+                    params.custom_color, version=params.version)
+                np.copyto(result, output)
+                color_mask = mask.copy()
+            # 增量模式按块交替计算掩码与混合，整体计入 mask 阶段
+            self.profiler.lap("mask", split_end)
+        elif self.process_pool is not None:
+            # 多进程后端：帧经共享内存交给工作进程，掩码与混合整体计入 mask 阶段
+            engine = ENGINE_LUT if params.use_lut else self.backend
+            _, color_mask = self.process_pool.apply(frame, params.mode, params.color_sensitivity,
+                                                    params.min_brightness, params.custom_color, out=result,
+                                                    engine=engine, version=params.version)
+            self.profiler.lap("mask", split_end)
+        else:
+            _, color_mask = self.get_engine(params).apply(frame, params.mode, params.color_sensitivity,
+                                                          params.min_brightness, params.custom_color,
+                                                          out=result, profiler=self.profiler,
+                                                          version=params.version)
         
-        # 记录处理时间
-        process_time = time.time() - start_time
-        self.processing_times.append(process_time)
-        if len(self.processing_times) > 100:
-            self.processing_times.pop(0)
+        # 记录处理时间（拆分 + 掩码 + 混合）
+        process_time = self.profiler.lap("process", start_time) - start_time
         
         # 计算颜色像素比例
-        color_pct = np.sum(color_mask) / (frame.shape[0] * frame.shape[1]) * 100
+        color_pct = color_ratio(color_mask)
         
         return original, result, color_mask, color_pct, process_time
     
-    def create_display_frame(self, original, processed, color_mask, info):
-        """创建显示帧"""
-        # 根据显示模式组合图像
-        if self.display_mode == "side_by_side":
-            display = np.hstack([original, processed])
-            
-        elif self.display_mode == "split_screen":
-            # 上下分割
-            display = np.vstack([original, processed])
-            
-        elif self.display_mode == "processed_only":
-            display = processed.copy()
-            
-        elif self.display_mode == "original_only":
-            display = original.copy()
-            
-        elif self.display_mode == "quad_view":
-            # 四视图：原图、处理图、掩码、统计
-            mask_display = (color_mask * 255).astype(np.uint8)
-            mask_display = cv2.cvtColor(mask_display, cv2.COLOR_GRAY2BGR)
-            
-            # 创建统计图（简单版本）
-            stats_img = np.zeros((self.height // 2, self.width // 2, 3), dtype=np.uint8)
-            cv2.putText(stats_img, f"Mode: {self.mode}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-            cv2.putText(stats_img, f"Color %: {info['color_pct']:.1f}%", (10, 60),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-            cv2.putText(stats_img, f"Process: {info['process_time']*1000:.1f}ms", (10, 90),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-            
-            # 调整大小
-            resized_orig = cv2.resize(original, (self.width // 2, self.height // 2))
-            resized_proc = cv2.resize(processed, (self.width // 2, self.height // 2))
-            resized_mask = cv2.resize(mask_display, (self.width // 2, self.height // 2))
-            
-            # 组合四视图
-            top_row = np.hstack([resized_orig, resized_proc])
-            bottom_row = np.hstack([resized_mask, stats_img])
-            display = np.vstack([top_row, bottom_row])
-            
-        else:
-            display = np.hstack([original, processed])
+    def create_display_frame(self, layout, color_mask, info, profile=True):
+        """
+        创建显示帧
+        
+        参数:
+        - layout: LayoutFrame，原图和处理结果已经写在其画布上
+        - color_mask: 颜色掩码
+        - info: 帧信息（info['params'] 为本帧的参数快照）
+        - profile: 是否把耗时计入分阶段统计（截图线程重新合成时不计入）
+        """
+        start = time.perf_counter()
+        
+        # 并排/上下/单画面布局的画布已经完整，只有四视图需要缩小拼入各格
+        # （四视图按输入帧尺寸排布，代理预览时为缩小后的尺寸）
+        if layout.layout == "quad_view":
+            layout.fill_quad(color_mask, [f"Mode: {info['params'].mode}",
+                                          f"Color %: {info['color_pct']:.1f}%",
+                                          f"Process: {info['process_time']*1000:.1f}ms"])
+        display = layout.canvas
+        
+        compose_end = self.profiler.lap("compose", start) if profile else start
         
         # 添加信息覆盖层
         if self.show_info:
             display = self.add_info_overlay(display, info)
+            if profile:
+                self.profiler.lap("overlay", compose_end)
         
         return display
     
     def add_info_overlay(self, frame, info):
-        """添加信息覆盖层"""
-        overlay = frame.copy()
+        """添加信息覆盖层（直接绘制在显示画布上，文字使用缓存的贴图）"""
+        overlay = frame
+        text = self.overlay.text
+        field = self.overlay.field
+        white = (255, 255, 255)
+        params = info['params']  # 与处理本帧时的参数一致
         
         # 添加边框
         cv2.rectangle(overlay, (5, 5), (frame.shape[1] - 5, frame.shape[0] - 5), 
                      (0, 0, 0), 2)
         
         # 模式信息
-        mode_text = f"Mode: {self.modes.get(self.mode, self.mode)}"
-        cv2.putText(overlay, mode_text, (10, 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+        mode_text = f"Mode: {self.modes.get(params.mode, params.mode)}"
+        text(overlay, mode_text, (10, 30), 0.8, (0, 255, 255), 2)
         
-        # 统计信息
+        # 统计信息（数值字段只在显示的文字变化时重新光栅化）
         stats_y = 60
-        cv2.putText(overlay, f"Frame: {self.current_frame}/{self.total_frames}", 
-                   (10, stats_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        field(overlay, "frame", f"Frame: {self.current_frame}/{self.total_frames}", 
+              (10, stats_y), 0.6, white)
         
         if self.total_frames > 0:
             progress = self.current_frame / self.total_frames * 100
-            cv2.putText(overlay, f"Progress: {progress:.1f}%", 
-                       (10, stats_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        
-        cv2.putText(overlay, f"Color Pixels: {info['color_pct']:.1f}%", 
-                   (10, stats_y + 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        
-        avg_time = np.mean(self.processing_times) if self.processing_times else 0
-        cv2.putText(overlay, f"Process Time: {avg_time*1000:.1f}ms", 
-                   (10, stats_y + 75), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            field(overlay, "progress", f"Progress: {progress:.1f}%", 
+                  (10, stats_y + 25), 0.6, white)
+        
+        field(overlay, "color_pct", f"Color Pixels: {info['color_pct']:.1f}%", 
+              (10, stats_y + 50), 0.6, white)
+        
+        avg_time = self.profiler.mean_ms("process")
+        backend = "lut" if params.use_lut else self.backend
+        field(overlay, "process_time", f"Process Time: {avg_time:.1f}ms [{backend}]", 
+              (10, stats_y + 75), 0.6, white)
+        
+        if params.use_incremental and self.video_source.isdigit():
+            with self.incremental_lock:
+                ratio = self.get_incremental(params.use_lut, info['size']).recompute_ratio
+            field(overlay, "recomputed", f"Recomputed: {ratio*100:.1f}%", 
+                  (10, stats_y + 100), 0.6, white)
+        
+        if self.use_proxy:
+            field(overlay, "proxy", f"Proxy: {info['size'][0]}x{info['size'][1]}", 
+                  (10, stats_y + 150), 0.6, white)
+        
+        if 'regions' in info:
+            field(overlay, "regions", f"Regions: {len(info['regions'])}", 
+                  (10, stats_y + 125), 0.6, white)
+        
+        # 分阶段耗时（窗口内平均 / 最大）
+        if self.show_profile:
+            profile_x = max(10, frame.shape[1] - 230)
+            for i, (stage, mean_ms, max_ms) in enumerate(self.profiler.breakdown()):
+                y = 60 + i * 18
+                text(overlay, stage, (profile_x, y), 0.45, (0, 255, 0))
+                field(overlay, f"profile:{stage}", f"{mean_ms:.1f} / {max_ms:.1f}ms",
+                      (profile_x + 80, y), 0.45, (0, 255, 0))
         
         # 录制状态
         if self.is_recording:
-            cv2.putText(overlay, "RECORDING", (frame.shape[1] - 150, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-            cv2.putText(overlay, "●", (frame.shape[1] - 180, 35),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), -1)
+            text(overlay, "RECORDING", (frame.shape[1] - 150, 30), 0.8, (0, 0, 255), 2)
+            text(overlay, "●", (frame.shape[1] - 180, 35), 1, (0, 0, 255), -1)
         
         # 帮助提示
         help_y = frame.shape[0] - 20
         help_text = "R/G/B:颜色模式  +/-:敏感度  D:显示模式  S:保存帧  V:录制  Q:退出"
-        cv2.putText(overlay, help_text, (10, help_y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+        text(overlay, help_text, (10, help_y), 0.4, (200, 200, 200))
         
         # 当前参数
-        param_text = f"Sensitivity: {self.color_sensitivity}  Min Bright: {self.min_brightness}"
-        cv2.putText(overlay, param_text, (frame.shape[1] - 300, help_y),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+        param_text = f"Sensitivity: {params.color_sensitivity}  Min Bright: {params.min_brightness}"
+        text(overlay, param_text, (frame.shape[1] - 300, help_y), 0.4, (200, 200, 200))
         
         return overlay
     
@@ -301,79 +367,199 @@ class ColorHighlightVideoProcessor:
         # 设置视频编码
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # 或 'XVID', 'H264'
         
-        # 确定输出尺寸
-        if self.display_mode == "side_by_side":
-            output_width = self.width * 2
-            output_height = self.height
-        elif self.display_mode == "split_screen":
-            output_width = self.width
-            output_height = self.height * 2
-        elif self.display_mode == "quad_view":
-            output_width = self.width
-            output_height = self.height
-        else:
-            output_width = self.width
-            output_height = self.height
-        
-        # 创建VideoWriter
-        self.output_writer = cv2.VideoWriter(
-            output_path, fourcc, self.fps, (output_width, output_height)
-        )
+        # 确定输出尺寸：当前布局在原分辨率下的画布尺寸
+        canvas_shape, _ = layout_geometry(self.display_mode, self.width, self.height)
+        output_width, output_height = canvas_shape[1], canvas_shape[0]
         
-        if not self.output_writer.isOpened():
+        # 启动编码线程（预录帧为代理预览的显示帧时放大到输出尺寸）
+        if not self.recorder.start(output_path, fourcc, (output_width, output_height)):
             print(f"错误：无法创建输出视频文件 {output_path}")
             return False
         
         self.is_recording = True
         self.recording_path = output_path
-        print(f"开始录制: {output_path}")
+        print(f"开始录制: {output_path} (预录 {self.recorder.buffered_seconds:.1f} 秒)")
         
         return True
     
     def stop_recording(self):
         """停止录制"""
-        if self.is_recording and self.output_writer:
-            self.output_writer.release()
+        if self.is_recording:
+            # 先停止送帧，再等待编码线程写完缓冲区中的帧
             self.is_recording = False
-            print(f"录制已停止，保存到: {self.recording_path}")
+            self.recorder.stop()
+            print(f"录制已停止，保存到: {self.recording_path} ({self.recorder.summary()})")
             return True
         return False
     
-    def processing_thread(self):
-        """处理线程"""
+    def start_region_stats(self, output_path):
+        """开始记录颜色区域统计（.csv 为文本格式，其余为二进制）"""
+        if self.region_recorder is not None:
+            print("已经在记录区域统计")
+            return False
+        self.region_recorder = RegionRecorder(output_path)
+        print(f"开始记录区域统计: {output_path}")
+        return True
+    
+    def stop_region_stats(self):
+        """停止记录颜色区域统计"""
+        recorder = self.region_recorder
+        if recorder is None:
+            return False
+        self.region_recorder = None
+        recorder.close()
+        avg_process = self.profiler.mean_ms("process")
+        share = recorder.mean_ms / avg_process * 100 if avg_process > 0 else 0
+        print(f"区域统计已保存: {recorder.writer.path} ({recorder.frames} 帧, "
+              f"{recorder.mean_ms:.2f}ms/帧, 占处理时间 {share:.1f}%)")
+        return True
+    
+    def detach_snapshot(self, payload):
+        """截图入队时复制显示画布（画布归还后会被后面的帧复用）"""
+        display_frame, source, size, params = payload
+        return display_frame.copy(), source, size, params
+    
+    def render_still(self, frame, params, original=None, out=None):
+        """
+        处理单帧，不经过增量状态、多进程后端与分阶段统计（截图后台线程中使用，
+        不影响流水线的处理状态与屏幕上的耗时显示）
+        
+        参数:
+        - frame: 输入帧
+        - params: 参数快照
+        - original, out: 原图与处理结果的写入位置，None 时分配新图像
+        
+        返回:
+        - (原图, 处理图, 颜色掩码, 处理耗时)
+        """
+        start = time.perf_counter()
+        if original is None:
+            original = frame.copy()
+        else:
+            np.copyto(original, frame)
+        if out is None:
+            out = np.empty_like(frame)
+        _, color_mask = self.get_engine(params).apply(frame, params.mode, params.color_sensitivity,
+                                                      params.min_brightness, params.custom_color,
+                                                      out=out, version=params.version)
+        return original, out, color_mask, time.perf_counter() - start
+    
+    def build_snapshot(self, payload):
+        """生成截图的各张图像（在截图后台线程中调用）"""
+        display_frame, source, size, params = payload
+        
+        # 画布上的原图与处理结果叠加了信息层，用显示该帧时的参数快照从原始帧重新处理
+        if size == (self.width, self.height):
+            original, processed = self.render_still(source, params)[:2]
+            return [("original", original), ("processed", processed), ("display", display_frame)]
+        
+        # 代理预览的显示帧用同样的参数在原分辨率上重新合成
+        height, width = source.shape[:2]
+        layout = self.layouts.acquire(self.display_mode, width, height)
+        try:
+            _, _, color_mask, process_time = self.render_still(source, params, layout.original,
+                                                               layout.processed)
+            # 单画面布局中原图或处理结果就在画布上，绘制信息层之前复制
+            original, processed = layout.original.copy(), layout.processed.copy()
+            info = {
+                'color_pct': color_ratio(color_mask),
+                'process_time': process_time,
+                'size': (width, height),
+                'layout': layout,
+                'params': params
+            }
+            display_frame = self.create_display_frame(layout, color_mask, info, profile=False).copy()
+        finally:
+            self.layouts.release(layout)
+        return [("original", original), ("processed", processed), ("display", display_frame)]
+
+    def stream_time_ms(self):
+        """当前帧的时间戳：视频文件按帧号换算，摄像头使用运行时间"""
+        if self.video_source.isdigit():
+            return (time.time() - self.start_time) * 1000
+        return self.current_frame / self.fps * 1000
+    
+    def read_frame(self):
+        """读取下一帧（在流水线解码线程中调用），视频文件结束时返回 None"""
         while self.is_playing:
-            try:
-                # 从队列获取帧
-                frame = self.frame_queue.get(timeout=1)
-                
-                # 处理帧
-                original, processed, color_mask, color_pct, process_time = self.process_frame(frame)
-                
-                # 准备信息
-                info = {
-                    'color_pct': color_pct,
-                    'process_time': process_time
-                }
-                
-                # 创建显示帧
-                display_frame = self.create_display_frame(original, processed, color_mask, info)
-                
-                # 如果正在录制，写入视频
-                if self.is_recording and self.output_writer:
-                    self.output_writer.write(display_frame)
-                
-                # 放入显示队列
-                self.display_queue.put((display_frame, original, processed))
-                
-                # 更新帧计数
-                self.current_frame += 1
-                self.frame_count += 1
-                
-            except queue.Empty:
-                continue
-            except Exception as e:
-                print(f"处理线程错误: {e}")
-                break
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if ret:
+                self.profiler.lap("capture", start)
+                return frame
+            if not self.video_source.isdigit():  # 视频文件结束
+                return None
+            time.sleep(0.01)  # 摄像头暂时读不到帧时重试
+        return None
+    
+    def render_frame(self, frame):
+        """处理一帧并生成显示帧（在流水线处理线程中并行调用）"""
+        source = frame
+        params = self.params.current  # 整帧（包括录制帧）使用同一个参数快照
+        if self.use_proxy:
+            # 代理预览：先缩小再处理
+            start = time.perf_counter()
+            frame = self.proxy.downscale(frame, proxy_size(self.width, self.height, *self.proxy_max_size))
+            self.profiler.lap("proxy", start)
+        
+        display_frame, original, processed, info = self.compose_frame(frame, params, analyze=True)
+        
+        # 正在录制时，用同样的参数在原分辨率上生成录制帧；未录制时预录缓冲区直接保存
+        # 显示帧，不为预录在原分辨率上重复处理
+        if self.is_recording and frame is not source:
+            info['record_frame'], _, _, record_info = self.compose_frame(source, params)
+            info['record_layout'] = record_info['layout']
+        
+        return display_frame, original, processed, info
+    
+    def release_dropped(self, item):
+        """摄像头 latest 策略丢帧时归还该帧占用的布局画布（在流水线线程中调用）"""
+        if not isinstance(item, PipelineFrame) or item.result is None:
+            return
+        info = item.result[3]
+        for layout in (info['layout'], info.get('record_layout')):
+            if layout is not None:
+                self.layouts.release(layout)
+    
+    def compose_frame(self, frame, params, analyze=False):
+        """
+        处理一帧并组合显示帧
+        
+        参数:
+        - frame: 输入帧（原分辨率或代理帧）
+        - params: 参数快照
+        - analyze: 是否做颜色区域统计
+        
+        返回:
+        - (显示帧, 原图, 处理图, 信息)；显示帧是布局画布，用完后通过
+          self.layouts.release(info['layout']) 归还
+        """
+        # 处理帧：原图和处理结果直接写入布局画布
+        height, width = frame.shape[:2]
+        layout = self.layouts.acquire(self.display_mode, width, height)
+        original, processed, color_mask, color_pct, process_time = self.process_frame(
+            frame, params, layout.original, layout.processed)
+        
+        # 准备信息
+        info = {
+            'color_pct': color_pct,
+            'process_time': process_time,
+            'size': frame.shape[1::-1],
+            'layout': layout,
+            'params': params
+        }
+        
+        # 颜色区域统计（连通域分析在处理线程中完成，跟踪与写出在显示循环中按序进行）
+        # 坐标总是换算到原分辨率
+        if analyze and self.region_recorder is not None:
+            stats_start = time.perf_counter()
+            info['regions'] = get_thread_analyzer().analyze(color_mask, (self.width, self.height))
+            info['stats_time'] = time.perf_counter() - stats_start
+        
+        # 创建显示帧
+        display_frame = self.create_display_frame(layout, color_mask, info)
+        
+        return display_frame, original, processed, info
     
     def run(self):
         """主运行函数"""
@@ -394,10 +580,20 @@ class ColorHighlightVideoProcessor:
         self.is_playing = True
         self.start_time = time.time()
         
-        # 启动处理线程
-        process_thread = threading.Thread(target=self.processing_thread)
-        process_thread.daemon = True
-        process_thread.start()
+        # 多进程后端：每个工作进程至少对应一个提交帧的处理线程
+        workers = self.workers
+        if self.processes:
+            self.process_pool = ProcessHighlighter(self.processes)
+            print(f"多进程后端: 已启动 {self.process_pool.warm_up()} 个工作进程")
+            workers = max(workers or 0, self.processes)
+        
+        # 启动流水线：视频文件不丢帧，摄像头只保留最新帧
+        policy = POLICY_LATEST if self.video_source.isdigit() else POLICY_LOSSLESS
+        self.pipeline = FramePipeline(self.read_frame, self.render_frame,
+                                      workers=workers, policy=policy, on_drop=self.release_dropped)
+        self.pipeline.start()
+        print(f"流水线: {self.pipeline.workers} 个处理线程, 策略 {policy}")
+        print(f"计算后端: {describe(self.calibration)}")
         
         print("\n" + "="*60)
         print("多功能颜色突显视频处理器")
@@ -410,8 +606,15 @@ class ColorHighlightVideoProcessor:
         print("  D         - 切换显示模式")
         print("  M         - 显示/隐藏掩码")
         print("  I         - 显示/隐藏信息")
+        print("  L         - 切换查找表加速")
+        print("  T         - 切换增量模式（摄像头静态区域复用）")
+        print("  C / H     - 设置自定义颜色 / 切换其匹配颜色空间 (BGR/HSV/LAB)")
         print("  S         - 保存当前帧")
-        print("  V         - 开始/停止录制视频")
+        print("  K         - 连拍（保存接下来的若干帧）")
+        print(f"  V         - 开始/停止录制视频（包含之前 {self.preroll_seconds} 秒的预录）")
+        print("  A         - 开始/停止记录颜色区域统计")
+        print("  P         - 切换代理预览（缩小处理，录制/截图仍为原分辨率）")
+        print("  F         - 显示/隐藏分阶段耗时")
         print("  Space     - 暂停/继续播放")
         print("  Q / ESC   - 退出程序")
         print("="*60)
@@ -419,30 +622,59 @@ class ColorHighlightVideoProcessor:
         # 主显示循环
         last_key_time = time.time()
         pause_state = False
+        shown_layouts = []  # 最近显示的一帧占用的画布，下一帧显示后归还
         
         while self.is_playing:
-            if not pause_state:
-                # 读取新帧
-                ret, frame = self.cap.read()
-                if not ret:
-                    if self.video_source.isdigit():  # 摄像头
-                        continue
-                    else:  # 视频文件结束
-                        print("视频播放结束")
-                        break
-                
-                # 放入处理队列
-                try:
-                    self.frame_queue.put(frame, timeout=0.5)
-                except queue.Full:
-                    pass  # 队列满时跳过帧
+            self.pipeline.paused = pause_state
+            self.pipeline.ordered = self.use_incremental and self.video_source.isdigit()
+            display_start = None
             
-            # 从显示队列获取结果
-            try:
-                display_frame, original, processed = self.display_queue.get(timeout=0.1)
+            # 从流水线按顺序获取结果
+            item = self.pipeline.get(timeout=0.1)
+            
+            if item is END_OF_STREAM:
+                if self.pipeline.error is not None:
+                    print("处理出错，停止播放")
+                else:
+                    print("视频播放结束")
+                break
+            
+            if item is not None:
+                display_frame, original, processed, info = item.result
+                self.snapshots.publish((display_frame, item.frame, info['size'], info['params']))
+                frame_layouts = [info['layout'], info.get('record_layout')]
+                
+                # 写出区域统计记录
+                if self.region_recorder is not None and 'regions' in info:
+                    self.region_recorder.record(self.frame_count, self.stream_time_ms(), info['color_pct'],
+                                                info['regions'], info['stats_time'])
                 
-                # 显示结果
+                # 录制帧拷贝进录制器的帧槽，由编码线程写出（代理预览时录制中为原分辨率的录制帧，
+                # 预录时为显示帧，开始录制时放大到原分辨率）
+                if self.is_recording or self.recorder.preroll_enabled:
+                    record_frame = info.get('record_frame')
+                    if record_frame is None:
+                        record_frame = display_frame
+                        if self.is_recording and info['size'] != (self.width, self.height):
+                            # 开始录制前已在处理的代理帧，在这里补做原分辨率处理
+                            record_frame, _, _, record_info = self.compose_frame(item.frame, info['params'])
+                            frame_layouts.append(record_info['layout'])
+                    self.recorder.push(record_frame)
+                    self.pipeline.mark_consumed(item, "record")
+                
+                # 显示结果（imshow 与 waitKey 一起计入 display 阶段）
+                display_start = time.perf_counter()
                 cv2.imshow('Color Highlight Video Processor', display_frame)
+                self.pipeline.mark_consumed(item, "display")
+                
+                # 截图槽位只引用最近显示的一帧，上一帧的画布此时可以归还
+                for layout in shown_layouts:
+                    self.layouts.release(layout)
+                shown_layouts = frame_layouts
+                
+                # 更新帧计数
+                self.current_frame += 1
+                self.frame_count += 1
                 
                 # 计算并显示实时FPS
                 elapsed = time.time() - self.start_time
@@ -451,16 +683,18 @@ class ColorHighlightVideoProcessor:
                     if self.frame_count % 30 == 0:
                         print(f"实时FPS: {current_fps:.1f}, 处理模式: {self.mode}", end='\r')
                 
-            except queue.Empty:
-                # 显示队列为空，显示等待信息
-                if not pause_state:
-                    wait_img = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-                    cv2.putText(wait_img, "Processing...", (self.width//2-100, self.height//2),
+            elif not pause_state:
+                # 显示队列为空，显示等待信息（等待画面只生成一次）
+                if self.wait_image is None:
+                    self.wait_image = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+                    cv2.putText(self.wait_image, "Processing...", (self.width//2-100, self.height//2),
                                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                    cv2.imshow('Color Highlight Video Processor', wait_img)
+                cv2.imshow('Color Highlight Video Processor', self.wait_image)
             
             # 处理键盘输入
             key = cv2.waitKey(1) & 0xFF
+            if display_start is not None:
+                self.profiler.lap("display", display_start, self.frame_count)
             
             if key != 255 and time.time() - last_key_time > 0.2:  # 防按键抖动
                 last_key_time = time.time()
@@ -535,19 +769,29 @@ class ColorHighlightVideoProcessor:
                 elif key == ord('i'):
                     self.show_info = not self.show_info
                     print(f"显示信息: {'开' if self.show_info else '关'}")
+                    
+                elif key == ord('l'):
+                    self.use_lut = not self.use_lut
+                    print(f"查找表加速: {'开' if self.use_lut else '关'}")
+                    
+                elif key == ord('t'):
+                    self.use_incremental = not self.use_incremental
+                    print(f"增量模式: {'开' if self.use_incremental else '关'}")
+                    if self.use_incremental and not self.video_source.isdigit():
+                        print("增量模式只对摄像头输入生效")
                 
                 # 保存功能
                 elif key == ord('s'):
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    try:
-                        display_frame, original, processed = self.display_queue.get(timeout=0.5)
-                        cv2.imwrite(f"snapshot_original_{timestamp}.jpg", original)
-                        cv2.imwrite(f"snapshot_processed_{timestamp}.jpg", processed)
-                        cv2.imwrite(f"snapshot_display_{timestamp}.jpg", display_frame)
-                        print(f"截图已保存: snapshot_*_{timestamp}.jpg")
-                    except queue.Empty:
+                    # 从最近显示的一帧截图，拼图与编码在后台线程完成
+                    if self.snapshots.capture():
+                        print("截图已加入保存队列")
+                    else:
                         print("无法获取当前帧进行保存")
                 
+                elif key == ord('k'):
+                    self.snapshots.burst(self.burst_frames)
+                    print(f"连拍: 保存接下来的 {self.burst_frames} 帧")
+                
                 # 录制控制
                 elif key == ord('v'):
                     if not self.is_recording:
@@ -563,6 +807,26 @@ class ColorHighlightVideoProcessor:
                         else:
                             print("停止录制失败")
                 
+                elif key == ord('f'):
+                    self.show_profile = not self.show_profile
+                    print(f"分阶段耗时: {'开' if self.show_profile else '关'}")
+                
+                elif key == ord('p'):
+                    self.use_proxy = not self.use_proxy
+                    if self.use_proxy:
+                        width, height = proxy_size(self.width, self.height, *self.proxy_max_size)
+                        print(f"代理预览: 开 ({width}x{height})")
+                    else:
+                        print("代理预览: 关")
+                
+                # 区域统计记录
+                elif key == ord('a'):
+                    if self.region_recorder is None:
+                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                        self.start_region_stats(f"regions_{timestamp}.bin")
+                    else:
+                        self.stop_region_stats()
+                
                 # 播放控制
                 elif key == 32:  # 空格键
                     pause_state = not pause_state
@@ -574,19 +838,22 @@ class ColorHighlightVideoProcessor:
                     break
                 
                 elif key == ord('c'):
-                    # 自定义颜色选择
-                    print("自定义颜色选择 (B G R 格式):")
+                    # 自定义颜色选择（只在这里解析一次）
+                    print("自定义颜色选择 (B G R 格式，多个颜色用分号分隔):")
                     try:
-                        color_input = input("输入三个0-255的数字 (如: 0 0 255 表示红色): ")
-                        b, g, r = map(int, color_input.split())
-                        if 0 <= b <= 255 and 0 <= g <= 255 and 0 <= r <= 255:
-                            self.custom_color = (b, g, r)
-                            self.mode = "custom"
-                            print(f"自定义颜色设置为: B={b}, G={g}, R={r}")
-                        else:
-                            print("颜色值必须在0-255范围内")
-                    except:
-                        print("输入格式错误，使用默认值")
+                        color_input = input("输入三个0-255的数字 (如: 0 0 255 表示红色; 0 0 255; 255 0 0 同时匹配红色和蓝色): ")
+                        # 颜色与模式在同一个快照中生效
+                        self.params.update(custom_color=parse_colors(color_input, self.custom_color.space),
+                                           mode="custom")
+                        print(f"自定义颜色设置为: {self.custom_color}")
+                    except ValueError as e:
+                        print(f"输入格式错误，使用原来的颜色: {e}")
+                
+                elif key == ord('h'):
+                    # 自定义颜色的匹配颜色空间: BGR -> HSV -> LAB
+                    index = COLOR_SPACES.index(self.custom_color.space)
+                    self.custom_color = self.custom_color.with_space(COLOR_SPACES[(index + 1) % len(COLOR_SPACES)])
+                    print(f"自定义颜色匹配空间: {self.custom_color.space}")
         
         # 清理资源
         self.cleanup()
@@ -595,10 +862,25 @@ class ColorHighlightVideoProcessor:
         """清理资源"""
         self.is_playing = False
         
+        # 停止流水线
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        
+        # 关闭工作进程并删除共享内存
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+        
         # 停止录制
         if self.is_recording:
             self.stop_recording()
         
+        # 停止区域统计记录
+        self.stop_region_stats()
+        
+        # 等待排队的截图写完
+        self.snapshots.close()
+        
         # 释放视频资源
         if self.cap:
             self.cap.release()
@@ -615,21 +897,38 @@ class ColorHighlightVideoProcessor:
         if total_time > 0:
             print(f"平均FPS: {self.frame_count/total_time:.1f}")
         
-        if self.processing_times:
-            avg_process = np.mean(self.processing_times) * 1000
-            max_process = np.max(self.processing_times) * 1000
-            print(f"平均处理时间: {avg_process:.1f}ms")
-            print(f"最大处理时间: {max_process:.1f}ms")
+        breakdown = self.profiler.breakdown()
+        if breakdown:
+            print(f"分阶段耗时 (最近 {self.profiler.window} 次的平均 / 最大):")
+            for stage, mean_ms, max_ms in breakdown:
+                print(f"  {stage:<8} {mean_ms:.1f}ms / {max_ms:.1f}ms")
+        
+        if self.trace_path is not None:
+            events = self.profiler.write_trace(self.trace_path)
+            print(f"Chrome trace 已保存: {self.trace_path} ({events} 个事件)")
+        
+        for highlighter in self.incremental.values():
+            if highlighter.frames > 0:
+                print(f"增量模式平均重算比例: {highlighter.average_ratio * 100:.1f}%")
+        
+        if self.pipeline is not None:
+            print("流水线统计:")
+            for info in self.pipeline.metrics():
+                latency = info["latency"]
+                queue_text = f", 队列 {info['queue']}/{info['capacity']}" if "queue" in info else ""
+                print(f"  {info['stage']:<8} 帧数 {info['frames']}, 丢帧 {info['drops']}{queue_text}, "
+                      f"延迟 p50 {latency['p50_ms']:.0f}ms / p95 {latency['p95_ms']:.0f}ms / "
+                      f"p99 {latency['p99_ms']:.0f}ms")
         
         print("程序结束")
         print("="*60)
 
 # 简化版本（快速测试）
-def quick_start():
+def quick_start(trace_path=None, processes=None, camera_size=None, camera_fps=DEFAULT_FPS):
     """快速启动简化版本"""
     print("快速启动颜色突显视频处理器...")
     
-    processor = ColorHighlightVideoProcessor()
+    processor = ColorHighlightVideoProcessor(trace_path, processes, camera_size, camera_fps)
     
     # 使用默认摄像头
     if processor.initialize_video_source("0"):
@@ -638,11 +937,11 @@ def quick_start():
         print("无法打开摄像头")
 
 # 处理视频文件版本
-def process_video_file(video_path):
+def process_video_file(video_path, trace_path=None, processes=None):
     """处理指定视频文件"""
     print(f"处理视频文件: {video_path}")
     
-    processor = ColorHighlightVideoProcessor()
+    processor = ColorHighlightVideoProcessor(trace_path, processes)
     
     if processor.initialize_video_source(video_path):
         processor.run()
@@ -652,6 +951,16 @@ def process_video_file(video_path):
 # 命令行界面
 def main():
     """主程序入口"""
+    parser = argparse.ArgumentParser(description="多功能颜色突显视频处理器")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="退出时把分阶段计时写成 Chrome trace JSON（可用 chrome://tracing 或 Perfetto 打开）")
+    parser.add_argument("--processes", type=int, metavar="N",
+                        help="用 N 个工作进程处理帧（经共享内存传递，适合 CPU 密集的模式）")
+    parser.add_argument("--camera-size", type=parse_size, metavar="WxH",
+                        help="摄像头的目标分辨率，默认保持驱动默认值")
+    parser.add_argument("--camera-fps", type=float, default=DEFAULT_FPS, help="摄像头的目标帧率")
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("多功能颜色突显视频处理器")
     print("=" * 70)
@@ -674,12 +983,12 @@ def main():
         
         if choice == '1':
             print("\n启动快速版本...")
-            quick_start()
+            quick_start(args.trace, args.processes, args.camera_size, args.camera_fps)
             
         elif choice == '2':
             video_path = input("请输入视频文件路径: ").strip()
             if video_path:
-                process_video_file(video_path)
+                process_video_file(video_path, args.trace, args.processes)
             else:
                 print("请输入有效的文件路径")
                 
@@ -687,7 +996,8 @@ def main():
             cam_id = input("请输入摄像头ID (默认0): ").strip()
             cam_id = cam_id if cam_id else "0"
             
-            processor = ColorHighlightVideoProcessor()
+            processor = ColorHighlightVideoProcessor(args.trace, args.processes,
+                                                     args.camera_size, args.camera_fps)
             if processor.initialize_video_source(cam_id):
                 processor.run()
                 
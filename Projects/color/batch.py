@@ -0,0 +1,345 @@
+"""
+无界面批量转码
+
+对目录或通配符匹配到的视频批量应用颜色突显，通过 cv2.VideoWriter 写出结果，
+不需要 cv2.imshow 或 Tk 界面。
+
+- 多个文件在进程池中并行处理
+- 长视频按关键帧对齐切分成若干段并行处理，最后按顺序拼接
+- random 模式的颜色按帧号确定，分段并行的结果与顺序处理逐字节一致
+- 重复的输入只处理一次；输出文件同名时加序号后缀；某个文件处理出错时只跳过
+  该文件并删除它的分段，其余文件照常完成
+- 结束时报告总吞吐量 (帧/秒)
+
+用法:
+    python batch.py videos/ --output out --mode red
+    python batch.py "clips/*.mp4" --jobs 4 --segments 4 --sensitivity 25
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from color_lut import ColorLUT, LUTHighlightEngine
+from color_match import COLOR_SPACES, parse_colors
+from color_schedule import DEFAULT_WINDOW_SECONDS, RANDOM_MODE, RandomColorSchedule
+from frame_index import load_or_build_index
+from highlight_engine import COLOR_MODES, HighlightEngine
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv")
+
+# 短于该帧数的视频不再切分
+MIN_SEGMENT_FRAMES = 300
+
+
+def collect_inputs(patterns):
+    """展开目录与通配符，返回去重后的视频文件列表"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in sorted(os.listdir(pattern)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    paths.append(os.path.join(pattern, name))
+        else:
+            paths.extend(sorted(glob.glob(pattern)) or ([pattern] if os.path.isfile(pattern) else []))
+
+    seen = set()
+    return [p for p in paths if not (p in seen or seen.add(p))]
+
+
+def probe_video(path):
+    """读取视频的帧数、帧率与尺寸"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return None
+    info = {
+        "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 30,
+        "size": (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+    }
+    cap.release()
+    return info
+
+
+def plan_segments(path, total_frames, segments):
+    """
+    按关键帧对齐切分视频
+
+    返回:
+    - [(起始帧, 结束帧), ...]，结束帧不包含在段内
+    """
+    segments = min(segments, max(1, total_frames // MIN_SEGMENT_FRAMES))
+    if segments <= 1:
+        return [(0, total_frames)]
+
+    keyframes = [index for index, _ in load_or_build_index(path).keyframes]
+    bounds = [0]
+    for i in range(1, segments):
+        ideal = total_frames * i // segments
+        # 取不早于理想位置的第一个关键帧，段起点解码时不需要回溯
+        candidates = [k for k in keyframes if k >= ideal and k > bounds[-1]]
+        if candidates and candidates[0] < total_frames:
+            bounds.append(candidates[0])
+    bounds.append(total_frames)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def process_segment(task):
+    """
+    处理视频的一段（在工作进程中执行）
+
+    返回:
+    - {"frames": 处理帧数, "seconds": 耗时}
+    """
+    start_time = time.perf_counter()
+    config = task["config"]
+
+    cap = cv2.VideoCapture(task["source"])
+    if task["start"] > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, task["start"])
+
+    fourcc = cv2.VideoWriter_fourcc(*config["codec"])
+    writer = cv2.VideoWriter(task["output"], fourcc, task["fps"], task["size"])
+    if not writer.isOpened():
+        cap.release()
+        raise RuntimeError(f"无法创建输出视频文件 {task['output']}")
+
+    engine = LUTHighlightEngine(ColorLUT()) if config["lut"] else HighlightEngine()
+    schedule = RandomColorSchedule(config["seed"], config["random_window"], task["fps"])
+    frames = 0
+    try:
+        while frames < task["end"] - task["start"]:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            # random 模式按视频内的绝对帧号取颜色，与分段方式无关
+            mode = schedule.resolve(config["mode"], "frame", task["start"] + frames)
+            result, _ = engine.apply(frame, mode, config["sensitivity"],
+                                     config["brightness"], config["custom_color"])
+            writer.write(result)
+            frames += 1
+    finally:
+        cap.release()
+        writer.release()
+
+    return {"frames": frames, "seconds": time.perf_counter() - start_time}
+
+
+def concat_segments(segment_paths, output_path, fps, size, codec):
+    """按顺序拼接各段；有 ffmpeg 时直接复制码流，否则解码后重新编码"""
+    if len(segment_paths) == 1:
+        shutil.move(segment_paths[0], output_path)
+        return
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        list_path = output_path + ".txt"
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                        "-i", list_path, "-c", "copy", output_path], check=True)
+        os.remove(list_path)
+    else:
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+            cap.release()
+        writer.release()
+
+    remove_segments(segment_paths)
+
+
+def remove_segments(segment_paths):
+    """删除已写出的分段文件（失败的段可能没有文件）"""
+    for path in segment_paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def output_path_for(source, output_dir, config, taken=None):
+    """
+    结果文件路径: <输出目录>/<原文件名>_<模式>.mp4
+
+    参数:
+    - taken: 本批已分配的路径集合；同名时（不同目录下的 clip.mp4，或 clip.mp4 与
+      clip.avi）依次加后缀 _2、_3……，分配的路径会加入该集合
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(output_dir, f"{stem}_{config['mode']}.mp4")
+    if taken is None:
+        return path
+    suffix = 2
+    while path in taken:
+        path = os.path.join(output_dir, f"{stem}_{config['mode']}_{suffix}.mp4")
+        suffix += 1
+    taken.add(path)
+    return path
+
+
+def transcode(sources, output_dir, config, jobs=None, segments=None):
+    """
+    批量转码
+
+    参数:
+    - sources: 视频文件列表（同一文件重复出现时只处理一次）
+    - output_dir: 输出目录
+    - config: 处理参数 (mode, sensitivity, brightness, custom_color, seed, random_window, lut, codec)
+    - jobs: 工作进程数，默认 CPU 核数
+    - segments: 每个视频最多切分的段数，默认等于工作进程数
+
+    返回:
+    - 汇总信息
+    """
+    jobs = jobs or os.cpu_count() or 1
+    segments = segments or jobs
+    segment_dir = os.path.join(output_dir, ".segments")
+    os.makedirs(segment_dir, exist_ok=True)
+
+    # 同一文件的不同写法（相对/绝对路径）只处理一次
+    unique = {}
+    for source in sources:
+        unique.setdefault(os.path.abspath(source), source)
+    sources = list(unique.values())
+
+    # 规划任务（分段文件名带文件序号，同名的输入不会写同一个分段文件）
+    files = {}
+    tasks = []
+    taken = set()
+    for index, source in enumerate(sources):
+        info = probe_video(source)
+        if info is None or info["frames"] <= 0:
+            print(f"跳过无法读取的视频: {source}")
+            continue
+
+        stem = os.path.splitext(os.path.basename(source))[0]
+        output_path = output_path_for(source, output_dir, config, taken)
+        plan = plan_segments(source, info["frames"], segments)
+        parts = []
+        for i, (start, end) in enumerate(plan):
+            part_path = os.path.join(segment_dir, f"{index:04d}_{stem}_part{i:03d}.mp4")
+            parts.append(part_path)
+            tasks.append({"file": index, "source": source, "start": start, "end": end, "output": part_path,
+                          "fps": info["fps"], "size": info["size"], "config": config})
+        files[index] = {"source": source, "output": output_path, "info": info, "parts": parts,
+                        "pending": len(plan), "frames": 0, "error": None}
+        print(f"{source}: {info['frames']} 帧, 切分为 {len(plan)} 段 -> {output_path}")
+
+    # 并行处理所有段，某个文件的段全部完成后立即拼接；出错的文件只跳过它自己
+    start_time = time.perf_counter()
+    total_frames = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(process_segment, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            entry = files[task["file"]]
+            entry["pending"] -= 1
+            try:
+                result = future.result()
+            except Exception as e:
+                if entry["error"] is None:
+                    entry["error"] = e
+            else:
+                entry["frames"] += result["frames"]
+                total_frames += result["frames"]
+
+            if entry["pending"] > 0:
+                continue
+            if entry["error"] is None:
+                info = entry["info"]
+                try:
+                    concat_segments(entry["parts"], entry["output"], info["fps"], info["size"],
+                                    config["codec"])
+                except Exception as e:
+                    entry["error"] = e
+            if entry["error"] is None:
+                print(f"完成: {entry['output']} ({entry['frames']} 帧)")
+            else:
+                remove_segments(entry["parts"])
+                failed.append(entry["source"])
+                print(f"失败: {entry['source']} ({entry['error']})")
+
+    elapsed = time.perf_counter() - start_time
+    if not os.listdir(segment_dir):
+        os.rmdir(segment_dir)
+
+    return {
+        "files": len(files) - len(failed),
+        "failed": failed,
+        "frames": total_frames,
+        "seconds": elapsed,
+        "fps": total_frames / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    """主程序入口"""
+    parser = argparse.ArgumentParser(description="颜色突显批量转码（无界面）")
+    parser.add_argument("inputs", nargs="+", help="视频文件、目录或通配符")
+    parser.add_argument("--output", default="output", help="输出目录")
+    parser.add_argument("--mode", default="red", choices=COLOR_MODES + (RANDOM_MODE,), help="颜色模式")
+    parser.add_argument("--sensitivity", type=int, default=20, help="颜色敏感度")
+    parser.add_argument("--brightness", type=int, default=30, help="最小亮度阈值")
+    parser.add_argument("--custom", default="255,0,0",
+                        help="custom 模式的目标颜色 B,G,R，多个颜色用分号分隔")
+    parser.add_argument("--color-space", choices=COLOR_SPACES, default="bgr",
+                        help="custom 模式的匹配颜色空间")
+    parser.add_argument("--seed", type=int, default=0, help="random 模式的随机种子")
+    parser.add_argument("--random-window", type=float, default=DEFAULT_WINDOW_SECONDS,
+                        help="random 模式颜色保持不变的时间窗口（秒）")
+    parser.add_argument("--lut", action="store_true", help="使用查找表计算掩码")
+    parser.add_argument("--codec", default="mp4v", help="输出编码 FourCC")
+    parser.add_argument("--jobs", type=int, default=None, help="工作进程数")
+    parser.add_argument("--segments", type=int, default=None, help="每个视频最多切分的段数")
+    args = parser.parse_args()
+
+    sources = collect_inputs(args.inputs)
+    if not sources:
+        print("没有找到视频文件")
+        return
+
+    config = {
+        "mode": args.mode,
+        "sensitivity": args.sensitivity,
+        "brightness": args.brightness,
+        "custom_color": parse_colors(args.custom, args.color_space),
+        "seed": args.seed,
+        "random_window": args.random_window,
+        "lut": args.lut,
+        "codec": args.codec,
+    }
+
+    print("=" * 60)
+    print(f"批量转码: {len(sources)} 个文件, 模式 {args.mode}")
+    print("=" * 60)
+
+    summary = transcode(sources, args.output, config, args.jobs, args.segments)
+
+    print("=" * 60)
+    print(f"文件数: {summary['files']}")
+    if summary["failed"]:
+        print(f"失败: {len(summary['failed'])} 个文件")
+        for source in summary["failed"]:
+            print(f"  {source}")
+    print(f"总帧数: {summary['frames']}")
+    print(f"总时间: {summary['seconds']:.1f}秒")
+    print(f"总吞吐量: {summary['fps']:.1f} 帧/秒")
+    print("=" * 60)
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
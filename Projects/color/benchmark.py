@@ -0,0 +1,458 @@
+"""
+颜色突显基准测试
+
+使用可复现的合成帧离线测量每帧耗时，无需摄像头或图形界面:
+
+- kernel: 旧版逐通道实现、highlight_engine 融合内核、cv_backend OpenCV 原语后端与 color_lut 查找表内核
+- modes:  Test.py 中 get_color_mask 的全部颜色模式
+- split:  main.py 中 VideoSplitColorProcessor.process_frame 的全部分割模式
+- tiles:  4K 四分屏在不同线程数下的分块处理
+- pool:   1080p / 4K 下多线程与多进程（共享内存）后端在不同并发数下的吞吐量
+
+合成帧覆盖 720p / 1080p / 4K 与多种颜色分布（大面积红色、大面积灰色、混合、噪声）。
+每项报告 p50/p95/p99 每帧耗时与帧率，并报告进程峰值内存；结果可保存为 JSON 基线，
+之后用 --compare 对比，内核改动造成的性能回退会直接显示出来。
+modes / split 测试固定使用 --backend 指定的计算后端（不按本机实测选择），后端记录在
+基线与结果键中，不同后端的结果不会互相对比。
+
+用法:
+    python benchmark.py
+    python benchmark.py --suite modes split --resolutions 720p 1080p
+    python benchmark.py --suite modes split --backend opencv
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --tolerance 15
+    python benchmark.py --tiles 1 2 4 8
+    python benchmark.py --processes 1 2 4 8
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from color_lut import ColorLUT, LUTHighlightEngine
+from cv_backend import BACKEND_NUMPY, BACKENDS, OpenCVHighlightEngine
+from highlight_engine import COLOR_MODES, HighlightEngine, get_thread_engine
+from process_pool import ProcessHighlighter
+from tile_pool import TilePool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESOLUTIONS = {
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+    "4K": (2160, 3840),
+}
+
+
+DISTRIBUTIONS = ("mixed", "mostly_red", "mostly_gray", "noise")
+
+SUITES = ("kernel", "modes", "split")
+
+# 多线程 / 多进程后端对比的分辨率
+PROCESS_RESOLUTIONS = ("1080p", "4K")
+
+# main.py 的分割模式
+SPLIT_MODES = ("none", "horizontal", "vertical", "both")
+
+
+def make_frame(height, width, seed=0):
+    """生成带有大块颜色区域的合成帧"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    # 叠加几块纯色区域，使掩码既有匹配也有不匹配
+    cv2.rectangle(frame, (0, 0), (width // 3, height // 2), (30, 30, 220), -1)
+    cv2.rectangle(frame, (width // 2, height // 2), (width, height), (200, 60, 40), -1)
+    return frame
+
+
+def make_scene(height, width, distribution, seed=0):
+    """
+    按颜色分布生成合成帧
+
+    参数:
+    - distribution: mixed (噪声加纯色块) / mostly_red (大面积红色) /
+      mostly_gray (大面积灰色) / noise (均匀噪声)
+    """
+    if distribution == "mixed":
+        return make_frame(height, width, seed)
+
+    rng = np.random.default_rng(seed)
+    if distribution == "noise":
+        return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    noise = rng.integers(-12, 13, (height, width, 3), dtype=np.int16)
+    if distribution == "mostly_red":
+        base = np.array([40, 45, 200], dtype=np.int16)
+        frame = np.clip(base + noise, 0, 255).astype(np.uint8)
+        # 约 20% 的灰色区域
+        cv2.rectangle(frame, (0, 0), (width // 2, height * 2 // 5), (128, 128, 128), -1)
+    elif distribution == "mostly_gray":
+        shade = rng.integers(60, 200, (height, width, 1), dtype=np.int16)
+        frame = np.clip(shade + noise, 0, 255).astype(np.uint8)
+        # 约 5% 的红色区域
+        cv2.rectangle(frame, (width // 4, height // 4), (width // 4 + width // 5, height // 4 + height // 4),
+                      (30, 30, 220), -1)
+    else:
+        raise ValueError(f"未知的颜色分布: {distribution}")
+    return frame
+
+
+def make_frames(height, width, distribution, frame_count):
+    """生成测试帧序列（最多 4 帧不同内容循环使用）"""
+    frames = [make_scene(height, width, distribution, seed) for seed in range(min(frame_count, 4))]
+    return [frames[i % len(frames)] for i in range(frame_count)]
+
+
+def legacy_highlight(frame, sensitivity, min_brightness):
+    """旧版实现（red 模式），作为对照"""
+    b, g, r = cv2.split(frame)
+    mask = (r > g + sensitivity) & (r > b + sensitivity)
+    brightness = 0.299 * r + 0.587 * g + 0.114 * b
+    mask = mask & (brightness > min_brightness)
+
+    gray_values = brightness.astype(np.uint8)
+    result = np.zeros_like(frame)
+    result[mask] = frame[mask]
+    non_mask = ~mask
+    result[non_mask, 0] = gray_values[non_mask]
+    result[non_mask, 1] = gray_values[non_mask]
+    result[non_mask, 2] = gray_values[non_mask]
+    return result, mask
+
+
+def time_frames(func, frames):
+    """对给定帧逐一调用 func，返回每帧耗时（秒）"""
+    func(frames[0])  # 预热，分配缓冲区
+    times = []
+    for frame in frames:
+        start = time.perf_counter()
+        func(frame)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def time_concurrent(func, frames, workers):
+    """
+    用 workers 个线程并发处理帧序列
+
+    返回:
+    - 相邻两帧完成时刻的间隔（秒），均值即吞吐量的倒数
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(func, frames[:workers]))  # 预热，分配缓冲区
+        done = []
+
+        def run(frame):
+            func(frame)
+            done.append(time.perf_counter())
+
+        start = time.perf_counter()
+        list(executor.map(run, frames))
+    return np.diff([start] + sorted(done))
+
+
+def summarize(suite, resolution, distribution, kernel, times):
+    """把每帧耗时汇总为一行结果"""
+    ms = times * 1000
+    mean_ms = float(ms.mean())
+    p50, p95, p99 = (float(v) for v in np.percentile(ms, (50, 95, 99)))
+    return {
+        "suite": suite,
+        "resolution": resolution,
+        "distribution": distribution,
+        "kernel": kernel,
+        "mean_ms": mean_ms,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "fps": 1000.0 / mean_ms if mean_ms > 0 else 0.0,
+    }
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存 (MB)，平台不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_kernel_benchmark(frame_count, mode, sensitivity, min_brightness, resolutions=None):
+    """逐分辨率比较旧版实现、融合内核、OpenCV 原语后端与查找表内核"""
+    engine = HighlightEngine()
+    cv_engine = OpenCVHighlightEngine()
+    lut_engine = LUTHighlightEngine(ColorLUT())
+    results = []
+
+    for name in resolutions or RESOLUTIONS:
+        height, width = RESOLUTIONS[name]
+        frames = make_frames(height, width, "mixed", frame_count)
+
+        candidates = {
+            "engine": lambda f: engine.apply(f, mode, sensitivity, min_brightness),
+            "opencv": lambda f: cv_engine.apply(f, mode, sensitivity, min_brightness),
+            "lut": lambda f: lut_engine.apply(f, mode, sensitivity, min_brightness),
+        }
+        if mode == "red":
+            candidates["legacy"] = lambda f: legacy_highlight(f, sensitivity, min_brightness)
+
+        for label, func in candidates.items():
+            results.append(summarize("kernel", name, "mixed", label, time_frames(func, frames)))
+
+    return results
+
+
+def run_mode_benchmark(frame_count, resolutions, distributions, sensitivity, min_brightness,
+                       backend=BACKEND_NUMPY):
+    """Test.py 的 get_color_mask 在每种颜色模式与颜色分布下的耗时（固定计算后端）"""
+    from Test import ColorHighlightVideoProcessor
+
+    processor = ColorHighlightVideoProcessor()
+    processor.backend = backend
+    processor.color_sensitivity = sensitivity
+    processor.min_brightness = min_brightness
+    results = []
+
+    for name in resolutions:
+        height, width = RESOLUTIONS[name]
+        for distribution in distributions:
+            frames = make_frames(height, width, distribution, frame_count)
+            for mode in COLOR_MODES:
+                times = time_frames(lambda f: processor.get_color_mask(f, mode), frames)
+                results.append(dict(summarize("modes", name, distribution, mode, times), backend=backend))
+
+    return results
+
+
+def run_split_benchmark(frame_count, resolutions, distributions, sensitivity, min_brightness,
+                        backend=BACKEND_NUMPY):
+    """main.py 的 process_frame 在每种分割模式下的耗时（不创建界面，固定计算后端）"""
+    try:
+        from main import VideoSplitColorProcessor
+    except ImportError as e:
+        print(f"跳过分割模式测试: 无法导入 main.py ({e})")
+        return []
+
+    processor = VideoSplitColorProcessor()
+    processor.backend = backend
+    processor.color_sensitivity = sensitivity
+    processor.min_brightness = min_brightness
+    results = []
+
+    try:
+        for name in resolutions:
+            height, width = RESOLUTIONS[name]
+            for distribution in distributions:
+                frames = make_frames(height, width, distribution, frame_count)
+                for split_mode in SPLIT_MODES:
+                    processor.split_mode = split_mode
+                    times = time_frames(processor.process_frame, frames)
+                    results.append(dict(summarize("split", name, distribution, split_mode, times),
+                                        backend=backend))
+    finally:
+        processor.tile_pool.shutdown()
+
+    return results
+
+
+def run_tile_benchmark(frame_count, worker_counts, sensitivity, min_brightness):
+    """4K 四分屏在不同线程数下的分块处理吞吐量"""
+    height, width = RESOLUTIONS["4K"]
+    frame = make_frame(height, width)
+    result = np.empty_like(frame)
+    half_h, half_w = height // 2, width // 2
+    regions = [
+        (slice(0, half_h), slice(0, half_w), "red"),
+        (slice(0, half_h), slice(half_w, width), "green"),
+        (slice(half_h, height), slice(0, half_w), "blue"),
+        (slice(half_h, height), slice(half_w, width), "warm"),
+    ]
+
+    def process_tile(rows, cols, mode):
+        get_thread_engine().apply(frame[rows, cols], mode, sensitivity, min_brightness,
+                                  out=result[rows, cols])
+
+    results = []
+    for workers in worker_counts:
+        pool = TilePool(workers)
+        times = time_frames(lambda f: pool.run(regions, process_tile), [frame] * frame_count)
+        pool.shutdown()
+        results.append(summarize("tiles", "4K", "mixed", f"tiles x{workers}", times))
+
+    return results
+
+
+def run_process_benchmark(frame_count, worker_counts, mode, sensitivity, min_brightness):
+    """
+    多线程与多进程后端的吞吐量对比
+
+    两种后端都由 N 个线程并发提交帧（与流水线的处理线程相同）；线程后端在线程内
+    直接计算，进程后端经共享内存交给 N 个工作进程计算。每帧的结果与掩码都复制到
+    调用方独有的内存中，两边的复制量相同。
+    """
+    results = []
+    for name in PROCESS_RESOLUTIONS:
+        height, width = RESOLUTIONS[name]
+        frames = make_frames(height, width, "mixed", frame_count)
+
+        def process_in_thread(frame):
+            _, mask = get_thread_engine().apply(frame, mode, sensitivity, min_brightness,
+                                                out=np.empty_like(frame))
+            return mask.copy()
+
+        for workers in worker_counts:
+            times = time_concurrent(process_in_thread, frames, workers)
+            results.append(summarize("pool", name, "mixed", f"threads x{workers}", times))
+
+            pool = ProcessHighlighter(workers)
+            try:
+                pool.warm_up()
+                times = time_concurrent(lambda f: pool.apply(f, mode, sensitivity, min_brightness),
+                                        frames, workers)
+            finally:
+                pool.shutdown()
+            results.append(summarize("pool", name, "mixed", f"procs x{workers}", times))
+
+    return results
+
+
+def result_key(row):
+    """结果行的唯一键，用于与基线对比（固定了计算后端的测试带上后端名）"""
+    key = f"{row['suite']}/{row['resolution']}/{row['distribution']}/{row['kernel']}"
+    if "backend" in row:
+        key += f"@{row['backend']}"
+    return key
+
+
+def print_results(results):
+    """打印结果表格"""
+    print(f"{'测试':<7}{'分辨率':<7}{'颜色分布':<13}{'内核/模式':<12}"
+          f"{'p50(ms)':>9}{'p95(ms)':>9}{'p99(ms)':>9}{'FPS':>9}")
+    print("-" * 79)
+    for row in results:
+        print(f"{row['suite']:<7}{row['resolution']:<8}{row['distribution']:<14}{row['kernel']:<14}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['fps']:>9.1f}")
+
+
+def environment_info(args):
+    """记录到基线中的运行环境"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "frames": args.frames,
+        "sensitivity": args.sensitivity,
+        "brightness": args.brightness,
+        "backend": args.backend,
+    }
+
+
+def save_baseline(path, results, args):
+    """保存 JSON 基线"""
+    data = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": environment_info(args),
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"基线已保存: {path}")
+
+
+def compare_baseline(path, results, tolerance):
+    """
+    与 JSON 基线对比 p50 耗时
+
+    返回:
+    - 超出容差的回退项数量
+    """
+    with open(path, encoding="utf-8") as f:
+        baseline = {result_key(row): row for row in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\n与基线对比 ({path}，容差 {tolerance:.0f}%):")
+    for row in results:
+        old = baseline.get(result_key(row))
+        if old is None or old["p50_ms"] <= 0:
+            continue
+        change = (row["p50_ms"] / old["p50_ms"] - 1) * 100
+        flag = ""
+        if change > tolerance:
+            flag = "  <-- 回退"
+            regressions += 1
+        print(f"  {result_key(row):<44}{old['p50_ms']:>9.2f} -> {row['p50_ms']:>9.2f} ms "
+              f"({change:+.1f}%){flag}")
+    print(f"回退项: {regressions}")
+    return regressions
+
+
+def main():
+    """主程序入口"""
+    parser = argparse.ArgumentParser(description="颜色突显基准测试")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES), help="要运行的测试")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS),
+                        help="测试的分辨率")
+    parser.add_argument("--distributions", nargs="+", choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS),
+                        help="modes / split 测试使用的颜色分布")
+    parser.add_argument("--frames", type=int, default=30, help="每项测试的帧数")
+    parser.add_argument("--mode", default="red", help="kernel 测试的颜色模式 (只有 red 会与旧版对照)")
+    parser.add_argument("--sensitivity", type=int, default=20, help="颜色敏感度")
+    parser.add_argument("--brightness", type=int, default=30, help="最小亮度阈值")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=BACKEND_NUMPY,
+                        help="modes / split 测试固定使用的计算后端")
+    parser.add_argument("--tiles", type=int, nargs="*", metavar="N",
+                        help="测试 4K 分块处理的线程数列表，如 --tiles 1 2 4 8")
+    parser.add_argument("--processes", type=int, nargs="*", metavar="N",
+                        help="对比 1080p / 4K 下多线程与多进程后端的并发数列表，如 --processes 1 2 4 8")
+    parser.add_argument("--save", metavar="JSON", help="把结果保存为基线")
+    parser.add_argument("--compare", metavar="JSON", help="与基线对比，有回退时返回非零退出码")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="判定为回退的 p50 增幅 (%%)")
+    args = parser.parse_args()
+
+    results = []
+    if "kernel" in args.suite:
+        results += run_kernel_benchmark(args.frames, args.mode, args.sensitivity, args.brightness,
+                                        args.resolutions)
+    if "modes" in args.suite:
+        results += run_mode_benchmark(args.frames, args.resolutions, args.distributions,
+                                      args.sensitivity, args.brightness, args.backend)
+    if "split" in args.suite:
+        results += run_split_benchmark(args.frames, args.resolutions, args.distributions,
+                                       args.sensitivity, args.brightness, args.backend)
+    if args.tiles is not None:
+        worker_counts = args.tiles or sorted({1, 2, 4, os.cpu_count() or 1})
+        results += run_tile_benchmark(args.frames, worker_counts, args.sensitivity, args.brightness)
+    if args.processes is not None:
+        worker_counts = args.processes or sorted({1, 2, 4, os.cpu_count() or 1})
+        results += run_process_benchmark(args.frames, worker_counts, args.mode,
+                                         args.sensitivity, args.brightness)
+
+    if {"modes", "split"} & set(args.suite):
+        print(f"modes / split 计算后端: {args.backend}")
+    print_results(results)
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"峰值内存: {rss:.1f} MB")
+
+    if args.save:
+        save_baseline(args.save, results, args)
+    if args.compare and compare_baseline(args.compare, results, args.tolerance) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""
+摄像头采集配置
+
+摄像头打开后默认的采集模式往往是低帧率的 YUYV，驱动内部还缓存了好几帧，画面
+明显滞后。这里在打开摄像头之后统一协商采集参数:
+
+- 探测：逐个尝试候选分辨率与像素格式 (FOURCC)，读回驱动实际接受的值；可以再读
+  几帧实测帧率（有的驱动接受 30FPS 的设置，实际只能给出 15FPS）
+- 选择：优先达到目标帧率的模式，其次 MJPG（USB 带宽占用小，高分辨率下才能跑满
+  帧率），再其次与目标分辨率最接近的模式；探测不到时只请求目标参数
+- 实时模式把 CAP_PROP_BUFFERSIZE 设为 1，每次读到的都是最新的画面
+- 延迟回环测试：把当前时间编码成黑白方格显示在窗口中，摄像头对准窗口拍摄，从
+  采集到的画面中解码时间戳，得到从屏幕显示到程序拿到帧的端到端（glass-to-glass）延迟
+- 视频文件可以代替摄像头：write_loopback_video 生成带时间戳方格的视频，测量时按
+  视频帧率模拟摄像头出帧，得到解码与读取环节的延迟；文件不支持的设置会被忽略
+
+用法:
+    python capture_config.py --probe 0 --size 1280x720 --fps 30
+    python capture_config.py --latency 0
+    python capture_config.py --make-loopback loopback.avi
+    python capture_config.py --latency loopback.avi
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from multi_capture import open_source
+
+# 默认目标帧率
+DEFAULT_FPS = 30
+
+# 像素格式的优先顺序
+PREFERRED_FOURCCS = ("MJPG", "YUYV")
+
+# 探测的候选分辨率（目标分辨率总是第一个尝试）
+CANDIDATE_SIZES = ((640, 480), (1280, 720), (1920, 1080))
+
+# 实时模式下驱动内部缓冲的帧数
+LIVE_BUFFER_SIZE = 1
+
+# 实际帧率达到目标的这个比例即视为达到目标帧率
+FPS_TOLERANCE = 0.9
+
+# 时间戳方格: 6x6 格，第 0 格白、第 1 格黑作为亮度参考，接着 32 位毫秒时间戳（低位在前），
+# 最后 2 位是时间戳中 1 的个数除以 4 的余数，用于丢弃拍到屏幕刷新一半的画面
+STAMP_GRID = (6, 6)
+STAMP_BITS = 32
+STAMP_MASK = (1 << STAMP_BITS) - 1
+
+# 黑白参考格的最小亮度差，低于此值认为画面中没有时间戳方格
+MIN_CONTRAST = 40
+
+
+def fourcc_name(value):
+    """CAP_PROP_FOURCC 的数值 -> 四字符名称（无法识别时返回空字符串）"""
+    value = int(value)
+    if value <= 0:
+        return ""
+    name = "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+    return name if name.isprintable() else ""
+
+
+def current_mode(cap):
+    """驱动当前的采集模式 {fourcc, width, height, fps}"""
+    return {
+        "fourcc": fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+    }
+
+
+def _request(cap, fourcc, size, fps):
+    """请求采集模式（像素格式要先于分辨率设置，驱动可能不接受）"""
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    cap.set(cv2.CAP_PROP_FPS, fps)
+
+
+def measure_fps(cap, frames):
+    """
+    连续读取若干帧实测帧率
+
+    返回:
+    - 帧率；读不到帧时为 0
+    """
+    if not cap.read()[0]:
+        return 0.0
+    start = time.perf_counter()
+    for _ in range(frames):
+        if not cap.read()[0]:
+            return 0.0
+    elapsed = time.perf_counter() - start
+    return frames / elapsed if elapsed > 0 else 0.0
+
+
+def probe_modes(cap, sizes=CANDIDATE_SIZES, fourccs=PREFERRED_FOURCCS, fps=DEFAULT_FPS, measure_frames=0):
+    """
+    探测驱动接受的采集模式
+
+    参数:
+    - cap: 已打开的摄像头
+    - sizes: 候选分辨率 [(宽, 高), ...]
+    - fourccs: 候选像素格式
+    - fps: 请求的帧率
+    - measure_frames: 每种模式实测帧率读取的帧数，0 表示只读回驱动报告的帧率
+
+    返回:
+    - [{fourcc, width, height, fps[, measured_fps]}, ...]，只包含像素格式与分辨率
+      都被驱动接受的模式
+    """
+    modes = []
+    for fourcc in fourccs:
+        for size in sizes:
+            _request(cap, fourcc, size, fps)
+            mode = current_mode(cap)
+            if mode["fourcc"] != fourcc or (mode["width"], mode["height"]) != tuple(size) or mode in modes:
+                continue
+            if measure_frames > 0:
+                mode["measured_fps"] = measure_fps(cap, measure_frames)
+            modes.append(mode)
+    return modes
+
+
+def mode_fps(mode):
+    """模式的有效帧率（有实测值时使用实测值）"""
+    return mode.get("measured_fps") or mode["fps"]
+
+
+def choose_mode(modes, size, fps, fourccs=PREFERRED_FOURCCS):
+    """
+    选择采集模式：先看是否达到目标帧率，再按像素格式优先顺序，再按与目标分辨率的接近程度
+
+    返回:
+    - 选中的模式；modes 为空时返回 None
+    """
+    target_area = size[0] * size[1]
+
+    def rank(mode):
+        fourcc_rank = fourccs.index(mode["fourcc"]) if mode["fourcc"] in fourccs else len(fourccs)
+        return (mode_fps(mode) < fps * FPS_TOLERANCE, fourcc_rank,
+                abs(mode["width"] * mode["height"] - target_area), -mode_fps(mode))
+
+    return min(modes, key=rank) if modes else None
+
+
+def configure_capture(cap, size=None, fps=DEFAULT_FPS, buffer_size=LIVE_BUFFER_SIZE, probe=True,
+                      sizes=CANDIDATE_SIZES, fourccs=PREFERRED_FOURCCS, measure_frames=0):
+    """
+    协商并设置摄像头的采集模式
+
+    参数:
+    - cap: 已打开的摄像头
+    - size: 目标分辨率 (宽, 高)，None 表示保持驱动的默认分辨率
+    - fps: 目标帧率
+    - buffer_size: 驱动内部缓冲的帧数，None 表示保持驱动默认
+    - probe: 是否探测可用模式；不探测时直接请求首选像素格式与目标参数
+    - sizes, fourccs: 探测的候选分辨率与像素格式
+    - measure_frames: 探测时每种模式实测帧率读取的帧数
+
+    返回:
+    - 实际生效的模式 {fourcc, width, height, fps, buffer_size}，另含 default（打开时的
+      默认模式）、modes（探测到的模式）与 requested（目标分辨率与帧率）
+    """
+    default = current_mode(cap)
+    size = tuple(size) if size else (default["width"], default["height"])
+
+    modes = []
+    if probe:
+        candidates = [size] + [tuple(s) for s in sizes if tuple(s) != size]
+        modes = probe_modes(cap, candidates, fourccs, fps, measure_frames)
+    chosen = choose_mode(modes, size, fps, fourccs)
+    if chosen is None:
+        _request(cap, fourccs[0], size, fps)
+    else:
+        _request(cap, chosen["fourcc"], (chosen["width"], chosen["height"]), fps)
+
+    if buffer_size is not None:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    config = current_mode(cap)
+    config["buffer_size"] = int(cap.get(cv2.CAP_PROP_BUFFERSIZE))
+    config["default"] = default
+    config["modes"] = modes
+    config["requested"] = (size, fps)
+    return config
+
+
+def describe_mode(mode):
+    """一行文字描述采集模式"""
+    text = f"{mode['fourcc'] or '?'} {mode['width']}x{mode['height']} @{mode['fps']:.1f}FPS"
+    if "measured_fps" in mode:
+        text += f" (实测 {mode['measured_fps']:.1f}FPS)"
+    return text
+
+
+def describe_capture(config):
+    """一行文字描述 configure_capture 的结果"""
+    buffer_size = config["buffer_size"]
+    buffer_text = f"缓冲 {buffer_size} 帧" if buffer_size > 0 else "缓冲大小未知"
+    return (f"{describe_mode(config)}, {buffer_text} "
+            f"(默认 {describe_mode(config['default'])}, 探测到 {len(config['modes'])} 种模式)")
+
+
+def open_capture(source, size=None, fps=DEFAULT_FPS, **options):
+    """
+    打开视频源；摄像头同时协商采集模式
+
+    参数:
+    - source: 摄像头编号或视频文件路径
+    - size, fps, options: 传给 configure_capture
+
+    返回:
+    - (VideoCapture, 采集配置)；视频文件或打开失败时采集配置为 None
+    """
+    cap = open_source(source)
+    if not cap.isOpened() or not str(source).isdigit():
+        return cap, None
+    return cap, configure_capture(cap, size, fps, **options)
+
+
+class TimestampCode:
+    """把毫秒时间戳编码成黑白方格图案，并从拍摄到的画面中解码"""
+
+    def __init__(self, grid=STAMP_GRID):
+        """
+        参数:
+        - grid: 方格的 (行数, 列数)，至少 STAMP_BITS + 4 格
+        """
+        self.rows, self.cols = grid
+        if self.rows * self.cols < STAMP_BITS + 4:
+            raise ValueError(f"时间戳方格至少需要 {STAMP_BITS + 4} 格")
+        self._weights = [1 << i for i in range(STAMP_BITS)]
+
+    def encode(self, stamp, size):
+        """
+        生成时间戳图案
+
+        参数:
+        - stamp: 毫秒时间戳（按 32 位取模）
+        - size: 图案尺寸 (宽, 高)
+
+        返回:
+        - BGR 图像
+        """
+        stamp &= STAMP_MASK
+        cells = np.zeros(self.rows * self.cols, dtype=np.uint8)
+        cells[0] = 255
+        bits = [(stamp >> i) & 1 for i in range(STAMP_BITS)]
+        cells[2:2 + STAMP_BITS] = np.array(bits, dtype=np.uint8) * 255
+        checksum = sum(bits) & 3
+        cells[2 + STAMP_BITS] = (checksum & 1) * 255
+        cells[3 + STAMP_BITS] = (checksum >> 1) * 255
+        pattern = cv2.resize(cells.reshape(self.rows, self.cols), tuple(size), interpolation=cv2.INTER_NEAREST)
+        return cv2.cvtColor(pattern, cv2.COLOR_GRAY2BGR)
+
+    def decode(self, frame):
+        """
+        从画面中解码时间戳（图案应铺满画面）
+
+        返回:
+        - 毫秒时间戳；没有图案、对比度不足或校验失败时返回 None
+        """
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # 每格缩小为 4x4 后只取中间 2x2，避开格子边缘的模糊与错位
+        samples = cv2.resize(gray, (self.cols * 4, self.rows * 4), interpolation=cv2.INTER_AREA)
+        cells = samples.reshape(self.rows, 4, self.cols, 4)[:, 1:3, :, 1:3].mean(axis=(1, 3)).ravel()
+
+        white, black = cells[0], cells[1]
+        if white - black < MIN_CONTRAST:
+            return None
+        bits = cells > (white + black) / 2
+
+        data = bits[2:2 + STAMP_BITS]
+        checksum = int(bits[2 + STAMP_BITS]) | int(bits[3 + STAMP_BITS]) << 1
+        if checksum != int(data.sum()) & 3:
+            return None
+        return sum(weight for weight, bit in zip(self._weights, data) if bit)
+
+
+def clock_ms():
+    """回环测试使用的毫秒时钟（32 位取模）"""
+    return int(time.perf_counter() * 1000) & STAMP_MASK
+
+
+def _elapsed_ms(now, stamp):
+    """两个 32 位取模的毫秒时间戳之差"""
+    diff = (now - stamp) & STAMP_MASK
+    return diff - (STAMP_MASK + 1) if diff > STAMP_MASK // 2 else diff
+
+
+def write_loopback_video(path, frame_count=150, fps=DEFAULT_FPS, size=(640, 480), fourcc="MJPG"):
+    """
+    生成代替摄像头使用的回环测试视频：第 i 帧的时间戳为 i / fps 秒（毫秒）
+
+    返回:
+    - 是否写出成功
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, tuple(size))
+    if not writer.isOpened():
+        return False
+    code = TimestampCode()
+    try:
+        for i in range(frame_count):
+            writer.write(code.encode(round(i * 1000 / fps), size))
+    finally:
+        writer.release()
+    return True
+
+
+def measure_latency(cap, duration=5.0, window=None, size=(640, 480), code=None):
+    """
+    端到端延迟回环测试
+
+    参数:
+    - cap: 已打开的视频源
+    - duration: 测试时长（秒）
+    - window: 显示时间戳图案的窗口名，摄像头需要对准该窗口拍摄（窗口尽量铺满画面）；
+      None 表示 cap 是 write_loopback_video 生成的视频文件，按视频帧率模拟摄像头出帧
+    - size: 窗口中图案的尺寸 (宽, 高)
+    - code: TimestampCode，默认新建
+
+    返回:
+    - 统计字典: frames（读取帧数）、decoded（解码成功帧数）、p50_ms / p95_ms / max_ms
+      （没有解码成功的帧时为 None）
+    """
+    code = code or TimestampCode()
+    latencies = []
+    frames = 0
+    start = time.perf_counter()
+    frame_interval = 1 / (cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS)
+
+    while time.perf_counter() - start < duration:
+        if window is not None:
+            # 显示当前时间，拍到的是之前某一刻显示的时间
+            cv2.imshow(window, code.encode(clock_ms(), size))
+            cv2.waitKey(1)
+        else:
+            # 视频文件：第 frames 帧在 frames / fps 秒时“被拍摄”，提前读到时等待
+            wait = start + frames * frame_interval - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
+        now = clock_ms() if window is not None else int((time.perf_counter() - start) * 1000)
+        stamp = code.decode(frame)
+        if stamp is not None:
+            latencies.append(_elapsed_ms(now, stamp))
+
+    result = {"frames": frames, "decoded": len(latencies), "p50_ms": None, "p95_ms": None, "max_ms": None}
+    if latencies:
+        p50, p95 = (float(v) for v in np.percentile(latencies, (50, 95)))
+        result.update(p50_ms=p50, p95_ms=p95, max_ms=float(max(latencies)))
+    return result
+
+
+def describe_latency(result):
+    """一行文字描述延迟测试结果"""
+    text = f"读取 {result['frames']} 帧, 解码 {result['decoded']} 帧"
+    if result["decoded"]:
+        text += (f", 延迟 p50 {result['p50_ms']:.0f}ms / p95 {result['p95_ms']:.0f}ms"
+                 f" / 最大 {result['max_ms']:.0f}ms")
+    return text
+
+
+def parse_size(text):
+    """'1280x720' -> (1280, 720)"""
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    """主程序入口"""
+    parser = argparse.ArgumentParser(description="摄像头采集模式探测与延迟回环测试")
+    parser.add_argument("--probe", metavar="SOURCE", help="探测摄像头（或视频文件）支持的采集模式")
+    parser.add_argument("--latency", metavar="SOURCE",
+                        help="延迟回环测试：摄像头对准测试窗口，或使用 --make-loopback 生成的视频文件")
+    parser.add_argument("--make-loopback", metavar="PATH", help="生成代替摄像头的回环测试视频 (.avi)")
+    parser.add_argument("--size", type=parse_size, metavar="WxH", help="目标分辨率，默认保持驱动默认值")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="目标帧率")
+    parser.add_argument("--buffer-size", type=int, default=LIVE_BUFFER_SIZE,
+                        help="驱动内部缓冲帧数，0 表示保持驱动默认（用于对比延迟）")
+    parser.add_argument("--measure", type=int, default=0, metavar="N", help="探测时每种模式读取 N 帧实测帧率")
+    parser.add_argument("--duration", type=float, default=5.0, help="延迟测试时长（秒）")
+    args = parser.parse_args()
+
+    buffer_size = args.buffer_size or None
+
+    if args.make_loopback:
+        frame_count = int(args.duration * args.fps)
+        if write_loopback_video(args.make_loopback, frame_count, args.fps, args.size or (640, 480)):
+            print(f"回环测试视频已生成: {args.make_loopback} ({frame_count} 帧)")
+        else:
+            print(f"错误：无法写出 {args.make_loopback}")
+
+    if args.probe:
+        cap = open_source(args.probe)
+        if not cap.isOpened():
+            print(f"错误：无法打开视频源 {args.probe}")
+        else:
+            config = configure_capture(cap, args.size, args.fps, buffer_size, measure_frames=args.measure)
+            print(f"默认模式: {describe_mode(config['default'])}")
+            for mode in config["modes"]:
+                print(f"  {describe_mode(mode)}")
+            print(f"选用: {describe_capture(config)}")
+            cap.release()
+
+    if args.latency:
+        cap, config = open_capture(args.latency, args.size, args.fps, buffer_size=buffer_size)
+        if not cap.isOpened():
+            print(f"错误：无法打开视频源 {args.latency}")
+            return
+        window = None
+        if config is not None:
+            print(f"采集模式: {describe_capture(config)}")
+            print("请把摄像头对准测试窗口，让时间戳方格尽量铺满画面")
+            window = "Latency Loopback"
+        try:
+            result = measure_latency(cap, args.duration, window, args.size or (640, 480))
+            print(describe_latency(result))
+        finally:
+            cap.release()
+            if window is not None:
+                cv2.destroyWindow(window)
+
+
+if __name__ == "__main__":
+    main()
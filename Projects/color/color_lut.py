@@ -0,0 +1,215 @@
+"""
+颜色规则查找表
+
+所有颜色规则只依赖像素的 (B, G, R) 以及 color_sensitivity / min_brightness，
+因此可以把每个规则预先求值成一张量化的三维查找表，每帧只需计算一次表索引
+再做一次 gather，而不必逐像素重复比较。
+
+查找表分两层缓存：
+- 规则表按 (模式, 敏感度, 自定义颜色) 缓存
+- 亮度表按 min_brightness 缓存
+组合表 = 规则表 & 亮度表，按完整参数缓存。拖动亮度滑块时只需重建很小的
+亮度表再做一次按位与，拖动敏感度滑块时亮度表保持不变。
+
+调用方给出参数快照的版本号时（见 params.py），组合表还按 (版本, 模式) 登记；
+同一快照下的后续调用（每帧、每个条带）直接查这一层，不加锁也不比较参数。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from color_match import as_matcher
+from highlight_engine import MAX_CACHED_SHAPES, HighlightEngine
+
+# 默认每通道 6 位量化（64 级），表大小 64^3 = 262144 项
+LUT_BITS = 6
+
+# 每层最多缓存的表数量
+MAX_CACHED_TABLES = 64
+
+
+class ColorLUT:
+    """
+    颜色规则的量化三维查找表
+
+    表项在量化格的中心颜色上用 HighlightEngine 求值，因此规则语义与直接
+    计算完全一致，只存在量化误差；bits=8 时不做量化（每张表 16MB）。
+    该对象可在多个线程之间共享。
+    """
+
+    def __init__(self, bits=LUT_BITS, max_tables=MAX_CACHED_TABLES):
+        if not 1 <= bits <= 8:
+            raise ValueError("bits 必须在 1-8 之间")
+
+        self.bits = bits
+        self.levels = 1 << bits
+        self.shift = 8 - bits
+        self.max_tables = max_tables
+
+        self._engine = HighlightEngine()
+        self._palette = self._build_palette()
+        self._rule_tables = OrderedDict()
+        self._brightness_tables = OrderedDict()
+        self._tables = OrderedDict()
+        self._versions = {}   # (参数快照版本, 模式) -> 组合表，按加入顺序淘汰
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.builds = 0
+        self.hits = 0
+
+    def _build_palette(self):
+        """生成包含所有量化格中心颜色的调色板图像，像素顺序与表索引一致"""
+        levels = self.levels
+        centers = (np.arange(levels, dtype=np.uint16) << self.shift) + ((1 << self.shift) >> 1)
+        centers = centers.astype(np.uint8)
+
+        palette = np.empty((levels, levels, levels, 3), dtype=np.uint8)
+        palette[..., 0] = centers[:, None, None]
+        palette[..., 1] = centers[None, :, None]
+        palette[..., 2] = centers[None, None, :]
+        return palette.reshape(levels * levels, levels, 3)
+
+    def _cached(self, cache, key, build):
+        """在指定缓存层中查找，未命中时构建并按 LRU 淘汰"""
+        table = cache.get(key)
+        if table is not None:
+            cache.move_to_end(key)
+            return table
+
+        table = build()
+        cache[key] = table
+        if len(cache) > self.max_tables:
+            cache.popitem(last=False)
+        return table
+
+    def table(self, mode, sensitivity, min_brightness, custom_color=None, version=None):
+        """
+        获取指定参数的组合查找表
+
+        参数:
+        - version: 参数快照的版本号，其余参数必须取自同一个快照；None 表示按参数查找
+
+        返回:
+        - 一维 bool 数组，长度为 levels^3
+        """
+        if version is not None:
+            table = self._versions.get((version, mode))
+            if table is not None:
+                self.hits += 1
+                return table
+
+        custom_color = as_matcher(custom_color) if mode == "custom" else None
+        key = (mode, sensitivity, min_brightness, custom_color)
+
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                self._register(version, mode, table)
+                return table
+
+            rule = self._cached(
+                self._rule_tables, (mode, sensitivity, custom_color),
+                lambda: self._evaluate(mode, sensitivity, None, custom_color))
+            brightness = self._cached(
+                self._brightness_tables, min_brightness,
+                lambda: self._evaluate(None, 0, min_brightness, None))
+
+            table = np.logical_and(rule, brightness)
+            self._tables[key] = table
+            if len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+            self.builds += 1
+            self._register(version, mode, table)
+            return table
+
+    def _register(self, version, mode, table):
+        """按快照版本登记组合表（调用方持有锁）"""
+        if version is None:
+            return
+        self._versions[(version, mode)] = table
+        if len(self._versions) > self.max_tables:
+            del self._versions[next(iter(self._versions))]
+
+    def _evaluate(self, mode, sensitivity, min_brightness, custom_color):
+        """在调色板上求值规则，得到一维表"""
+        mask = self._engine.compute_mask(self._palette, mode, sensitivity,
+                                         min_brightness, custom_color)
+        return mask.ravel().copy()
+
+    def lookup(self, frame, table, buffers, out):
+        """
+        用查找表对整帧分类
+
+        参数:
+        - frame: 输入帧 (BGR, uint8)
+        - table: table() 返回的查找表
+        - buffers: 当前分辨率的 LookupBuffers
+        - out: 输出掩码
+        """
+        bits = self.bits
+        quantized, partial, index = buffers.quantized, buffers.partial, buffers.index
+
+        # 先对三个通道整体右移（连续内存，一次遍历），再组合索引:
+        # index = qB << 2*bits + qG << bits + qR
+        np.right_shift(frame, self.shift, out=quantized)
+        np.left_shift(quantized[..., 0], 2 * bits, out=index, dtype=np.intp)
+        np.left_shift(quantized[..., 1], bits, out=partial, dtype=np.uint16)
+        np.add(index, partial, out=index)
+        np.add(index, quantized[..., 2], out=index)
+
+        # np.take 对非 intp 索引会先转换复制，因此索引直接使用 intp
+        np.take(table, index, out=out, mode="clip")
+        return out
+
+
+class LookupBuffers:
+    """查表所需的工作缓冲区"""
+
+    def __init__(self, height, width):
+        self.quantized = np.empty((height, width, 3), dtype=np.uint8)
+        self.partial = np.empty((height, width), dtype=np.uint16)
+        self.index = np.empty((height, width), dtype=np.intp)
+
+
+class LUTHighlightEngine(HighlightEngine):
+    """使用查找表计算掩码的突显引擎，混合步骤与 HighlightEngine 相同"""
+
+    def __init__(self, lut):
+        super().__init__()
+        self.lut = lut
+        self._lookup_buffers = {}
+
+    def compute_mask(self, frame, mode, sensitivity, min_brightness, custom_color=None, version=None):
+        """计算颜色掩码（查表时不需要亮度累加）"""
+        buffers = self.get_buffers(frame.shape[0], frame.shape[1])
+        return self._build_mask(frame, mode, sensitivity, min_brightness, custom_color, buffers, version)
+
+    def _build_mask(self, frame, mode, sensitivity, min_brightness, custom_color, buffers, version=None):
+        """查表得到掩码（亮度阈值已并入查找表）"""
+        lookup_buffers = self._lookup_buffers.get(buffers.shape)
+        if lookup_buffers is None:
+            if len(self._lookup_buffers) >= MAX_CACHED_SHAPES:
+                self._lookup_buffers.pop(next(iter(self._lookup_buffers)))
+            lookup_buffers = LookupBuffers(*buffers.shape)
+            self._lookup_buffers[buffers.shape] = lookup_buffers
+
+        table = self.lut.table(mode, sensitivity, min_brightness, custom_color, version)
+        return self.lut.lookup(frame, table, lookup_buffers, buffers.mask)
+
+
+_thread_local = threading.local()
+
+
+def get_thread_lut_engine(lut):
+    """获取当前线程专属、绑定到指定查找表的引擎实例"""
+    engines = getattr(_thread_local, "engines", None)
+    if engines is None:
+        engines = _thread_local.engines = {}
+    engine = engines.get(id(lut))
+    if engine is None or engine.lut is not lut:
+        engine = engines[id(lut)] = LUTHighlightEngine(lut)
+    return engine
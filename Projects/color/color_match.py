@@ -0,0 +1,110 @@
+"""
+自定义颜色匹配
+
+custom 模式的目标颜色只在设置改变时解析一次，预先转换到匹配所用的颜色空间；
+逐帧只在 int32 中比较平方距离，不开方，也不产生浮点数组:
+
+- 支持 BGR、HSV 与 CIELAB（均为 OpenCV 的 8 位表示），HSV 的色相差按环形
+  (0-179) 取较小的一侧
+- 可以同时匹配多个目标颜色（取并集），整帧只做一次颜色空间转换，
+  转换结果与灰度等缓冲区一起按分辨率缓存，所有目标共用
+- ColorMatcher 不可变且可哈希，查找表与增量模式直接用它作为缓存键
+"""
+import re
+
+import cv2
+import numpy as np
+
+COLOR_SPACES = ("bgr", "hsv", "lab")
+
+# 颜色空间 -> OpenCV 转换代码
+CONVERSIONS = {"hsv": cv2.COLOR_BGR2HSV, "lab": cv2.COLOR_BGR2LAB}
+
+# 8 位 HSV 的色相周期
+HUE_PERIOD = 180
+
+
+class ColorMatcher:
+    """解析后的一组目标颜色"""
+
+    __slots__ = ("colors", "space", "targets")
+
+    def __init__(self, colors, space="bgr"):
+        """
+        参数:
+        - colors: 目标颜色列表，每项为 (B, G, R)
+        - space: 匹配所用的颜色空间，见 COLOR_SPACES
+        """
+        if space not in COLOR_SPACES:
+            raise ValueError(f"不支持的颜色空间: {space}")
+        colors = tuple(tuple(int(v) for v in color) for color in colors)
+        if not colors:
+            raise ValueError("至少需要一个目标颜色")
+        for color in colors:
+            if len(color) != 3 or not all(0 <= v <= 255 for v in color):
+                raise ValueError(f"颜色必须是三个 0-255 的数字: {color}")
+
+        self.colors = colors
+        self.space = space
+        # 目标颜色只在这里转换一次
+        bgr = np.array(colors, dtype=np.uint8).reshape(-1, 1, 3)
+        converted = bgr if space == "bgr" else cv2.cvtColor(bgr, CONVERSIONS[space])
+        self.targets = tuple(tuple(int(v) for v in color) for color in converted.reshape(-1, 3))
+
+    def __eq__(self, other):
+        return (isinstance(other, ColorMatcher)
+                and (self.space, self.colors) == (other.space, other.colors))
+
+    def __hash__(self):
+        return hash((self.space, self.colors))
+
+    def __repr__(self):
+        colors = "; ".join(",".join(map(str, color)) for color in self.colors)
+        return f"ColorMatcher({colors} @ {self.space})"
+
+    def with_space(self, space):
+        """同样的目标颜色换一个颜色空间匹配"""
+        return ColorMatcher(self.colors, space)
+
+    def convert(self, frame, buffers):
+        """
+        把整帧转换到匹配颜色空间（每帧一次，所有目标共用）
+
+        参数:
+        - frame: 输入帧 (BGR, uint8，可以是视图)
+        - buffers: 引擎的分辨率缓冲区，转换结果写入其 converted 缓冲区
+
+        返回:
+        - 转换后的图像；BGR 匹配时直接返回输入帧
+        """
+        if self.space == "bgr":
+            return frame
+        if buffers.converted is None:
+            buffers.converted = np.empty(buffers.shape + (3,), dtype=np.uint8)
+        cv2.cvtColor(frame, CONVERSIONS[self.space], dst=buffers.converted)
+        return buffers.converted
+
+
+def as_matcher(custom_color):
+    """把 (B, G, R) 或 ColorMatcher 统一为 ColorMatcher"""
+    if custom_color is None or isinstance(custom_color, ColorMatcher):
+        return custom_color
+    return ColorMatcher((custom_color,))
+
+
+def parse_colors(text, space="bgr"):
+    """
+    解析目标颜色文本
+
+    多个颜色用分号分隔，每个颜色为逗号或空格分隔的 B,G,R，
+    例如 "0,0,255; 255 0 0"
+
+    返回:
+    - ColorMatcher；格式错误时抛出 ValueError
+    """
+    colors = []
+    for part in text.split(";"):
+        part = part.strip()
+        if part:
+            colors.append(tuple(int(v) for v in re.split(r"[,\s]+", part)))
+    return ColorMatcher(colors, space)
@@ -0,0 +1,60 @@
+"""
+确定性的 random 区域颜色
+
+random 区域原来每帧对每个区域调用一次 random.choice，突显的颜色逐帧闪烁，
+结果也无法复现。这里改为由 (种子, 区域, 时间窗口) 的哈希决定颜色:
+
+- 同一时间窗口内颜色保持不变，窗口按帧号划分（由窗口秒数和帧率换算）
+- 不依赖任何调用顺序或进程内状态，任意线程、进程或分段处理同一帧都得到
+  同样的颜色，并行渲染与顺序渲染逐字节一致，缓存的结果也可以直接复用
+"""
+import hashlib
+
+RANDOM_MODE = "random"
+
+# random 区域可选的颜色规则
+RANDOM_COLORS = ("red", "green", "blue")
+
+DEFAULT_SEED = 0
+
+# 颜色保持不变的时间窗口（秒）
+DEFAULT_WINDOW_SECONDS = 1.0
+
+
+class RandomColorSchedule:
+    """按帧号决定 random 区域颜色的调度表（不可变，可在线程与进程之间共享）"""
+
+    def __init__(self, seed=DEFAULT_SEED, window_seconds=DEFAULT_WINDOW_SECONDS, fps=30,
+                 colors=RANDOM_COLORS):
+        """
+        参数:
+        - seed: 随机种子
+        - window_seconds: 颜色保持不变的时间窗口（秒）
+        - fps: 视频帧率，用于把窗口换算为帧数
+        - colors: 可选的颜色规则
+        """
+        self.seed = seed
+        self.window_seconds = window_seconds
+        self.fps = fps
+        self.colors = tuple(colors)
+        self.window_frames = max(1, int(round(window_seconds * fps)))
+
+    def window(self, position):
+        """帧号所在的时间窗口编号"""
+        return position // self.window_frames
+
+    def color(self, region, position):
+        """
+        区域在指定帧使用的颜色规则
+
+        参数:
+        - region: 区域名称
+        - position: 帧号（从 0 开始）
+        """
+        key = f"{self.seed}:{region}:{self.window(position)}".encode()
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        return self.colors[int.from_bytes(digest, "little") % len(self.colors)]
+
+    def resolve(self, mode, region, position):
+        """random 规则换成该帧的颜色，其余规则原样返回"""
+        return self.color(region, position) if mode == RANDOM_MODE else mode
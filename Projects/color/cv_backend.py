@@ -0,0 +1,264 @@
+"""
+OpenCV 原语实现的突显后端
+
+与 highlight_engine 的 NumPy 内核接口相同，但只使用 OpenCV 的向量化原语
+(extractChannel / subtract / compare / inRange / cvtColor / copyTo)，这些函数
+内部按 cv2.getNumThreads() 多线程执行。NumPy 内核仍是参考实现。
+
+与参考实现的差异: 亮度使用 cv2.cvtColor 的 BT.601 灰度（四舍五入），参考实现
+为 8 位定点截断，两者最多相差 1 个灰度级，只影响恰好落在亮度阈值上的像素。
+
+启动时 calibrate() 在合成帧上分别计时两个后端，并检查掩码与参考实现一致，
+选出较快的一个。
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from color_match import HUE_PERIOD, as_matcher
+from highlight_engine import (DOMINANT_CHANNELS, MAX_CACHED_SHAPES, THRESHOLD_RULES, UNION_RULES,
+                              HighlightEngine, get_thread_engine)
+
+BACKEND_NUMPY = "numpy"
+BACKEND_OPENCV = "opencv"
+
+# 校准使用的帧尺寸与颜色规则
+CALIBRATION_SIZE = (720, 1280)
+CALIBRATION_MODES = ("red", "warm", "custom")
+CALIBRATION_REPEATS = 5
+
+# 校准时允许与参考实现不一致的像素比例（亮度阈值边界上的舍入差异）
+MAX_MISMATCH_RATIO = 0.005
+
+
+def _threshold_bounds(rule):
+    """把固定阈值规则转换为 inRange 的上下界 (B, G, R)"""
+    lower, upper = [0, 0, 0], [255, 255, 255]
+    for channel, op, value in THRESHOLD_RULES[rule]:
+        if op == ">":
+            lower[channel] = value + 1
+        else:
+            upper[channel] = value - 1
+    return tuple(lower), tuple(upper)
+
+
+THRESHOLD_BOUNDS = {rule: _threshold_bounds(rule) for rule in THRESHOLD_RULES}
+
+
+class CVFrameBuffers:
+    """单一分辨率下复用的工作缓冲区（OpenCV 后端）"""
+
+    def __init__(self, height, width):
+        shape = (height, width)
+        self.shape = shape
+        self.planes = [np.empty(shape, dtype=np.uint8) for _ in range(3)]
+        self.diff = np.empty(shape, dtype=np.uint8)
+        self.gray = np.empty(shape, dtype=np.uint8)
+        self.select = np.empty(shape, dtype=np.uint8)    # 掩码 0/255
+        self.flag = np.empty(shape, dtype=np.uint8)
+        self.rule = np.empty(shape, dtype=np.uint8)
+        self.mask01 = np.empty(shape, dtype=np.uint8)    # 掩码 0/1，按 bool 视图返回
+        self.absdiff = np.empty((height, width, 3), dtype=np.uint8)
+        self.square = np.empty((height, width, 3), dtype=np.float32)
+        self.dist = np.empty(shape, dtype=np.float32)
+        self.converted = None                            # 自定义颜色的 HSV/LAB 转换（用到时分配）
+        self.output = np.empty((height, width, 3), dtype=np.uint8)
+
+
+class OpenCVHighlightEngine:
+    """
+    OpenCV 原语实现的突显引擎
+
+    接口与 HighlightEngine 相同；返回的掩码与默认输出都是内部缓冲区，
+    下一次调用时会被覆盖。引擎不是线程安全的。
+    """
+
+    name = BACKEND_OPENCV
+
+    def __init__(self):
+        self._buffers = {}
+        self._fallback = HighlightEngine()
+
+    def get_buffers(self, height, width):
+        """获取（必要时创建）指定分辨率的工作缓冲区"""
+        key = (height, width)
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            if len(self._buffers) >= MAX_CACHED_SHAPES:
+                self._buffers.pop(next(iter(self._buffers)))
+            buffers = CVFrameBuffers(height, width)
+            self._buffers[key] = buffers
+        return buffers
+
+    def compute_mask(self, frame, mode, sensitivity, min_brightness, custom_color=None, version=None):
+        """计算颜色掩码，参数与返回值同 HighlightEngine.compute_mask（直接计算，不使用版本号）"""
+        if sensitivity < 0:
+            # 饱和减法只能表达非负差值，负敏感度交给参考实现
+            return self._fallback.compute_mask(frame, mode, sensitivity, min_brightness, custom_color)
+        buffers = self.get_buffers(frame.shape[0], frame.shape[1])
+        self._build_select(frame, mode, sensitivity, min_brightness, custom_color, buffers)
+        return self._bool_mask(buffers)
+
+    def apply(self, frame, mode, sensitivity, min_brightness, custom_color=None, out=None, profiler=None,
+              version=None):
+        """突显目标颜色，其余像素转为灰度，参数与返回值同 HighlightEngine.apply"""
+        if sensitivity < 0:
+            return self._fallback.apply(frame, mode, sensitivity, min_brightness, custom_color, out, profiler)
+        buffers = self.get_buffers(frame.shape[0], frame.shape[1])
+        if out is None:
+            out = buffers.output
+
+        start = time.perf_counter() if profiler is not None else None
+        select = self._build_select(frame, mode, sensitivity, min_brightness, custom_color, buffers)
+        if profiler is not None:
+            start = profiler.lap("mask", start)
+
+        # 先整体写入灰度，再按掩码拷回原色
+        cv2.cvtColor(buffers.gray, cv2.COLOR_GRAY2BGR, dst=out)
+        cv2.copyTo(frame, select, dst=out)
+        mask = self._bool_mask(buffers)
+        if profiler is not None:
+            profiler.lap("blend", start)
+        return out, mask
+
+    def _bool_mask(self, buffers):
+        """0/255 掩码转换为布尔数组"""
+        cv2.min(buffers.select, 1, dst=buffers.mask01)
+        return buffers.mask01.view(bool)
+
+    def _build_select(self, frame, mode, sensitivity, min_brightness, custom_color, buffers):
+        """按规则写入 buffers.select (0/255) 并叠加亮度阈值"""
+        select = buffers.select
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=buffers.gray)
+
+        if mode in DOMINANT_CHANNELS or mode in THRESHOLD_RULES:
+            self._rule_select(frame, mode, sensitivity, select, buffers)
+        elif mode in UNION_RULES:
+            first, second = UNION_RULES[mode]
+            self._rule_select(frame, first, sensitivity, select, buffers)
+            self._rule_select(frame, second, sensitivity, buffers.rule, buffers)
+            cv2.bitwise_or(select, buffers.rule, dst=select)
+        elif mode == "custom" and custom_color is not None:
+            self._custom_select(frame, custom_color, sensitivity, select, buffers)
+        else:
+            select.fill(255)
+
+        if min_brightness is not None and min_brightness >= 0:
+            cv2.compare(buffers.gray, min(int(min_brightness), 255), cv2.CMP_GT, dst=buffers.flag)
+            cv2.bitwise_and(select, buffers.flag, dst=select)
+
+        return select
+
+    def _rule_select(self, frame, rule, sensitivity, out, buffers):
+        """单色突出（饱和减法 + 比较）或固定阈值规则 (inRange)"""
+        if rule in THRESHOLD_BOUNDS:
+            lower, upper = THRESHOLD_BOUNDS[rule]
+            cv2.inRange(frame, lower, upper, dst=out)
+            return
+
+        channel = DOMINANT_CHANNELS[rule]
+        first, second = [c for c in (0, 1, 2) if c != channel]
+        planes = buffers.planes
+        for c in (channel, first, second):
+            cv2.extractChannel(frame, c, dst=planes[c])
+        # sensitivity >= 0 时，饱和差值 max(a - b, 0) > sensitivity 与有符号比较等价
+        cv2.subtract(planes[channel], planes[first], dst=buffers.diff)
+        cv2.compare(buffers.diff, sensitivity, cv2.CMP_GT, dst=out)
+        cv2.subtract(planes[channel], planes[second], dst=buffers.diff)
+        cv2.compare(buffers.diff, sensitivity, cv2.CMP_GT, dst=buffers.flag)
+        cv2.bitwise_and(out, buffers.flag, dst=out)
+
+    def _custom_select(self, frame, custom_color, sensitivity, out, buffers):
+        """自定义颜色: 到任一目标的平方距离 < sensitivity^2（float32 对该范围内的整数是精确的）"""
+        matcher = as_matcher(custom_color)
+        source = matcher.convert(frame, buffers)
+        limit = int(sensitivity) ** 2 if sensitivity > 0 else 0
+        hue = buffers.planes[0]
+
+        for i, target in enumerate(matcher.targets):
+            cv2.absdiff(source, target + (0,), dst=buffers.absdiff)
+            if matcher.space == "hsv":
+                # 色相是环形的: 差值取 min(|d|, 180 - |d|)
+                cv2.extractChannel(buffers.absdiff, 0, dst=hue)
+                cv2.subtract(HUE_PERIOD, hue, dst=buffers.diff)
+                cv2.min(hue, buffers.diff, dst=hue)
+                cv2.insertChannel(hue, buffers.absdiff, 0)
+            cv2.multiply(buffers.absdiff, buffers.absdiff, dst=buffers.square, dtype=cv2.CV_32F)
+            cv2.transform(buffers.square, np.ones((1, 3), dtype=np.float32), dst=buffers.dist)
+            dest = out if i == 0 else buffers.rule
+            cv2.compare(buffers.dist, limit, cv2.CMP_LT, dst=dest)
+            if i > 0:
+                cv2.bitwise_or(out, buffers.rule, dst=out)
+
+
+_thread_local = threading.local()
+
+
+def get_thread_cv_engine():
+    """获取当前线程专属的 OpenCV 后端引擎"""
+    engine = getattr(_thread_local, "engine", None)
+    if engine is None:
+        engine = OpenCVHighlightEngine()
+        _thread_local.engine = engine
+    return engine
+
+
+BACKENDS = {
+    BACKEND_NUMPY: (HighlightEngine, get_thread_engine),
+    BACKEND_OPENCV: (OpenCVHighlightEngine, get_thread_cv_engine),
+}
+
+
+def create_engine(backend):
+    """按后端名称新建一个引擎（调用方自行保证单线程使用）"""
+    return BACKENDS[backend][0]()
+
+
+def get_backend_engine(backend):
+    """按后端名称获取当前线程的引擎"""
+    return BACKENDS[backend][1]()
+
+
+def calibrate(size=CALIBRATION_SIZE, modes=CALIBRATION_MODES, repeats=CALIBRATION_REPEATS):
+    """
+    在合成帧上计时两个后端，选出较快且结果一致的一个
+
+    返回:
+    - {"backend": 选中的后端, "times_ms": {后端: 每帧耗时}, "mismatch": 掩码不一致比例}
+    """
+    height, width = size
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (0, 0), (width // 3, height // 2), (30, 30, 220), -1)
+    params = (20, 30, (0, 0, 255))
+
+    engines = {backend: create_engine(backend) for backend in BACKENDS}
+    times_ms = {}
+    for backend, engine in engines.items():
+        for mode in modes:
+            engine.apply(frame, mode, *params)   # 预热，分配缓冲区
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for mode in modes:
+                engine.apply(frame, mode, *params)
+        times_ms[backend] = (time.perf_counter() - start) * 1000 / repeats
+
+    mismatch = 0.0
+    for mode in modes:
+        reference = engines[BACKEND_NUMPY].compute_mask(frame, mode, *params)
+        candidate = engines[BACKEND_OPENCV].compute_mask(frame, mode, *params)
+        mismatch = max(mismatch, np.count_nonzero(reference != candidate) / reference.size)
+
+    backend = BACKEND_NUMPY
+    if mismatch <= MAX_MISMATCH_RATIO and times_ms[BACKEND_OPENCV] < times_ms[BACKEND_NUMPY]:
+        backend = BACKEND_OPENCV
+    return {"backend": backend, "times_ms": times_ms, "mismatch": mismatch}
+
+
+def describe(calibration):
+    """单行文本形式的校准结果"""
+    times = calibration["times_ms"]
+    return (f"{calibration['backend']} (numpy {times[BACKEND_NUMPY]:.1f}ms / "
+            f"opencv {times[BACKEND_OPENCV]:.1f}ms)")
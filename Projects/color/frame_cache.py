@@ -0,0 +1,165 @@
+"""
+处理结果缓存
+
+按 (视频, 帧号, 处理参数) 缓存处理后的帧。循环播放或来回拖动到已经处理过的
+范围时只需查一次缓存，不再转换颜色和重新处理:
+
+- 内存部分按 LRU 淘汰，总大小不超过预算 (MB)
+- 可选溢出到磁盘上的内存映射文件：从内存淘汰的帧写入定长槽位，命中时读回
+  内存；溢出文件同样按 LRU 复用槽位
+- 缓存只保存引用，放入缓存的数组之后不能再被修改（处理结果每帧都是新数组）
+"""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 默认内存预算（MB）
+DEFAULT_BUDGET_MB = 512
+
+# 默认溢出文件大小（MB）
+DEFAULT_SPILL_MB = 2048
+
+
+class CachedFrame:
+    """解码阶段命中缓存时代替原始帧送入流水线的处理结果"""
+
+    __slots__ = ("processed",)
+
+    def __init__(self, processed):
+        self.processed = processed
+
+
+class FrameCache:
+    """处理结果的 LRU 缓存，可选溢出到内存映射文件（线程安全）"""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, spill_path=None, spill_mb=DEFAULT_SPILL_MB):
+        """
+        参数:
+        - budget_mb: 内存预算（MB）
+        - spill_path: 溢出文件路径；"" 表示在临时目录中创建，None 表示不溢出
+        - spill_mb: 溢出文件大小（MB）
+        """
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.spill_path = spill_path
+        self.spill_bytes = int(spill_mb * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()    # 键 -> 数组
+        self._memory_bytes = 0
+        self._spilled = OrderedDict()   # 键 -> (槽位, 形状)
+        self._spill = None              # np.memmap，第一次溢出时创建
+        self._free_slots = []
+        self._owns_spill_file = False
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def memory_mb(self):
+        """内存中缓存的大小（MB）"""
+        return self._memory_bytes / (1024 * 1024)
+
+    @property
+    def hit_ratio(self):
+        """累计命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key):
+        """
+        查找缓存
+
+        返回:
+        - 处理后的帧（不要修改）；未命中返回 None
+        """
+        with self._lock:
+            frame = self._memory.get(key)
+            if frame is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return frame
+
+            entry = self._spilled.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # 从溢出文件读回内存，槽位归还
+            slot, shape = entry
+            frame = np.array(self._spill[slot, :int(np.prod(shape))]).reshape(shape)
+            self._free_slots.append(slot)
+            self._store(key, frame)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        """放入处理后的帧（只保存引用）"""
+        if frame.nbytes > self.budget_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._spilled.pop(key, None)
+            self._store(key, frame)
+
+    def clear(self):
+        """清空缓存（溢出文件保留，槽位全部释放）"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._spill is not None:
+                self._free_slots = list(range(self._spill.shape[0]))
+            self._spilled.clear()
+
+    def close(self):
+        """清空缓存并删除自动创建的溢出文件"""
+        self.clear()
+        with self._lock:
+            if self._spill is not None:
+                path = self._spill.filename
+                self._spill = None
+                self._free_slots = []
+                if self._owns_spill_file:
+                    os.remove(path)
+
+    def _store(self, key, frame):
+        """放入内存部分，超出预算时淘汰最久未用的帧（调用方持有锁）"""
+        self._memory[key] = frame
+        self._memory_bytes += frame.nbytes
+        while self._memory_bytes > self.budget_bytes:
+            old_key, old_frame = self._memory.popitem(last=False)
+            self._memory_bytes -= old_frame.nbytes
+            self._spill_frame(old_key, old_frame)
+
+    def _spill_frame(self, key, frame):
+        """把从内存淘汰的帧写入溢出文件（调用方持有锁）"""
+        if self.spill_path is None:
+            return
+        if self._spill is None:
+            self._open_spill(frame.nbytes)
+        if frame.nbytes > self._spill.shape[1]:
+            return  # 比槽位大的帧（分辨率变大后）不再溢出
+
+        if not self._free_slots:
+            if not self._spilled:
+                return
+            _, (slot, _) = self._spilled.popitem(last=False)
+            self._free_slots.append(slot)
+        slot = self._free_slots.pop()
+        self._spill[slot, :frame.nbytes] = frame.reshape(-1)
+        self._spilled[key] = (slot, frame.shape)
+
+    def _open_spill(self, slot_bytes):
+        """按第一帧的大小创建溢出文件"""
+        path = self.spill_path
+        if not path:
+            fd, path = tempfile.mkstemp(prefix="frame_cache_", suffix=".bin")
+            os.close(fd)
+            self._owns_spill_file = True
+        slots = max(1, self.spill_bytes // slot_bytes)
+        self._spill = np.memmap(path, dtype=np.uint8, mode="w+", shape=(slots, slot_bytes))
+        self._free_slots = list(range(slots))
@@ -0,0 +1,170 @@
+"""
+视频关键帧扫描与索引
+
+以原始数据包模式 (CAP_PROP_FORMAT = -1) 打开视频，只读取压缩包而不解码，
+通过 CAP_PROP_LRF_HAS_KEY_FRAME 判断每个包是否为关键帧。
+
+扫描结果作为关键帧索引保存在视频旁边 (<视频>.keyframes.json)，再次打开时直接
+读取；视频文件的大小或修改时间变化后索引自动失效。随机访问时，如果目标与当前
+位置在同一个 GOP 内且在当前位置之后，只 grab 不转换颜色地向前解码，不再定位；
+否则交给 OpenCV 定位（从目标之前的关键帧解码到目标）。两种情况的耗时都不超过
+一个 GOP 的解码时间，与视频长度无关。
+"""
+import bisect
+import json
+import os
+import threading
+
+import cv2
+
+INDEX_SUFFIX = ".keyframes.json"
+INDEX_VERSION = 1
+
+
+def _scan(path):
+    """扫描关键帧，返回 ([(帧序号, 时间戳毫秒), ...], 总帧数)"""
+    cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        return [(0, 0.0)], None
+
+    keyframes = []
+    index = 0
+    try:
+        while cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append((index, cap.get(cv2.CAP_PROP_POS_MSEC)))
+            index += 1
+    finally:
+        cap.release()
+
+    if not keyframes or keyframes[0][0] != 0:
+        keyframes.insert(0, (0, 0.0))
+    return keyframes, index or None
+
+
+def scan_keyframes(path):
+    """
+    扫描视频中的关键帧
+
+    返回:
+    - [(帧序号, 时间戳毫秒), ...]；后端不支持原始包模式时只返回第 0 帧
+    """
+    return _scan(path)[0]
+
+
+class KeyframeIndex:
+    """关键帧位置索引"""
+
+    def __init__(self, keyframes, frame_count=None):
+        """
+        参数:
+        - keyframes: [(帧序号, 时间戳毫秒), ...]，按帧序号递增
+        - frame_count: 扫描得到的总帧数，未知时为 None
+        """
+        self.keyframes = [(int(index), float(ms)) for index, ms in keyframes]
+        self.frame_count = frame_count
+        self._positions = [index for index, _ in self.keyframes]
+
+    def nearest(self, frame):
+        """
+        不晚于指定帧的最近关键帧
+
+        返回:
+        - (帧序号, 时间戳毫秒)
+        """
+        i = bisect.bisect_right(self._positions, frame) - 1
+        return self.keyframes[max(i, 0)]
+
+    @staticmethod
+    def _fingerprint(video_path):
+        """视频文件的大小与修改时间，用于判断索引是否过期"""
+        stat = os.stat(video_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def save(self, video_path):
+        """
+        保存到视频旁边
+
+        返回:
+        - 是否保存成功（目录不可写时返回 False）
+        """
+        data = {"version": INDEX_VERSION, "frame_count": self.frame_count,
+                "keyframes": self.keyframes, **self._fingerprint(video_path)}
+        try:
+            with open(video_path + INDEX_SUFFIX, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            return True
+        except OSError:
+            return False
+
+    @classmethod
+    def load(cls, video_path):
+        """
+        读取视频旁边的索引
+
+        返回:
+        - KeyframeIndex；不存在、格式不对或已过期时返回 None
+        """
+        try:
+            with open(video_path + INDEX_SUFFIX, encoding="utf-8") as f:
+                data = json.load(f)
+            fingerprint = cls._fingerprint(video_path)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION or any(data.get(k) != v for k, v in fingerprint.items()):
+            return None
+        return cls(data["keyframes"], data.get("frame_count"))
+
+
+def load_or_build_index(path):
+    """读取保存的关键帧索引，没有或已过期时重新扫描并保存"""
+    index = KeyframeIndex.load(path)
+    if index is None:
+        index = KeyframeIndex(*_scan(path))
+        index.save(path)
+    return index
+
+
+class KeyframeIndexer:
+    """在后台线程中读取或建立关键帧索引"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = None
+        self.ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="keyframe-index", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """后台线程：建立索引"""
+        try:
+            self.index = load_or_build_index(self.path)
+        finally:
+            self.ready.set()
+
+
+def seek_frame(cap, target, index=None):
+    """
+    定位并解码指定帧
+
+    参数:
+    - cap: 已打开的 VideoCapture，读取后位于目标的下一帧
+    - target: 目标帧序号
+    - index: KeyframeIndex；为 None 时只有目标恰好是下一帧才不定位
+
+    返回:
+    - 目标帧；读取失败时返回 None
+    """
+    current = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    keyframe = index.nearest(target)[0] if index is not None else target
+    if keyframe <= current <= target:
+        # 当前位置与目标在同一个 GOP 内且在目标之前，直接向前解码，不再定位
+        for _ in range(target - current):
+            if not cap.grab():
+                return None
+    else:
+        # OpenCV 定位时从目标之前的关键帧解码到目标帧
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+
+    ret, frame = cap.read()
+    return frame if ret else None
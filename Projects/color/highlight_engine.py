@@ -0,0 +1,249 @@
+"""
+颜色突显引擎
+
+main.py / Test.py / try.py 共用的突显内核。掩码计算与灰度/彩色混合在一组
+预分配的缓冲区上完成：不再调用 cv2.split，不生成浮点亮度图，也不再使用
+花式索引分三次散写结果，每帧除输出外不产生整帧临时数组。
+
+通道比较统一在 int16 中进行，因此 `g + sensitivity` 不会再像 uint8 那样回绕；
+灰度使用 BT.601 权重的 8 位定点近似 (29*B + 150*G + 77*R) >> 8，最大值
+65280 恰好落在 uint16 范围内。
+"""
+import threading
+import time
+
+import numpy as np
+
+from color_match import HUE_PERIOD, as_matcher
+
+# BT.601 灰度权重的定点近似，按 B, G, R 顺序，总和为 256
+GRAY_WEIGHTS = (29, 150, 77)
+GRAY_SHIFT = 8
+
+# 支持的颜色规则
+COLOR_MODES = ("red", "green", "blue", "custom", "complement", "dual", "warm", "cool")
+
+# 单色突出规则: 模式 -> 主通道下标 (B=0, G=1, R=2)
+DOMINANT_CHANNELS = {"red": 2, "green": 1, "blue": 0}
+
+# 固定阈值规则: 模式 -> ((通道, 比较, 阈值), ...)
+THRESHOLD_RULES = {
+    "complement": ((2, ">", 150), (1, ">", 100), (0, "<", 100)),
+    "yellow": ((2, ">", 150), (1, ">", 150), (0, "<", 100)),
+    "cyan": ((1, ">", 150), (0, ">", 150), (2, "<", 100)),
+}
+
+# 组合规则: 模式 -> 取并集的子规则
+UNION_RULES = {
+    "dual": ("red", "blue"),
+    "warm": ("red", "yellow"),
+    "cool": ("blue", "cyan"),
+}
+
+# 每个引擎最多缓存的分辨率数量（四分屏的奇数尺寸会产生多种形状）
+MAX_CACHED_SHAPES = 8
+
+
+class FrameBuffers:
+    """单一分辨率下复用的工作缓冲区"""
+
+    def __init__(self, height, width):
+        shape = (height, width)
+        self.shape = shape
+        self.diff = np.empty(shape, dtype=np.int16)      # 通道差
+        self.dist = np.empty(shape, dtype=np.int32)      # 自定义颜色平方距离
+        self.dist_tmp = np.empty(shape, dtype=np.int32)
+        self.converted = None                            # 自定义颜色的 HSV/LAB 转换（用到时分配）
+        self.acc = np.empty(shape, dtype=np.uint16)      # 定点亮度累加
+        self.acc_tmp = np.empty(shape, dtype=np.uint16)
+        self.gray = np.empty(shape, dtype=np.uint8)
+        self.select = np.empty(shape, dtype=np.uint8)    # 掩码展开为 0/255
+        self.keep = np.empty(shape, dtype=np.uint8)      # 非匹配像素的灰度
+        self.mask = np.empty(shape, dtype=bool)
+        self.flag = np.empty(shape, dtype=bool)
+        self.rule = np.empty(shape, dtype=bool)
+        self.output = np.empty((height, width, 3), dtype=np.uint8)
+
+
+class HighlightEngine:
+    """
+    颜色突显引擎
+
+    引擎按分辨率缓存工作缓冲区，返回的掩码与默认输出都是这些缓冲区本身，
+    下一次调用时会被覆盖。引擎不是线程安全的，多线程时请通过
+    get_thread_engine() 为每个线程取得独立实例。
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get_buffers(self, height, width):
+        """获取（必要时创建）指定分辨率的工作缓冲区"""
+        key = (height, width)
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            if len(self._buffers) >= MAX_CACHED_SHAPES:
+                self._buffers.pop(next(iter(self._buffers)))
+            buffers = FrameBuffers(height, width)
+            self._buffers[key] = buffers
+        return buffers
+
+    def compute_mask(self, frame, mode, sensitivity, min_brightness, custom_color=None, version=None):
+        """
+        计算颜色掩码
+
+        参数:
+        - frame: 输入帧 (BGR, uint8，可以是更大图像的视图)
+        - mode: 颜色规则，见 COLOR_MODES；未知规则视为全部匹配
+        - sensitivity: 颜色敏感度
+        - min_brightness: 最小亮度阈值，None 表示不做亮度过滤
+        - custom_color: custom 模式的目标颜色 (B, G, R) 或 ColorMatcher
+        - version: 参数快照的版本号（见 params.py），其余参数必须取自同一个快照；
+          查找表等按版本缓存的引擎据此跳过参数比较，None 表示不使用
+
+        返回:
+        - 颜色掩码 (引擎内部缓冲区，下一次调用时被覆盖)
+        """
+        buffers = self.get_buffers(frame.shape[0], frame.shape[1])
+        self._accumulate_brightness(frame, buffers)
+        return self._build_mask(frame, mode, sensitivity, min_brightness, custom_color, buffers, version)
+
+    def apply(self, frame, mode, sensitivity, min_brightness, custom_color=None, out=None, profiler=None,
+              version=None):
+        """
+        突显目标颜色，其余像素转为灰度
+
+        参数:
+        - frame: 输入帧 (BGR, uint8)
+        - out: 输出位置，可以是结果图像中的区域视图；None 时使用内部缓冲区
+        - profiler: 可选的 Profiler，分别记录 mask 与 blend 两个阶段
+        - 其余参数同 compute_mask
+
+        返回:
+        - (结果图像, 颜色掩码)
+        """
+        buffers = self.get_buffers(frame.shape[0], frame.shape[1])
+        if out is None:
+            out = buffers.output
+
+        start = time.perf_counter() if profiler is not None else None
+        self._accumulate_brightness(frame, buffers)
+        mask = self._build_mask(frame, mode, sensitivity, min_brightness, custom_color, buffers, version)
+        if profiler is not None:
+            start = profiler.lap("mask", start)
+
+        # 灰度 = 累加值 >> 8
+        np.right_shift(buffers.acc, GRAY_SHIFT, out=buffers.gray, casting="unsafe")
+
+        # 按位选择: out = (frame & select) | (gray & ~select)，select 为 0/255。
+        # 逐通道写入，避免 (h, w, 1) 广播与 where= 走慢速内层循环
+        select, keep = buffers.select, buffers.keep
+        np.negative(mask.view(np.uint8), out=select)
+        np.bitwise_not(select, out=keep)
+        np.bitwise_and(buffers.gray, keep, out=keep)
+        for channel in range(3):
+            plane = out[..., channel]
+            np.bitwise_and(frame[..., channel], select, out=plane)
+            np.bitwise_or(plane, keep, out=plane)
+
+        if profiler is not None:
+            profiler.lap("blend", start)
+        return out, mask
+
+    def _accumulate_brightness(self, frame, buffers):
+        """计算定点亮度 29*B + 150*G + 77*R (uint16)"""
+        acc, tmp = buffers.acc, buffers.acc_tmp
+        np.multiply(frame[..., 0], GRAY_WEIGHTS[0], out=acc, dtype=np.uint16)
+        np.multiply(frame[..., 1], GRAY_WEIGHTS[1], out=tmp, dtype=np.uint16)
+        np.add(acc, tmp, out=acc)
+        np.multiply(frame[..., 2], GRAY_WEIGHTS[2], out=tmp, dtype=np.uint16)
+        np.add(acc, tmp, out=acc)
+
+    def _build_mask(self, frame, mode, sensitivity, min_brightness, custom_color, buffers, version=None):
+        """按规则写入 buffers.mask 并叠加亮度阈值（直接计算，不使用版本号）"""
+        mask = buffers.mask
+
+        if mode in DOMINANT_CHANNELS or mode in THRESHOLD_RULES:
+            self._rule_mask(frame, mode, sensitivity, mask, buffers)
+        elif mode in UNION_RULES:
+            first, second = UNION_RULES[mode]
+            self._rule_mask(frame, first, sensitivity, mask, buffers)
+            self._rule_mask(frame, second, sensitivity, buffers.rule, buffers)
+            np.logical_or(mask, buffers.rule, out=mask)
+        elif mode == "custom" and custom_color is not None:
+            self._custom_mask(frame, custom_color, sensitivity, mask, buffers)
+        else:
+            mask.fill(True)
+
+        # 亮度 > min_brightness  <=>  定点累加值 > min_brightness * 256
+        if min_brightness is not None and min_brightness >= 0:
+            threshold = min(int(min_brightness), 255) << GRAY_SHIFT
+            np.greater(buffers.acc, threshold, out=buffers.flag)
+            np.logical_and(mask, buffers.flag, out=mask)
+
+        return mask
+
+    def _rule_mask(self, frame, rule, sensitivity, out, buffers):
+        """计算单色突出或固定阈值规则"""
+        flag = buffers.flag
+        if rule in DOMINANT_CHANNELS:
+            channel = DOMINANT_CHANNELS[rule]
+            first, second = [c for c in (0, 1, 2) if c != channel]
+            np.subtract(frame[..., channel], frame[..., first], out=buffers.diff, dtype=np.int16)
+            np.greater(buffers.diff, sensitivity, out=out)
+            np.subtract(frame[..., channel], frame[..., second], out=buffers.diff, dtype=np.int16)
+            np.greater(buffers.diff, sensitivity, out=flag)
+            np.logical_and(out, flag, out=out)
+            return
+
+        conditions = THRESHOLD_RULES[rule]
+        for i, (channel, op, value) in enumerate(conditions):
+            compare = np.greater if op == ">" else np.less
+            target = out if i == 0 else flag
+            compare(frame[..., channel], value, out=target)
+            if i > 0:
+                np.logical_and(out, flag, out=out)
+
+    def _custom_mask(self, frame, custom_color, sensitivity, out, buffers):
+        """自定义颜色: 到任一目标的平方距离 < sensitivity^2 (int32，无开方)"""
+        matcher = as_matcher(custom_color)
+        source = matcher.convert(frame, buffers)
+        wrap_hue = matcher.space == "hsv"
+        dist, tmp = buffers.dist, buffers.dist_tmp
+        limit = int(sensitivity) ** 2 if sensitivity > 0 else 0
+
+        for i, target in enumerate(matcher.targets):
+            for channel, value in enumerate(target):
+                dest = dist if channel == 0 else tmp
+                np.subtract(source[..., channel], value, out=dest, dtype=np.int32)
+                if channel == 0 and wrap_hue:
+                    # 色相是环形的: 差值取 min(|d|, 180 - |d|)
+                    np.abs(dest, out=dest)
+                    np.subtract(HUE_PERIOD, dest, out=tmp)
+                    np.minimum(dest, tmp, out=dest)
+                np.multiply(dest, dest, out=dest)
+                if channel > 0:
+                    np.add(dist, tmp, out=dist)
+
+            if i == 0:
+                np.less(dist, limit, out=out)
+            else:
+                np.less(dist, limit, out=buffers.flag)
+                np.logical_or(out, buffers.flag, out=out)
+
+
+def color_ratio(mask):
+    """掩码中匹配像素的百分比"""
+    return np.count_nonzero(mask) / mask.size * 100 if mask.size else 0.0
+
+
+_thread_local = threading.local()
+
+
+def get_thread_engine():
+    """获取当前线程专属的引擎实例"""
+    engine = getattr(_thread_local, "engine", None)
+    if engine is None:
+        engine = HighlightEngine()
+        _thread_local.engine = engine
+    return engine
@@ -0,0 +1,163 @@
+"""
+静态区域复用的增量突显
+
+摄像头画面大部分区域在相邻帧之间几乎不变。增量模式把画面划分为固定大小的块，
+用稀疏采样的最大绝对差判断每块是否变化，只对变化的块重新计算掩码与输出，
+其余块直接沿用上一次的结果。
+
+- 采样起点逐帧轮换，落在采样点之间的细小变化最多 N*N 帧后也会被发现
+- 每块的参考图像只在该块重算时更新，缓慢的渐变会累积到阈值后触发重算，
+  因此沿用的像素与当前输入的差异不会长期超过阈值
+- 同一行中相邻的变化块合并为一个区域，一次调用引擎
+- 参数、引擎或分辨率变化时整帧重算
+- recompute_ratio 记录每帧重算的面积比例，用于观察节省的 CPU
+"""
+import cv2
+import numpy as np
+
+from color_match import as_matcher
+from highlight_engine import HighlightEngine
+
+# 默认块大小（像素），必须是采样步长的整数倍
+DEFAULT_BLOCK_SIZE = 32
+
+# 变化检测的采样步长：每隔 N 行 N 列取一个像素
+DEFAULT_SAMPLE_STEP = 4
+
+# 默认变化阈值：采样像素任一通道的绝对差，高于常见摄像头噪声
+DEFAULT_CHANGE_THRESHOLD = 24
+
+
+class IncrementalHighlighter:
+    """
+    按块复用上一帧结果的突显处理器
+
+    返回的结果与掩码是内部缓冲区，下一次调用时会被覆盖；
+    处理器按帧顺序维护状态，不是线程安全的。
+    """
+
+    def __init__(self, engine=None, block_size=DEFAULT_BLOCK_SIZE, threshold=DEFAULT_CHANGE_THRESHOLD,
+                 sample_step=DEFAULT_SAMPLE_STEP):
+        """
+        参数:
+        - engine: 突显引擎，默认新建 HighlightEngine
+        - block_size: 块大小（像素）
+        - threshold: 变化阈值，块内任一采样像素的通道绝对差超过该值即重算
+        - sample_step: 变化检测的采样步长
+        """
+        if block_size % sample_step:
+            raise ValueError("块大小必须是采样步长的整数倍")
+        self.engine = engine or HighlightEngine()
+        self.block_size = block_size
+        self.threshold = threshold
+        self.sample_step = sample_step
+
+        self.output = None
+        self.mask = None
+        self._reference = None      # 每块最近一次重算时的输入图像
+        self._diffs = {}            # 采样差值缓冲区，按采样尺寸缓存
+        self._params = None
+        self._grid = None
+
+        # 统计信息
+        self.recompute_ratio = 1.0  # 最近一帧重算的面积比例
+        self.frames = 0
+        self.recomputed_area = 0
+        self.total_area = 0
+
+    def reset(self):
+        """清除缓存，下一帧整帧重算"""
+        self._params = None
+
+    @property
+    def average_ratio(self):
+        """累计重算面积比例"""
+        return self.recomputed_area / self.total_area if self.total_area else 1.0
+
+    def _prepare(self, height, width):
+        """分辨率变化时重建缓冲区与块网格"""
+        step, block = self.sample_step, self.block_size
+        self.output = np.empty((height, width, 3), dtype=np.uint8)
+        self.mask = np.empty((height, width), dtype=bool)
+
+        self._reference = np.empty((height, width, 3), dtype=np.uint8)
+        self._diffs = {}
+
+        # 采样图像中每块的起点（以采样点计）
+        sample_block = block // step
+        self._grid = (np.arange(0, -(-height // step), sample_block),
+                      np.arange(0, -(-width // step), sample_block))
+
+    def changed_blocks(self, frame):
+        """
+        检测变化的块
+
+        返回:
+        - 块网格大小的布尔数组
+        """
+        step = self.sample_step
+        # 逐帧轮换采样起点: 行偏移每帧变化，列偏移每 step 帧变化
+        row_offset = self.frames % step
+        col_offset = (self.frames // step) % step
+        sample = frame[row_offset::step, col_offset::step]
+        reference = self._reference[row_offset::step, col_offset::step]
+
+        diff = self._diffs.get(sample.shape)
+        if diff is None:
+            diff = self._diffs[sample.shape] = np.empty(sample.shape, dtype=np.uint8)
+        cv2.absdiff(sample, reference, dst=diff)
+
+        row_starts, col_starts = self._grid
+        peaks = np.maximum.reduceat(diff, row_starts, axis=0)
+        peaks = np.maximum.reduceat(peaks, col_starts, axis=1)
+        return peaks.max(axis=2) > self.threshold
+
+    def apply(self, frame, mode, sensitivity, min_brightness, custom_color=None, version=None):
+        """
+        突显目标颜色，只重算变化的块
+
+        参数同 HighlightEngine.apply；version 传给各块的引擎调用
+
+        返回:
+        - (结果图像, 颜色掩码)，均为内部缓冲区
+        """
+        height, width = frame.shape[:2]
+        params = (height, width, id(self.engine), mode, sensitivity, min_brightness,
+                  as_matcher(custom_color))
+
+        if params != self._params:
+            if self._params is None or self._params[:2] != (height, width):
+                self._prepare(height, width)
+            self._params = params
+            changed = np.ones((len(self._grid[0]), len(self._grid[1])), dtype=bool)
+        else:
+            changed = self.changed_blocks(frame)
+
+        self._recompute(frame, changed, mode, sensitivity, min_brightness, custom_color, version)
+        return self.output, self.mask
+
+    def _recompute(self, frame, changed, mode, sensitivity, min_brightness, custom_color, version=None):
+        """重算变化的块并更新其参考图像"""
+        block = self.block_size
+        height, width = frame.shape[:2]
+        area = 0
+
+        for block_row in np.flatnonzero(changed.any(axis=1)):
+            # 同一行中相邻的变化块合并为一段
+            flags = np.concatenate(([False], changed[block_row], [False]))
+            edges = np.flatnonzero(flags[1:] != flags[:-1])
+            top, bottom = block_row * block, min((block_row + 1) * block, height)
+            for first, last in zip(edges[::2], edges[1::2]):
+                left, right = first * block, min(last * block, width)
+                rows, cols = slice(top, bottom), slice(left, right)
+                _, mask = self.engine.apply(frame[rows, cols], mode, sensitivity, min_brightness,
+                                            custom_color, out=self.output[rows, cols], version=version)
+                self.mask[rows, cols] = mask
+                self._reference[rows, cols] = frame[rows, cols]
+                area += (bottom - top) * (right - left)
+
+        total = height * width
+        self.recompute_ratio = area / total
+        self.frames += 1
+        self.recomputed_area += area
+        self.total_area += total
@@ -0,0 +1,162 @@
+"""
+显示布局合成
+
+并排、上下、单画面和四视图布局原来每帧都用 np.hstack / np.vstack 拼接，四视图
+还要额外 resize 三次并新建统计图，每帧分配一块两倍大小的新数组。这里改为:
+
+- 每种布局按分辨率预先分配一块画布，原图和处理结果直接写入画布上的视图，
+  并排 / 上下 / 单画面布局不再需要任何拼接
+- 四视图的缩小用 cv2.resize 的 dst= 写入各格，掩码经过复用的小缓冲区转换
+- 画布放在按几何形状分组的池中复用；流水线中同时在途的帧各占一块，显示
+  之后归还。切换布局时只有几何形状变化才分配新画布，最近用过的几种形状
+  保留在池中，来回切换或录制时的原分辨率合成不会反复分配
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+LAYOUTS = ("side_by_side", "split_screen", "processed_only", "original_only", "quad_view")
+
+# 每种几何形状最多保留的空闲画布数
+DEFAULT_MAX_FREE = 16
+
+# 最多同时保留几种几何形状的画布池
+DEFAULT_MAX_GEOMETRIES = 3
+
+
+def layout_geometry(layout, width, height):
+    """
+    布局所需的缓冲区
+
+    返回:
+    - (画布形状, (额外缓冲区形状, ...))；原图或处理结果不在画布上原尺寸显示时
+      放在额外缓冲区中
+    """
+    full = (height, width, 3)
+    if layout == "split_screen":
+        return (height * 2, width, 3), ()
+    if layout in ("processed_only", "original_only"):
+        return full, (full,)
+    if layout == "quad_view":
+        half_w, half_h = width // 2, height // 2
+        return (half_h * 2, half_w * 2, 3), (full, full, (half_h, half_w))
+    return (height, width * 2, 3), ()  # side_by_side 及未知布局
+
+
+class LayoutFrame:
+    """一块布局画布及其上的视图"""
+
+    def __init__(self, geometry):
+        canvas_shape, extra_shapes = geometry
+        self.geometry = geometry
+        self.canvas = np.zeros(canvas_shape, dtype=np.uint8)
+        self._extra = [np.empty(shape, dtype=np.uint8) for shape in extra_shapes]
+        self.layout = None
+        self.original = None
+        self.processed = None
+        self.tiles = {}
+
+    def assign(self, layout, width, height):
+        """按布局设置原图、处理结果以及四视图各格对应的视图"""
+        canvas = self.canvas
+        self.layout = layout
+        self.tiles = {}
+        if layout == "split_screen":
+            self.original, self.processed = canvas[:height], canvas[height:]
+        elif layout == "processed_only":
+            self.original, self.processed = self._extra[0], canvas
+        elif layout == "original_only":
+            self.original, self.processed = canvas, self._extra[0]
+        elif layout == "quad_view":
+            half_h, half_w = canvas.shape[0] // 2, canvas.shape[1] // 2
+            self.original, self.processed = self._extra[0], self._extra[1]
+            self.tiles = {
+                "original": canvas[:half_h, :half_w],
+                "processed": canvas[:half_h, half_w:],
+                "mask": canvas[half_h:, :half_w],
+                "stats": canvas[half_h:, half_w:],
+            }
+        else:
+            self.original, self.processed = canvas[:, :width], canvas[:, width:]
+
+    def fill_quad(self, color_mask, lines):
+        """
+        四视图：把原图、处理结果和掩码缩小写入各格，统计格写入文字
+
+        参数:
+        - color_mask: 颜色掩码（布尔数组，原尺寸）
+        - lines: 统计格中的文字行
+        """
+        tiles = self.tiles
+        size = tiles["original"].shape[1::-1]
+        cv2.resize(self.original, size, dst=tiles["original"])
+        cv2.resize(self.processed, size, dst=tiles["processed"])
+
+        # 掩码 0/1 -> 0/255 后转为三通道，全部在复用的缓冲区中完成
+        small = self._extra[2]
+        cv2.resize(color_mask.view(np.uint8), size, dst=small, interpolation=cv2.INTER_NEAREST)
+        np.multiply(small, 255, out=small)
+        cv2.cvtColor(small, cv2.COLOR_GRAY2BGR, dst=tiles["mask"])
+
+        stats = tiles["stats"]
+        stats.fill(0)
+        for i, line in enumerate(lines):
+            cv2.putText(stats, line, (10, 30 + i * 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+
+class LayoutCompositor:
+    """按布局与分辨率复用画布（线程安全）"""
+
+    def __init__(self, max_free=DEFAULT_MAX_FREE, max_geometries=DEFAULT_MAX_GEOMETRIES):
+        """
+        参数:
+        - max_free: 每种几何形状最多保留的空闲画布数
+        - max_geometries: 最多同时保留几种几何形状的画布池
+        """
+        self.max_free = max_free
+        self.max_geometries = max_geometries
+        self._pools = OrderedDict()   # 几何形状 -> 空闲画布列表，按最近使用排序
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, layout, width, height):
+        """
+        取一块布局画布（处理结果直接写入其中的视图）
+
+        返回:
+        - LayoutFrame，用完后交给 release 归还
+        """
+        geometry = layout_geometry(layout, width, height)
+        with self._lock:
+            pool = self._pools.get(geometry)
+            if pool is None:
+                pool = self._pools[geometry] = []
+                while len(self._pools) > self.max_geometries:
+                    self._pools.popitem(last=False)
+            else:
+                self._pools.move_to_end(geometry)
+            frame = pool.pop() if pool else None
+            if frame is None:
+                self.allocated += 1
+            else:
+                self.reused += 1
+
+        if frame is None:
+            frame = LayoutFrame(geometry)
+        frame.assign(layout, width, height)
+        return frame
+
+    def release(self, frame):
+        """归还画布；归还之后其中的数据随时会被覆盖"""
+        if frame is None:
+            return
+        with self._lock:
+            pool = self._pools.get(frame.geometry)
+            if pool is not None and len(pool) < self.max_free:
+                pool.append(frame)
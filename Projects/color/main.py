@@ -2,21 +2,47 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import cv2
 import numpy as np
-import threading
-import queue
 import time
-from PIL import Image, ImageTk
 import random
 import os
 
+from color_lut import ColorLUT, get_thread_lut_engine
+from color_match import COLOR_SPACES, parse_colors
+from color_schedule import RANDOM_MODE, RandomColorSchedule
+from cv_backend import calibrate, describe, get_backend_engine
+from frame_cache import CachedFrame, FrameCache
+from frame_index import KeyframeIndexer, seek_frame
+from params import ParamStore, param_property
+from pipeline import END_OF_STREAM, POLICY_LOSSLESS, FramePipeline
+from playback import PlaybackScheduler
+from proxy import ProxyScaler
+from snapshot import SnapshotService
+from tile_pool import TilePool
+from tk_display import TkFrameDisplay
+
 class VideoSplitColorProcessor:
     """视频分割颜色突显处理器"""
     
-    def __init__(self, root):
+    # 影响处理结果的参数保存在 self.params 的不可变快照中：界面线程修改时整体替换
+    # 快照，处理线程每帧只取一次，各条带与缓存键使用同一组参数
+    split_mode = param_property("split_mode")
+    region_colors = param_property("region_colors", "区域颜色（只读映射，修改时整体替换）")
+    color_sensitivity = param_property("color_sensitivity")
+    min_brightness = param_property("min_brightness")
+    color_schedule = param_property("color_schedule")
+    custom_matcher = param_property("custom_matcher")
+    use_lut = param_property("use_lut")
+    use_proxy = param_property("use_proxy")
+    
+    def __init__(self, root=None):
+        """root 为 None 时只初始化处理状态，不创建界面（供基准测试等离线使用）"""
+        self.params = ParamStore()
+        
         # 初始化窗口
         self.root = root
-        self.root.title("视频分割颜色突显处理器")
-        self.root.geometry("1200x800")
+        if root is not None:
+            self.root.title("视频分割颜色突显处理器")
+            self.root.geometry("1200x800")
         
         # 状态变量
         self.video_path = None
@@ -48,14 +74,62 @@ class VideoSplitColorProcessor:
         self.color_sensitivity = 20
         self.min_brightness = 30
         
-        # 队列
-        self.frame_queue = queue.Queue(maxsize=10)
-        self.display_queue = queue.Queue(maxsize=5)
+        # random 区域的颜色由 (种子, 区域, 时间窗口) 决定，同一帧总是得到同样的颜色
+        self.random_seed = 0
+        self.random_window = 1.0
+        self.color_schedule = RandomColorSchedule(self.random_seed, self.random_window, self.fps)
+        
+        # 自定义颜色只在输入改变时解析（None 表示解析失败，全部匹配）
+        self.custom_matcher = parse_colors("0,0,255")
+        
+        # 查找表加速（表按参数缓存，拖动滑块只增量重建）
+        self.lut = ColorLUT()
+        self.use_lut = False
+        
+        # 计算后端（NumPy 参考实现 / OpenCV 原语），启动时按本机实测选择
+        self.calibration = calibrate()
+        self.backend = self.calibration["backend"]
+        print(f"计算后端: {describe(self.calibration)}")
+        
+        # 多线程分块处理（常驻线程池，条带直接写入结果视图）
+        self.tile_pool = TilePool()
+        self.use_tiles = self.tile_pool.workers > 1
+        
+        # 解码/处理/显示流水线（每帧内部已按条带并行，处理线程数不需要太多）
+        self.pipeline = None
+        self.pipeline_workers = 2
+        
+        # 代理预览：先缩小到画布尺寸再处理，截图时在原分辨率上重新处理
+        self.proxy = ProxyScaler()
+        self.use_proxy = True
+        self.preview_size = None
+        
+        # 按视频时间戳播放（落后时跳帧，显示端只等待剩余时间）
+        self.scheduler = None
+        self.pending_item = None
+        
+        # 时间轴拖动：关键帧索引在后台建立，拖动时合并为最近一次的目标帧
+        self.indexer = None
+        self.seek_target = 0
+        self.seek_scheduled = False
+        self.seek_resume = None
+        
+        # 处理结果缓存：按 (视频, 帧号, 处理参数) 缓存，循环播放与回看时只查缓存
+        self.frame_cache = FrameCache(budget_mb=512)
+        self.use_cache = True
+        self.frame_size = None
+        
+        # 截图：显示端发布最近一帧，拼图与编码在后台线程完成
+        self.snapshots = SnapshotService(self.build_snapshot)
+        self.burst_frames = 10
         
         # 性能跟踪
         self.frame_count = 0
         self.start_time = None
         
+        if root is None:
+            return
+        
         # 创建界面
         self.create_widgets()
         
@@ -109,6 +183,10 @@ class VideoSplitColorProcessor:
                                       command=self.take_snapshot, width=15, state=tk.DISABLED)
         self.snapshot_btn.grid(row=0, column=3, padx=(0, 5))
         
+        self.burst_btn = ttk.Button(button_frame, text=f"连拍 {self.burst_frames} 帧 (K)",
+                                   command=self.take_burst, width=15, state=tk.DISABLED)
+        self.burst_btn.grid(row=0, column=4, padx=(0, 5))
+        
         # 参数调节区域
         param_frame = ttk.Frame(control_frame)
         param_frame.grid(row=0, column=1, sticky=tk.E, padx=(20, 0))
@@ -133,6 +211,27 @@ class VideoSplitColorProcessor:
         self.brightness_label = ttk.Label(param_frame, text=f"{self.min_brightness}")
         self.brightness_label.grid(row=1, column=2)
         
+        # 查找表加速
+        self.lut_var = tk.BooleanVar(value=self.use_lut)
+        ttk.Checkbutton(param_frame, text="查找表加速 (L)", variable=self.lut_var,
+                        command=self.update_lut_mode).grid(row=2, column=0, columnspan=3, sticky=tk.W)
+        
+        # 多线程分块处理
+        self.tiles_var = tk.BooleanVar(value=self.use_tiles)
+        ttk.Checkbutton(param_frame, text=f"多线程分块 ({self.tile_pool.workers} 线程, T)",
+                        variable=self.tiles_var,
+                        command=self.update_tile_mode).grid(row=3, column=0, columnspan=3, sticky=tk.W)
+        
+        # 代理预览
+        self.proxy_var = tk.BooleanVar(value=self.use_proxy)
+        ttk.Checkbutton(param_frame, text="代理预览 (X)", variable=self.proxy_var,
+                        command=self.update_proxy_mode).grid(row=4, column=0, columnspan=3, sticky=tk.W)
+        
+        # 处理结果缓存
+        self.cache_var = tk.BooleanVar(value=self.use_cache)
+        ttk.Checkbutton(param_frame, text="处理结果缓存 (C)", variable=self.cache_var,
+                        command=self.update_cache_mode).grid(row=5, column=0, columnspan=3, sticky=tk.W)
+        
         # 分割模式选择
         mode_frame = ttk.LabelFrame(main_frame, text="分割模式", padding="10")
         mode_frame.grid(row=2, column=0, sticky=(tk.N, tk.S, tk.W), padx=(0, 10))
@@ -169,19 +268,40 @@ class VideoSplitColorProcessor:
             combo.grid(row=i, column=1, padx=(5, 0), pady=2)
             combo.bind("<<ComboboxSelected>>", lambda e, r=region: self.update_region_color(r))
         
-        # 自定义颜色设置
+        # 自定义颜色设置（多个颜色用分号分隔）
         ttk.Label(color_frame, text="自定义颜色 (B,G,R):").grid(row=4, column=0, sticky=tk.W, pady=(10, 2))
-        self.custom_color_entry = ttk.Entry(color_frame, width=15)
+        self.custom_color_var = tk.StringVar(value="0,0,255")
+        self.custom_color_entry = ttk.Entry(color_frame, width=15, textvariable=self.custom_color_var)
         self.custom_color_entry.grid(row=4, column=1, padx=(5, 0), pady=(10, 2))
-        self.custom_color_entry.insert(0, "0,0,255")
+        
+        ttk.Label(color_frame, text="匹配颜色空间:").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.color_space_var = tk.StringVar(value=self.custom_matcher.space)
+        space_combo = ttk.Combobox(color_frame, textvariable=self.color_space_var,
+                                   values=COLOR_SPACES, state="readonly", width=12)
+        space_combo.grid(row=5, column=1, padx=(5, 0), pady=2)
+        
+        self.custom_color_var.trace_add("write", lambda *args: self.update_custom_color())
+        self.color_space_var.trace_add("write", lambda *args: self.update_custom_color())
         
         # 视频显示区域
         self.video_frame = ttk.LabelFrame(main_frame, text="视频预览", padding="10")
         self.video_frame.grid(row=2, column=2, sticky=(tk.N, tk.S, tk.W, tk.E))
         
-        # 创建Canvas用于显示视频
+        # 创建Canvas用于显示视频（持久的图像项，缩放在工作线程完成）
         self.canvas = tk.Canvas(self.video_frame, bg="black", width=640, height=480)
+        
+        # 时间轴（先放在底部，窗口变小时不会被画布挤掉）
+        timeline_frame = ttk.Frame(self.video_frame)
+        timeline_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+        self.timeline_var = tk.DoubleVar(value=0)
+        self.timeline = ttk.Scale(timeline_frame, from_=0, to=1, orient=tk.HORIZONTAL,
+                                  variable=self.timeline_var, command=self.request_seek)
+        self.timeline.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.timeline_label = ttk.Label(timeline_frame, text="00:00 / 00:00", width=14)
+        self.timeline_label.pack(side=tk.LEFT, padx=(5, 0))
+        
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.display = TkFrameDisplay(self.canvas)
         
         # 状态栏
         self.status_bar = ttk.Label(main_frame, text="就绪", relief=tk.SUNKEN)
@@ -200,6 +320,8 @@ class VideoSplitColorProcessor:
         self.root.bind('<space>', lambda e: self.pause_video())
         self.root.bind('s', lambda e: self.take_snapshot())
         self.root.bind('S', lambda e: self.take_snapshot())
+        self.root.bind('k', lambda e: self.take_burst())
+        self.root.bind('K', lambda e: self.take_burst())
         
         # 分割模式快捷键
         self.root.bind('1', lambda e: self.set_split_mode("none"))
@@ -207,6 +329,20 @@ class VideoSplitColorProcessor:
         self.root.bind('3', lambda e: self.set_split_mode("vertical"))
         self.root.bind('4', lambda e: self.set_split_mode("both"))
         
+        # 查找表加速快捷键
+        self.root.bind('l', lambda e: self.toggle_lut())
+        self.root.bind('L', lambda e: self.toggle_lut())
+        
+        # 多线程分块快捷键
+        self.root.bind('t', lambda e: self.toggle_tiles())
+        self.root.bind('T', lambda e: self.toggle_tiles())
+        
+        # 代理预览快捷键
+        self.root.bind('x', lambda e: self.toggle_proxy())
+        self.root.bind('X', lambda e: self.toggle_proxy())
+        self.root.bind('c', lambda e: self.toggle_cache())
+        self.root.bind('C', lambda e: self.toggle_cache())
+        
         # 随机颜色快捷键
         self.root.bind('r', lambda e: self.randomize_colors())
         self.root.bind('R', lambda e: self.randomize_colors())
@@ -244,15 +380,26 @@ class VideoSplitColorProcessor:
                 raise Exception("无法打开视频文件")
             
             self.video_path = file_path
+            self.frame_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                               int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            self.frame_cache.clear()
             self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
             self.fps = int(self.cap.get(cv2.CAP_PROP_FPS))
             if self.fps == 0:
                 self.fps = 30
+            self.color_schedule = RandomColorSchedule(self.random_seed, self.random_window, self.fps)
+            
+            # 后台读取或建立关键帧索引，建好之前拖动时间轴直接按帧号定位
+            self.indexer = KeyframeIndexer(file_path)
+            self.root.after(200, lambda indexer=self.indexer: self.poll_index(indexer))
+            self.timeline.config(to=max(1, self.total_frames - 1))
+            self.update_timeline(0)
             
             # 启用播放按钮
             self.play_btn.config(state=tk.NORMAL)
             self.pause_btn.config(state=tk.NORMAL)
             self.snapshot_btn.config(state=tk.NORMAL)
+            self.burst_btn.config(state=tk.NORMAL)
             
             # 显示视频信息
             filename = os.path.basename(file_path)
@@ -282,27 +429,115 @@ class VideoSplitColorProcessor:
         self.is_paused = False
         self.start_time = time.time()
         self.frame_count = 0
-        
-        # 启动处理线程
-        self.processing_thread = threading.Thread(target=self.video_processing_loop, daemon=True)
-        self.processing_thread.start()
+        self.start_pipeline()
         
         # 启动显示更新
         self.update_video_display()
         
         self.status_bar.config(text="播放中...")
     
+    def start_pipeline(self):
+        """从视频当前位置启动流水线（视频文件不丢帧，跳帧由调度器在解码端决定）"""
+        # 帧号由解码线程按 grab 计数，起点是当前位置（打开后为 0，定位后为目标的下一帧）
+        self.scheduler = PlaybackScheduler(self.cap.get(cv2.CAP_PROP_FPS),
+                                           start_position=int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)))
+        self.pending_item = None
+        self.pipeline = FramePipeline(self.read_frame, self.render_frame,
+                                      workers=self.pipeline_workers, policy=POLICY_LOSSLESS,
+                                      timestamps=True)
+        if self.is_paused:
+            self.scheduler.pause()
+            self.pipeline.paused = True
+        self.pipeline.start()
+    
     def pause_video(self):
         """暂停/继续视频"""
         if not self.is_playing:
             return
         
         self.is_paused = not self.is_paused
+        self.pipeline.paused = self.is_paused
         if self.is_paused:
+            self.scheduler.pause()
             self.status_bar.config(text="已暂停")
         else:
+            self.scheduler.resume()
             self.status_bar.config(text="播放中...")
     
+    def poll_index(self, indexer):
+        """关键帧索引建好后更新准确的总帧数（Tk线程轮询，换了视频后停止）"""
+        if indexer is not self.indexer:
+            return
+        if not indexer.ready.is_set():
+            self.root.after(200, lambda: self.poll_index(indexer))
+            return
+        
+        index = indexer.index
+        if index is not None and index.frame_count:
+            self.total_frames = index.frame_count
+            self.timeline.config(to=max(1, self.total_frames - 1))
+            print(f"关键帧索引: {len(index.keyframes)} 个关键帧, {index.frame_count} 帧")
+    
+    def update_timeline(self, position):
+        """更新时间轴位置与时间显示（不触发定位）"""
+        self.timeline_var.set(position)
+        current = int(position / self.fps)
+        total = int(self.total_frames / self.fps)
+        self.timeline_label.config(text=f"{current // 60:02d}:{current % 60:02d} / "
+                                        f"{total // 60:02d}:{total % 60:02d}")
+    
+    def request_seek(self, value):
+        """拖动时间轴（连续拖动时只定位到最近一次的位置）"""
+        if self.cap is None or not self.cap.isOpened():
+            return
+        self.seek_target = int(float(value))
+        if not self.seek_scheduled:
+            self.seek_scheduled = True
+            self.root.after(15, self.perform_seek)
+    
+    def perform_seek(self):
+        """定位到时间轴选中的帧并显示，播放中时从该帧继续播放"""
+        self.seek_scheduled = False
+        if self.cap is None:
+            return
+        
+        target = min(self.seek_target, max(0, self.total_frames - 1))
+        start = time.perf_counter()
+        
+        # 解码线程与定位共用同一个 VideoCapture，先停止流水线（拖动期间保持停止）
+        if self.is_playing and self.pipeline.running:
+            self.pipeline.stop()
+        
+        index = self.indexer.index if self.indexer is not None else None
+        frame = seek_frame(self.cap, target, index)
+        if frame is None:
+            self.status_bar.config(text=f"无法定位到第 {target + 1} 帧")
+        else:
+            # 来回拖动到处理过的位置时直接使用缓存结果
+            params = self.params.current
+            cached = self.frame_cache.get((self.video_path, target, self.processing_key(params))) if self.use_cache else None
+            processed, prepared, _, params = self.render_at(frame if cached is None else CachedFrame(cached),
+                                                            target, params)
+            self.display.show(prepared)
+            self.snapshots.publish((frame, processed, target, params))
+            self.current_frame = target + 1
+            self.update_timeline(target)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.status_bar.config(text=f"定位到第 {self.current_frame} 帧 | 耗时: {elapsed_ms:.0f}ms"
+                                        f"{'' if index is not None else ' (索引建立中)'}")
+        
+        # 停止拖动一段时间后才从当前位置继续播放
+        if self.is_playing:
+            if self.seek_resume is not None:
+                self.root.after_cancel(self.seek_resume)
+            self.seek_resume = self.root.after(200, self.resume_after_seek)
+    
+    def resume_after_seek(self):
+        """拖动结束后重新启动流水线"""
+        self.seek_resume = None
+        if self.is_playing and not self.pipeline.running:
+            self.start_pipeline()
+    
     def set_split_mode(self, mode):
         """设置分割模式"""
         self.split_mode = mode
@@ -323,207 +558,296 @@ class VideoSplitColorProcessor:
         self.min_brightness = int(float(value))
         self.brightness_label.config(text=f"{self.min_brightness}")
     
+    def update_lut_mode(self):
+        """更新查找表加速开关"""
+        self.use_lut = self.lut_var.get()
+        self.status_bar.config(text=f"查找表加速: {'开' if self.use_lut else '关'}")
+    
+    def toggle_lut(self):
+        """切换查找表加速"""
+        self.lut_var.set(not self.lut_var.get())
+        self.update_lut_mode()
+    
+    def update_tile_mode(self):
+        """更新多线程分块开关"""
+        self.use_tiles = self.tiles_var.get()
+        self.status_bar.config(text=f"多线程分块: {'开' if self.use_tiles else '关'}")
+    
+    def toggle_tiles(self):
+        """切换多线程分块"""
+        self.tiles_var.set(not self.tiles_var.get())
+        self.update_tile_mode()
+    
+    def update_proxy_mode(self):
+        """更新代理预览开关"""
+        self.use_proxy = self.proxy_var.get()
+        self.status_bar.config(text=f"代理预览: {'开' if self.use_proxy else '关'}")
+    
+    def toggle_proxy(self):
+        """切换代理预览"""
+        self.proxy_var.set(not self.proxy_var.get())
+        self.update_proxy_mode()
+    
+    def update_cache_mode(self):
+        """更新处理结果缓存开关（关闭时释放已缓存的帧）"""
+        self.use_cache = self.cache_var.get()
+        if not self.use_cache:
+            self.frame_cache.clear()
+        self.status_bar.config(text=f"处理结果缓存: {'开' if self.use_cache else '关'}")
+    
+    def toggle_cache(self):
+        """切换处理结果缓存"""
+        self.cache_var.set(not self.cache_var.get())
+        self.update_cache_mode()
+    
     def update_region_color(self, region):
         """更新区域颜色"""
         color = self.color_vars[region].get()
-        self.region_colors[region] = color
+        self.region_colors = {**self.region_colors, region: color}
         print(f"区域 {region} 颜色更新为: {color}")
     
     def randomize_colors(self):
         """随机化所有区域颜色"""
         colors = ["red", "green", "blue", "random"]
+        region_colors = {}
         for region in self.region_colors.keys():
             color = random.choice(colors)
-            self.region_colors[region] = color
+            region_colors[region] = color
             self.color_vars[region].set(color)
+        self.region_colors = region_colors  # 所有区域在同一个快照中生效
         
         self.status_bar.config(text="颜色已随机化")
         print("所有区域颜色已随机化")
     
+    def update_custom_color(self):
+        """自定义颜色或匹配颜色空间改变时重新解析"""
+        try:
+            self.custom_matcher = parse_colors(self.custom_color_var.get(), self.color_space_var.get())
+            self.status_bar.config(text=f"自定义颜色: {len(self.custom_matcher.colors)} 个目标, "
+                                        f"颜色空间 {self.custom_matcher.space}")
+        except ValueError:
+            self.custom_matcher = None
+            self.status_bar.config(text="自定义颜色格式错误，应为 B,G,R（多个颜色用分号分隔）")
+    
+    def resolve_color_mode(self, color_mode, region="top_left", position=0, params=None):
+        """
+        解析区域颜色模式
+        
+        参数:
+        - color_mode: 区域颜色设置
+        - region: 区域名称（random 模式下不同区域的颜色相互独立）
+        - position: 帧号（random 模式按帧号所在的时间窗口取颜色）
+        - params: 参数快照，None 表示当前快照
+        
+        返回:
+        - (颜色规则, 自定义颜色)
+        """
+        params = params or self.params.current
+        if color_mode == RANDOM_MODE:
+            # 确定性的随机颜色，同一时间窗口内不变
+            return params.color_schedule.color(region, position), None
+        if color_mode == "custom":
+            # 自定义颜色（已在输入改变时解析）
+            if params.custom_matcher is None:
+                return None, None  # 解析失败时全部匹配
+            return "custom", params.custom_matcher
+        return color_mode, None
+    
+    def get_engine(self, params=None):
+        """获取当前线程使用的突显引擎"""
+        if (params or self.params.current).use_lut:
+            return get_thread_lut_engine(self.lut)
+        return get_backend_engine(self.backend)
+    
     def get_color_mask(self, frame, color_mode):
         """获取颜色掩码"""
-        b, g, r = cv2.split(frame)
-        
-        if color_mode == "red":
-            mask = (r > g + self.color_sensitivity) & (r > b + self.color_sensitivity)
-        elif color_mode == "green":
-            mask = (g > r + self.color_sensitivity) & (g > b + self.color_sensitivity)
-        elif color_mode == "blue":
-            mask = (b > r + self.color_sensitivity) & (b > g + self.color_sensitivity)
-        elif color_mode == "random":
-            # 随机选择一种颜色
-            colors = ["red", "green", "blue"]
-            color = random.choice(colors)
-            return self.get_color_mask(frame, color)
-        elif color_mode == "custom":
-            # 自定义颜色
-            try:
-                b_val, g_val, r_val = map(int, self.custom_color_entry.get().split(','))
-                color_diff = np.sqrt(
-                    (b.astype(float) - b_val) ** 2 +
-                    (g.astype(float) - g_val) ** 2 +
-                    (r.astype(float) - r_val) ** 2
-                )
-                mask = color_diff < self.color_sensitivity
-            except:
-                mask = np.ones(frame.shape[:2], dtype=bool)
-        else:
-            mask = np.ones(frame.shape[:2], dtype=bool)
-        
-        # 应用亮度阈值
-        brightness = 0.299 * r + 0.587 * g + 0.114 * b
-        mask = mask & (brightness > self.min_brightness)
-        
-        return mask
+        params = self.params.current
+        color_mode, custom_color = self.resolve_color_mode(color_mode, params=params)
+        return self.get_engine(params).compute_mask(
+            frame, color_mode, params.color_sensitivity, params.min_brightness, custom_color,
+            version=params.version)
     
-    def process_frame(self, frame):
-        """处理单帧图像"""
-        height, width = frame.shape[:2]
-        result = np.zeros_like(frame)
-        
-        # 根据分割模式处理
-        if self.split_mode == "none":
-            # 无分割，整个画面使用左上区域的颜色
-            color_mode = self.region_colors["top_left"]
-            mask = self.get_color_mask(frame, color_mode)
-            
-            # 计算灰度值
-            b, g, r = cv2.split(frame)
-            gray_values = (0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
-            
-            # 应用处理
-            result[mask] = frame[mask]
-            non_mask = ~mask
-            result[non_mask, 0] = gray_values[non_mask]
-            result[non_mask, 1] = gray_values[non_mask]
-            result[non_mask, 2] = gray_values[non_mask]
-            
-            # 绘制分割线（不分割但显示区域）
-            cv2.line(result, (0, height//2), (width, height//2), (255, 255, 255), 1)
-            cv2.line(result, (width//2, 0), (width//2, height), (255, 255, 255), 1)
-            
-        elif self.split_mode == "horizontal":
-            # 水平分割
-            top_half = frame[0:height//2, :]
-            bottom_half = frame[height//2:, :]
-            
-            # 处理上半部分（使用左上颜色）
-            top_result = self.apply_color_filter(top_half, self.region_colors["top_left"])
-            result[0:height//2, :] = top_result
-            
-            # 处理下半部分（使用左下颜色）
-            bottom_result = self.apply_color_filter(bottom_half, self.region_colors["bottom_left"])
-            result[height//2:, :] = bottom_result
-            
-            # 绘制分割线
-            cv2.line(result, (0, height//2), (width, height//2), (0, 255, 255), 3)
-            
-        elif self.split_mode == "vertical":
-            # 垂直分割
-            left_half = frame[:, 0:width//2]
-            right_half = frame[:, width//2:]
-            
-            # 处理左半部分（使用左上颜色）
-            left_result = self.apply_color_filter(left_half, self.region_colors["top_left"])
-            result[:, 0:width//2] = left_result
-            
-            # 处理右半部分（使用右上颜色）
-            right_result = self.apply_color_filter(right_half, self.region_colors["top_right"])
-            result[:, width//2:] = right_result
-            
-            # 绘制分割线
-            cv2.line(result, (width//2, 0), (width//2, height), (0, 255, 255), 3)
-            
-        elif self.split_mode == "both":
+    def get_split_regions(self, height, width, split_mode=None):
+        """按分割模式返回各区域 [(区域颜色键, 行切片, 列切片), ...]"""
+        if split_mode is None:
+            split_mode = self.split_mode
+        half_h = height // 2
+        half_w = width // 2
+        top, bottom = slice(0, half_h), slice(half_h, height)
+        left, right = slice(0, half_w), slice(half_w, width)
+        all_rows, all_cols = slice(0, height), slice(0, width)
+        
+        if split_mode == "horizontal":
+            # 上半部分使用左上颜色，下半部分使用左下颜色
+            return [("top_left", top, all_cols), ("bottom_left", bottom, all_cols)]
+        if split_mode == "vertical":
+            # 左半部分使用左上颜色，右半部分使用右上颜色
+            return [("top_left", all_rows, left), ("top_right", all_rows, right)]
+        if split_mode == "both":
             # 水平和垂直分割（四等分）
-            half_h = height // 2
-            half_w = width // 2
-            
-            # 四个区域
-            top_left = frame[0:half_h, 0:half_w]
-            top_right = frame[0:half_h, half_w:]
-            bottom_left = frame[half_h:, 0:half_w]
-            bottom_right = frame[half_h:, half_w:]
-            
-            # 分别处理每个区域
-            tl_result = self.apply_color_filter(top_left, self.region_colors["top_left"])
-            tr_result = self.apply_color_filter(top_right, self.region_colors["top_right"])
-            bl_result = self.apply_color_filter(bottom_left, self.region_colors["bottom_left"])
-            br_result = self.apply_color_filter(bottom_right, self.region_colors["bottom_right"])
-            
-            # 合并结果
-            result[0:half_h, 0:half_w] = tl_result
-            result[0:half_h, half_w:] = tr_result
-            result[half_h:, 0:half_w] = bl_result
-            result[half_h:, half_w:] = br_result
-            
-            # 绘制分割线
+            return [("top_left", top, left), ("top_right", top, right),
+                    ("bottom_left", bottom, left), ("bottom_right", bottom, right)]
+        # 无分割，整个画面使用左上区域的颜色
+        return [("top_left", all_rows, all_cols)]
+    
+    def process_frame(self, frame, position=0, params=None):
+        """
+        处理单帧图像
+        
+        参数:
+        - frame: 输入帧
+        - position: 帧号，决定 random 区域的颜色
+        - params: 参数快照，None 表示当前快照（整帧只读取一次）
+        """
+        params = params or self.params.current
+        height, width = frame.shape[:2]
+        result = np.empty_like(frame)
+        regions = self.get_split_regions(height, width, params.split_mode)
+        
+        # 各区域直接写入结果图像的对应视图
+        if self.use_tiles:
+            # 区域颜色每帧只解析一次，各条带共用同一个快照（查找表按快照版本直接命中）
+            tiles = [(rows, cols, self.resolve_color_mode(params.region_colors[region], region, position, params))
+                     for region, rows, cols in regions]
+            
+            def process_tile(rows, cols, color):
+                color_mode, custom_color = color
+                self.get_engine(params).apply(frame[rows, cols], color_mode, params.color_sensitivity,
+                                              params.min_brightness, custom_color, out=result[rows, cols],
+                                              version=params.version)
+            
+            self.tile_pool.run(tiles, process_tile)
+        else:
+            for region, rows, cols in regions:
+                self.apply_color_filter(frame[rows, cols], params.region_colors[region],
+                                        out=result[rows, cols], region=region, position=position,
+                                        params=params)
+        
+        # 绘制分割线
+        half_h = height // 2
+        half_w = width // 2
+        if params.split_mode == "none":
+            # 不分割但显示区域
+            cv2.line(result, (0, half_h), (width, half_h), (255, 255, 255), 1)
+            cv2.line(result, (half_w, 0), (half_w, height), (255, 255, 255), 1)
+        if params.split_mode in ("horizontal", "both"):
             cv2.line(result, (0, half_h), (width, half_h), (0, 255, 255), 3)
+        if params.split_mode in ("vertical", "both"):
             cv2.line(result, (half_w, 0), (half_w, height), (0, 255, 255), 3)
         
         return result
     
-    def apply_color_filter(self, region_frame, color_mode):
+    def apply_color_filter(self, region_frame, color_mode, out=None, region="top_left", position=0,
+                           params=None):
         """对区域应用颜色滤镜"""
-        height, width = region_frame.shape[:2]
-        result = np.zeros_like(region_frame)
-        
-        # 获取颜色掩码
-        mask = self.get_color_mask(region_frame, color_mode)
+        if out is None:
+            out = np.empty_like(region_frame)
         
-        # 计算灰度值
-        b, g, r = cv2.split(region_frame)
-        gray_values = (0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
+        params = params or self.params.current
+        color_mode, custom_color = self.resolve_color_mode(color_mode, region, position, params)
+        self.get_engine(params).apply(region_frame, color_mode, params.color_sensitivity,
+                                      params.min_brightness, custom_color, out=out,
+                                      version=params.version)
         
-        # 应用处理
-        result[mask] = region_frame[mask]
-        non_mask = ~mask
-        result[non_mask, 0] = gray_values[non_mask]
-        result[non_mask, 1] = gray_values[non_mask]
-        result[non_mask, 2] = gray_values[non_mask]
-        
-        return result
+        return out
     
-    def video_processing_loop(self):
-        """视频处理循环"""
+    def read_frame(self):
+        """
+        读取下一帧（在流水线解码线程中调用），视频结束时回到开头循环播放
+        
+        返回:
+        - (帧, 显示时间戳毫秒, 帧号)
+        """
+        lookup = self.lookup_cached if self.use_cache else None
         while self.is_playing and self.cap is not None:
-            if self.is_paused:
-                time.sleep(0.1)
-                continue
-            
-            # 读取帧
-            ret, frame = self.cap.read()
-            if not ret:
+            result = self.scheduler.read(self.cap, lookup)
+            if result is None:
                 # 视频结束，重置到开头
                 self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self.scheduler.mark_loop()
                 continue
-            
-            # 处理帧
-            processed_frame = self.process_frame(frame)
-            
-            # 放入队列
-            try:
-                self.frame_queue.put((frame, processed_frame), timeout=0.5)
-            except queue.Full:
-                pass  # 队列满时跳过
-            
-            self.current_frame += 1
-            self.frame_count += 1
-            
-            # 控制帧率
-            time.sleep(1.0 / self.fps)
+            return result
+        return None
+    
+    def processing_key(self, params):
+        """
+        影响处理结果的全部参数（缓存键的一部分）
+        
+        参数快照按内容复用，参数改回原值时版本号也回到原来的值，之前缓存的结果仍然命中
+        """
+        width, height = self.frame_size
+        size = self.display.target_size(width, height) if params.use_proxy else (width, height)
+        return (size, params.version, self.backend)
+    
+    def lookup_cached(self, pts, position):
+        """在解码线程中查缓存，命中时跳过 retrieve 与处理（键与定位时相同，都是解码得到的帧号）"""
+        key = (self.video_path, position, self.processing_key(self.params.current))
+        processed = self.frame_cache.get(key)
+        return None if processed is None else CachedFrame(processed)
+    
+    def render_frame(self, frame, pts, position):
+        """处理一帧并准备显示数据（在流水线处理线程中调用）"""
+        start = time.perf_counter()
+        result = self.render_at(frame, position)
+        self.scheduler.record_processing(time.perf_counter() - start)
+        return result
+    
+    def render_at(self, frame, position, params=None):
+        """
+        处理指定帧号的一帧（命中缓存时直接使用缓存结果）并准备显示数据
+        
+        返回:
+        - (处理结果, 显示数据, 帧号, 参数快照)
+        """
+        params = params or self.params.current
+        if isinstance(frame, CachedFrame):
+            processed = frame.processed
+        else:
+            key = (self.video_path, position, self.processing_key(params))
+            if params.use_proxy:
+                # 先缩小到显示尺寸再处理，之后的显示准备不再需要缩放
+                height, width = frame.shape[:2]
+                frame = self.proxy.downscale(frame, self.display.target_size(width, height))
+            processed = self.process_frame(frame, position, params)
+            if self.use_cache:
+                self.frame_cache.put(key, processed)
+        self.preview_size = processed.shape[1::-1]
+        prepared = self.display.prepare(processed)
+        return processed, prepared, position, params
     
     def update_video_display(self):
         """更新视频显示"""
         if not self.is_playing:
             return
         
-        try:
-            # 从队列获取帧
-            original, processed = self.frame_queue.get(timeout=0.1)
-            
-            # 更新显示
-            self.update_display(processed)
+        # 从流水线按顺序获取帧（不阻塞Tk主线程）
+        if self.pending_item is None:
+            item = self.pipeline.get(timeout=0)
+            if item is not None and item is not END_OF_STREAM:
+                self.pending_item = item
+        
+        delay_ms = 10
+        item = self.pending_item
+        if item is not None and not self.is_paused:
+            wait = self.scheduler.delay(item.pts)
+            if wait > 0.001:
+                # 还没到显示时刻，只等待剩余的时间
+                self.root.after(max(1, int(wait * 1000)), self.update_video_display)
+                return
+            
+            # 更新显示（Tk线程只需贴图）
+            self.pending_item = None
+            processed, prepared, position, params = item.result
+            self.display.show(prepared)
+            self.snapshots.publish((item.frame, processed, position, params))
+            self.scheduler.frame_presented(item.pts)
+            self.pipeline.mark_consumed(item, "display")
+            delay_ms = 1
+            
+            # 当前帧号取自解码线程的计数（跳过的帧也计入）
+            self.current_frame = position + 1
+            self.frame_count += 1
+            self.update_timeline(position)
             
             # 更新信息
             elapsed = time.time() - self.start_time
@@ -532,94 +856,85 @@ class VideoSplitColorProcessor:
             info_text = (f"帧: {self.current_frame}/{self.total_frames} | "
                         f"FPS: {fps:.1f} | "
                         f"模式: {self.split_modes[self.split_mode]} | "
-                        f"敏感度: {self.color_sensitivity}")
+                        f"敏感度: {self.color_sensitivity} | "
+                        f"UI: {self.display.ui_time_ms:.1f}ms/帧 | "
+                        f"处理尺寸: {self.preview_size[0]}x{self.preview_size[1]} | "
+                        f"后端: {'查找表' if self.use_lut else self.backend} | "
+                        f"缓存: 命中 {self.frame_cache.hit_ratio * 100:.0f}% / {self.frame_cache.memory_mb:.0f}MB\n"
+                        f"{self.scheduler.summary()}\n"
+                        f"{self.pipeline.format_metrics()}")
             self.info_label.config(text=info_text)
-            
-        except queue.Empty:
-            pass  # 队列为空，跳过
         
         # 继续更新
-        self.root.after(10, self.update_video_display)
+        self.root.after(delay_ms, self.update_video_display)
     
     def update_display(self, frame):
-        """更新显示画面"""
-        # 调整大小以适应Canvas
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-        
-        if canvas_width > 1 and canvas_height > 1:
-            # 计算缩放比例
-            frame_height, frame_width = frame.shape[:2]
-            scale_w = canvas_width / frame_width
-            scale_h = canvas_height / frame_height
-            scale = min(scale_w, scale_h)
-            
-            new_width = int(frame_width * scale)
-            new_height = int(frame_height * scale)
-            
-            if new_width > 0 and new_height > 0:
-                frame_resized = cv2.resize(frame, (new_width, new_height))
-            else:
-                frame_resized = frame
-        else:
-            frame_resized = cv2.resize(frame, (640, 480))
-        
-        # 转换为PIL图像
-        frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(frame_rgb)
-        
-        # 转换为Tkinter图像
-        self.tk_image = ImageTk.PhotoImage(pil_image)
-        
-        # 更新Canvas
-        self.canvas.delete("all")
-        self.canvas.create_image(canvas_width//2, canvas_height//2, 
-                                anchor=tk.CENTER, image=self.tk_image)
+        """更新显示画面（Tk线程，直接缩放并显示）"""
+        self.display.display(frame)
     
     def take_snapshot(self):
-        """截图保存"""
+        """截图保存（只从最近显示的一帧取数据，写盘在后台完成）"""
+        if not self.is_playing:
+            messagebox.showwarning("警告", "请先播放视频")
+            return
+        
+        if self.snapshots.capture():
+            self.status_bar.config(text=f"截图已加入保存队列，保存到 {self.snapshots.save_dir} 目录")
+        elif self.snapshots.pending:
+            self.status_bar.config(text="截图队列已满，请稍后再试")
+        else:
+            messagebox.showerror("错误", "截图失败: 暂无可用的帧")
+    
+    def take_burst(self):
+        """连拍：保存接下来显示的若干帧"""
         if not self.is_playing:
             messagebox.showwarning("警告", "请先播放视频")
             return
         
+        self.snapshots.burst(self.burst_frames)
+        self.status_bar.config(text=f"连拍 {self.burst_frames} 帧，保存到 {self.snapshots.save_dir} 目录")
+    
+    def read_source_frame(self, position):
+        """用独立的 VideoCapture 读取指定帧（截图后台线程中调用）"""
+        cap = cv2.VideoCapture(self.video_path)
         try:
-            # 从队列获取当前帧
-            original, processed = self.frame_queue.get(timeout=0.5)
-            
-            # 保存文件
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            
-            # 创建保存目录
-            save_dir = "snapshots"
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-            
-            # 保存原始帧
-            original_path = os.path.join(save_dir, f"original_{timestamp}.jpg")
-            cv2.imwrite(original_path, original)
-            
-            # 保存处理后的帧
-            processed_path = os.path.join(save_dir, f"processed_{timestamp}.jpg")
-            cv2.imwrite(processed_path, processed)
-            
-            # 保存并排对比
-            combined = np.hstack([original, processed])
-            combined_path = os.path.join(save_dir, f"combined_{timestamp}.jpg")
-            cv2.imwrite(combined_path, combined)
-            
-            self.status_bar.config(text=f"截图已保存到 {save_dir} 目录")
-            print(f"截图已保存: {original_path}, {processed_path}, {combined_path}")
-            
-        except Exception as e:
-            messagebox.showerror("错误", f"截图失败: {str(e)}")
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+        if not ret:
+            raise IOError(f"无法读取第 {position} 帧")
+        return frame
+    
+    def build_snapshot(self, payload):
+        """生成截图的各张图像（在截图后台线程中调用）"""
+        original, processed, position, params = payload
+        if isinstance(original, CachedFrame):
+            # 命中缓存的帧没有解码原图，按帧号重新读取
+            original = self.read_source_frame(position)
+        
+        # 代理预览的结果是缩小后的，截图用同样的参数快照在原分辨率上重新处理
+        if processed.shape != original.shape:
+            processed = self.process_frame(original, position, params)
+        
+        # 原始帧、处理后的帧与并排对比
+        combined = np.hstack([original, processed])
+        return [("original", original), ("processed", processed), ("combined", combined)]
     
     def on_closing(self):
         """关闭窗口时的清理"""
         self.is_playing = False
         
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        
         if self.cap is not None:
             self.cap.release()
         
+        # 等待排队的截图写完，删除缓存的溢出文件
+        self.snapshots.close()
+        self.frame_cache.close()
+        
         self.root.destroy()
 
 # 主程序
@@ -649,6 +964,9 @@ if __name__ == "__main__":
     print("  3 - 垂直分割模式")
     print("  4 - 水平和垂直分割")
     print("  R - 随机化区域颜色")
+    print("  L - 切换查找表加速")
+    print("  T - 切换多线程分块处理")
+    print("  X - 切换代理预览")
     print("  ESC - 退出程序")
     print("=" * 60)
     
@@ -0,0 +1,370 @@
+"""
+多路视频源同步采集
+
+在一个进程内同时打开多个摄像头或视频文件:
+
+- 每路视频源一个采集线程。各线程在同步栅栏处会合后同时 grab()（只取帧不解码，
+  很快），再各自 retrieve() 解码，各路画面的采集时刻尽量对齐；某一路卡住时
+  其余各路等待超时后继续，不会被拖停
+- 解码后的帧交给所有视频源共享的处理线程池，每路最多一帧在处理，处理不过来
+  时用最新帧替换等待中的帧并计入丢帧。NumPy / OpenCV 运算释放 GIL，CPU 占用
+  随路数接近线性增长
+- 最新的处理结果拼接成网格画面（预分配画布，各格直接缩放写入）
+- 统计每路的帧率、采集帧数、丢帧数，以及同一轮 grab 中各路采集时刻的偏差
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# 同步栅栏的等待超时（秒），超时后不再等待迟到的视频源
+DEFAULT_SYNC_TIMEOUT = 0.1
+
+# 网格中每一格的默认尺寸 (宽, 高)
+DEFAULT_TILE_SIZE = (480, 360)
+
+# 计算帧率的滑动窗口（帧）
+FPS_WINDOW = 30
+
+
+def open_source(source):
+    """数字按摄像头编号打开，其余按视频文件路径打开"""
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return cv2.VideoCapture(source)
+
+
+class GrabBarrier:
+    """可退出的同步栅栏：各采集线程到齐后同时放行，等待超时则放行已到的线程"""
+
+    def __init__(self, parties):
+        self.parties = parties
+        self.timeouts = 0
+        self._arrived = 0
+        self._generation = 0
+        self._cond = threading.Condition()
+
+    def wait(self, timeout):
+        """
+        等待其余采集线程
+
+        返回:
+        - 本轮的编号（同一轮放行的线程得到相同编号）
+        """
+        with self._cond:
+            generation = self._generation
+            self._arrived += 1
+            if self._arrived >= self.parties:
+                self._release()
+            elif not self._cond.wait_for(lambda: self._generation != generation, timeout):
+                if self._generation == generation:
+                    self.timeouts += 1
+                    self._release()
+            return generation
+
+    def leave(self):
+        """采集线程退出（视频结束或出错），之后不再等待它"""
+        with self._cond:
+            self.parties -= 1
+            if self._arrived and self._arrived >= self.parties:
+                self._release()
+
+    def wake(self):
+        """放行所有等待中的线程（停止时调用）"""
+        with self._cond:
+            self._release()
+
+    def _release(self):
+        """开始新一轮（调用方持有锁）"""
+        self._arrived = 0
+        self._generation += 1
+        self._cond.notify_all()
+
+
+class CaptureSource:
+    """一路视频源的采集状态与统计"""
+
+    def __init__(self, index, source, cap):
+        """
+        参数:
+        - index: 视频源序号
+        - source: 摄像头编号或文件路径
+        - cap: 已打开的 VideoCapture
+        """
+        self.index = index
+        self.source = source
+        self.cap = cap
+        self.is_file = not (isinstance(source, int) or str(source).isdigit())
+        self.nominal_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        self.ended = False
+
+        # 最新的处理结果
+        self.result = None
+
+        # 统计信息
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self._done_times = deque(maxlen=FPS_WINDOW)
+
+        # 每路最多一帧在处理，处理期间到达的帧只保留最新的一帧
+        self._lock = threading.Lock()
+        self._busy = False
+        self._pending = None
+
+    @property
+    def name(self):
+        """显示用名称"""
+        return f"Cam {self.source}" if not self.is_file else os.path.basename(str(self.source))
+
+    @property
+    def fps(self):
+        """最近一段时间的处理帧率"""
+        times = self._done_times
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def reset_stats(self):
+        """重置统计"""
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self._done_times.clear()
+
+    def summary(self):
+        """统计摘要"""
+        return (f"{self.name}: {self.fps:.1f} FPS | 采集 {self.captured} 帧 | "
+                f"处理 {self.processed} 帧 | 丢帧 {self.dropped}")
+
+
+class MultiCapture:
+    """多路视频源的同步采集与共享线程池处理"""
+
+    def __init__(self, sources, process, workers=None, sync=True, loop=True,
+                 sync_timeout=DEFAULT_SYNC_TIMEOUT):
+        """
+        参数:
+        - sources: 摄像头编号或视频文件路径列表
+        - process: process(视频源序号, 帧) -> 结果；在共享线程池中并行调用，必须线程安全，
+          返回的结果会被显示线程读取，不能是之后会被覆盖的缓冲区
+        - workers: 处理线程数，默认 CPU 核数
+        - sync: 是否在同步栅栏处对齐各路的 grab()
+        - loop: 视频文件结束后是否从头循环
+        - sync_timeout: 同步栅栏的等待超时（秒）
+        """
+        self.process = process
+        self.workers = workers or os.cpu_count() or 1
+        self.sync = sync
+        self.loop = loop
+        self.sync_timeout = sync_timeout
+
+        self.sources = []
+        self.failed = []
+        for source in sources:
+            cap = open_source(source)
+            if cap.isOpened():
+                self.sources.append(CaptureSource(len(self.sources), source, cap))
+            else:
+                cap.release()
+                self.failed.append(source)
+
+        # 同一轮 grab 的最早与最晚时刻: 轮编号 -> [最早, 最晚, 已 grab 的路数]
+        self._rounds = {}
+        self._rounds_lock = threading.Lock()
+        self.last_skew_ms = 0.0
+        self.max_skew_ms = 0.0
+
+        self._stop = threading.Event()
+        self._barrier = None
+        self._threads = []
+        self._executor = None
+
+    @property
+    def running(self):
+        """是否还有视频源在采集"""
+        return not self._stop.is_set() and any(not s.ended for s in self.sources)
+
+    def start(self):
+        """启动采集线程与处理线程池"""
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="multi")
+        self._barrier = GrabBarrier(len(self.sources)) if self.sync and len(self.sources) > 1 else None
+        self._threads = [threading.Thread(target=self._capture_loop, args=(source,),
+                                          name=f"capture-{source.index}", daemon=True)
+                         for source in self.sources]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """停止采集并释放所有视频源"""
+        self._stop.set()
+        if self._barrier is not None:
+            self._barrier.wake()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for source in self.sources:
+            source.cap.release()
+
+    def results(self):
+        """各路最新的处理结果（尚无结果的为 None）"""
+        return [source.result for source in self.sources]
+
+    def skew_ms(self):
+        """最近完成的一轮同步 grab 中各路采集时刻的最大偏差（毫秒）"""
+        return self.last_skew_ms
+
+    def reset_stats(self):
+        """重置各路统计"""
+        for source in self.sources:
+            source.reset_stats()
+        self.max_skew_ms = 0.0
+        if self._barrier is not None:
+            self._barrier.timeouts = 0
+
+    def summary(self):
+        """所有视频源的统计摘要（多行）"""
+        lines = [source.summary() for source in self.sources]
+        if self._barrier is not None:
+            lines.append(f"采集时刻偏差: 最近 {self.last_skew_ms:.1f}ms / 最大 {self.max_skew_ms:.1f}ms | "
+                         f"同步超时: {self._barrier.timeouts} 次")
+        return "\n".join(lines)
+
+    def _capture_loop(self, source):
+        """采集线程：同步 grab，解码后交给共享线程池"""
+        # 视频文件按标称帧率读取，和摄像头一样实时推进
+        interval = 1.0 / source.nominal_fps if source.is_file else 0.0
+        next_due = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                round_id = None
+                if self._barrier is not None:
+                    round_id = self._barrier.wait(self.sync_timeout)
+                    if self._stop.is_set():
+                        break
+
+                if not source.cap.grab():
+                    if source.is_file and self.loop and source.captured > 0:
+                        source.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                grab_time = time.perf_counter()
+                source.captured += 1
+                if round_id is not None:
+                    self._record_grab(round_id, grab_time)
+
+                ret, frame = source.cap.retrieve()
+                if ret:
+                    self._submit(source, frame)
+
+                if interval:
+                    next_due += interval
+                    delay = next_due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif delay < -interval:
+                        next_due = time.perf_counter()  # 落后太多时不再追赶
+        finally:
+            source.ended = True
+            if self._barrier is not None:
+                self._barrier.leave()
+
+    def _record_grab(self, round_id, grab_time):
+        """记录同一轮的 grab 时刻，各路都 grab 完后更新偏差"""
+        with self._rounds_lock:
+            entry = self._rounds.get(round_id)
+            if entry is None:
+                entry = self._rounds[round_id] = [grab_time, grab_time, 0]
+                # 只保留最近几轮（超时放行的轮次可能永远凑不齐）
+                for old in [r for r in self._rounds if r < round_id - 4]:
+                    del self._rounds[old]
+            entry[0] = min(entry[0], grab_time)
+            entry[1] = max(entry[1], grab_time)
+            entry[2] += 1
+            if entry[2] >= self._barrier.parties:
+                self.last_skew_ms = (entry[1] - entry[0]) * 1000
+                self.max_skew_ms = max(self.max_skew_ms, self.last_skew_ms)
+                del self._rounds[round_id]
+
+    def _submit(self, source, frame):
+        """提交处理；该路正在处理时替换等待中的帧"""
+        with source._lock:
+            if source._busy:
+                if source._pending is not None:
+                    source.dropped += 1
+                source._pending = frame
+                return
+            source._busy = True
+        self._executor.submit(self._process, source, frame)
+
+    def _process(self, source, frame):
+        """处理线程：处理一帧，完成后接着处理等待中的帧"""
+        while True:
+            try:
+                result = self.process(source.index, frame)
+            except Exception as e:
+                print(f"{source.name} 处理失败: {e}")
+                result = None
+            if result is not None:
+                source.result = result
+                source.processed += 1
+                source._done_times.append(time.perf_counter())
+
+            with source._lock:
+                if source._pending is None or self._stop.is_set():
+                    source._busy = False
+                    return
+                frame = source._pending
+                source._pending = None
+
+
+class Mosaic:
+    """把多路画面拼成网格（预分配画布，各格直接缩放写入）"""
+
+    def __init__(self, count, tile_size=DEFAULT_TILE_SIZE, cols=None):
+        """
+        参数:
+        - count: 画面数
+        - tile_size: 每格尺寸 (宽, 高)
+        - cols: 列数，默认接近正方形
+        """
+        self.tile_size = tile_size
+        self.cols = cols or max(1, math.ceil(math.sqrt(count)))
+        self.rows = max(1, math.ceil(count / self.cols))
+        width, height = tile_size
+        self.canvas = np.zeros((self.rows * height, self.cols * width, 3), dtype=np.uint8)
+        self.tiles = [self.canvas[(i // self.cols) * height:(i // self.cols + 1) * height,
+                                  (i % self.cols) * width:(i % self.cols + 1) * width]
+                      for i in range(count)]
+
+    def compose(self, frames, labels=None):
+        """
+        拼接画面
+
+        参数:
+        - frames: 每格的 BGR 画面，None 表示该格显示黑色
+        - labels: 每格左上角的文字
+
+        返回:
+        - 网格画布（复用同一块内存，下一次调用时被覆盖）
+        """
+        labels = labels or [None] * len(self.tiles)
+        for tile, frame, label in zip(self.tiles, frames, labels):
+            if frame is None:
+                tile[:] = 0
+            elif frame.shape[:2] == tile.shape[:2]:
+                tile[:] = frame
+            else:
+                cv2.resize(frame, self.tile_size, dst=tile, interpolation=cv2.INTER_AREA)
+            if label:
+                cv2.putText(tile, label, (8, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        return self.canvas
@@ -0,0 +1,163 @@
+"""
+信息覆盖层文字缓存
+
+覆盖层每帧要画十几行 cv2.putText，而帮助文字、模式、参数等大多数帧都不变。
+这里把文字预先光栅化为小块预乘 alpha 的贴图:
+
+- 静态文字按 (文字, 字号, 颜色, 线宽) 缓存，只光栅化一次
+- 数值字段（帧号、耗时、比例等）按字段名各占一个槽位，文字变化的那一帧
+  直接绘制，文字保持不变时才光栅化为贴图；每帧都在变的字段不会反复光栅化
+- 贴图裁剪到文字的实际外接框，每帧只在这些小矩形内按 alpha 混合（uint8 定点，
+  两次 OpenCV 调用），不复制整帧
+- 光栅化与 cv2.putText 使用相同的字体参数，位置与字形一致；抗锯齿边缘与
+  直接绘制相差不超过 1 个灰度级
+"""
+import threading
+
+import cv2
+import numpy as np
+
+# 默认字体
+DEFAULT_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# 静态文字贴图的最大缓存数
+DEFAULT_MAX_SPRITES = 256
+
+
+def _color_lut(color):
+    """alpha -> 预乘 alpha 的文字颜色 (round(alpha * c / 255)) 的查找表"""
+    alpha = np.arange(256, dtype=np.float32)[:, None] / 255
+    return np.round(alpha * np.float32(color[:3])).astype(np.uint8).reshape(256, 1, 3)
+
+
+class TextSprite:
+    """一段文字的预乘 alpha 贴图"""
+
+    def __init__(self, text, scale, color, thickness, font=DEFAULT_FONT, lut=None):
+        """
+        参数:
+        - text: 文字
+        - scale: 字号 (cv2.putText 的 fontScale)
+        - color: BGR 颜色
+        - thickness: 线宽
+        - font: 字体
+        - lut: 该颜色的预乘查找表，默认现算
+        """
+        (width, height), baseline = cv2.getTextSize(text, font, scale, thickness)
+        pad = thickness + 4
+        alpha = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+        cv2.putText(alpha, text, (pad, pad + height), font, scale, 255, thickness)
+
+        # 裁剪到实际绘制的像素，记录相对于文字基线起点的偏移
+        left, top, w, h = cv2.boundingRect(alpha)
+        alpha = alpha[top:top + h, left:left + w]
+        self.dx = left - pad
+        self.dy = top - pad - height
+        self.text = text
+        self.width, self.height = w, h
+        if w == 0 or h == 0:
+            # 空白文字没有可见像素，blit 时直接跳过
+            self._inv_alpha = self._premultiplied = None
+            return
+
+        # 混合用的 uint8 定点数据：画面 * (255 - alpha) / 255 + 预乘 alpha 的文字颜色
+        alpha3 = cv2.cvtColor(alpha, cv2.COLOR_GRAY2BGR)
+        self._inv_alpha = cv2.bitwise_not(alpha3)
+        self._premultiplied = cv2.LUT(alpha3, lut if lut is not None else _color_lut(color))
+
+    def blit(self, frame, org):
+        """
+        把贴图按 alpha 混合到画面上（超出画面的部分裁掉）
+
+        参数:
+        - frame: BGR 画面，直接修改
+        - org: 文字基线起点 (x, y)，与 cv2.putText 相同
+        """
+        if self._inv_alpha is None:
+            return
+        x, y = org[0] + self.dx, org[1] + self.dy
+        frame_h, frame_w = frame.shape[:2]
+        inv_alpha, premultiplied = self._inv_alpha, self._premultiplied
+        if x >= 0 and y >= 0 and x + self.width <= frame_w and y + self.height <= frame_h:
+            roi = frame[y:y + self.height, x:x + self.width]
+        else:
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + self.width, frame_w), min(y + self.height, frame_h)
+            if x0 >= x1 or y0 >= y1:
+                return
+            roi = frame[y0:y1, x0:x1]
+            crop = np.s_[y0 - y:y1 - y, x0 - x:x1 - x]
+            inv_alpha, premultiplied = inv_alpha[crop], premultiplied[crop]
+        cv2.multiply(roi, inv_alpha, dst=roi, scale=1 / 255)
+        cv2.add(roi, premultiplied, dst=roi)
+
+
+class OverlayRenderer:
+    """带缓存的覆盖层文字绘制（多个处理线程可以同时绘制）"""
+
+    def __init__(self, max_sprites=DEFAULT_MAX_SPRITES, font=DEFAULT_FONT):
+        """
+        参数:
+        - max_sprites: 静态文字贴图的最大缓存数
+        - font: 字体
+        """
+        self.font = font
+        self.max_sprites = max_sprites
+        self._sprites = {}              # (文字, 字号, 颜色, 线宽) -> TextSprite，按加入顺序淘汰
+        self._fields = {}               # (字段名, 画面尺寸) -> (文字, TextSprite 或 None)
+        self._luts = {}                 # 颜色 -> 预乘查找表
+        self._lock = threading.Lock()   # 只在加入与淘汰贴图时加锁，查找不加锁
+
+        # 统计信息
+        self.rasterized = 0
+
+    def text(self, frame, text, org, scale, color, thickness=1):
+        """绘制静态文字（贴图按内容缓存）"""
+        key = (text, scale, color, thickness)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._rasterize(text, scale, color, thickness)
+            with self._lock:
+                self._sprites[key] = sprite
+                while len(self._sprites) > self.max_sprites:
+                    del self._sprites[next(iter(self._sprites))]
+        sprite.blit(frame, org)
+
+    def field(self, frame, name, text, org, scale, color, thickness=1):
+        """
+        绘制数值字段：每个字段名在每种画面尺寸下一个槽位
+
+        文字刚变化的一帧直接用 cv2.putText 绘制（每帧都在变的字段不必光栅化），
+        连续两帧不变时才光栅化为贴图，之后一直混合贴图直到文字再次变化。
+        代理预览帧与原分辨率录制帧交替绘制时各用各的槽位，互不打断
+
+        参数:
+        - name: 字段名
+        - text: 本帧显示的文字
+        """
+        key = (name, frame.shape[:2])
+        slot = self._fields.get(key)
+        if slot is None or slot[0] != text:
+            self._fields[key] = (text, None)
+            cv2.putText(frame, text, org, self.font, scale, color, thickness)
+            return
+        sprite = slot[1]
+        if sprite is None:
+            sprite = self._rasterize(text, scale, color, thickness)
+            self._fields[key] = (text, sprite)
+        sprite.blit(frame, org)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._sprites.clear()
+            self._fields.clear()
+
+    def _rasterize(self, text, scale, color, thickness):
+        """光栅化一段文字"""
+        self.rasterized += 1
+        color = tuple(color)
+        lut = self._luts.get(color)
+        if lut is None:
+            lut = self._luts[color] = _color_lut(color)
+        return TextSprite(text, scale, color, thickness, self.font, lut)
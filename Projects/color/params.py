@@ -0,0 +1,134 @@
+"""
+版本化的处理参数快照
+
+界面线程（滑块、按键）修改参数的同时，处理线程正在读取；逐个读取属性可能在一帧
+中途读到一半新一半旧的参数。这里把参数集中到 ParamStore 中:
+
+- 每次修改生成一个新的不可变快照 ParamSnapshot（字典参数冻结为只读映射），
+  一次赋值替换当前快照；处理线程每帧只取一次 current，整帧使用同一组参数
+- 快照按内容复用：修改后的参数与之前某个快照完全相同时（例如滑块拖回原值）
+  直接换回那个快照，版本号不变；设置为相同的值不会产生新版本
+- 版本号在进程内全局唯一，查找表、处理结果缓存等可以直接用版本号作为缓存键，
+  只有参数真正改变时才需要重新计算
+- param_property 把快照中的参数暴露为普通属性，界面代码照常读写 self.xxx
+"""
+import itertools
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+
+# 最多保留多少个可以换回的历史快照
+DEFAULT_MAX_INTERNED = 256
+
+# 进程内全局的版本号（不同的 ParamStore 之间也不会重复）
+_versions = itertools.count(1)
+
+
+def _freeze(value):
+    """把可变的参数值转换为只读形式"""
+    if isinstance(value, Mapping):
+        return MappingProxyType(dict(value))
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _content_key(values):
+    """参数内容的可哈希键"""
+    return tuple(sorted((name, tuple(sorted(value.items())) if isinstance(value, Mapping) else value)
+                        for name, value in values.items()))
+
+
+class ParamSnapshot:
+    """一组不可变的处理参数"""
+
+    __slots__ = ("version", "_values")
+
+    def __init__(self, version, values):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "_values", values)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("参数快照不可修改，请通过 ParamStore.update 修改")
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={value!r}" for name, value in self._values.items())
+        return f"ParamSnapshot(v{self.version}: {values})"
+
+    def as_dict(self):
+        """参数的字典副本"""
+        return dict(self._values)
+
+
+class ParamStore:
+    """当前处理参数（线程安全，读取不加锁）"""
+
+    def __init__(self, max_interned=DEFAULT_MAX_INTERNED, **values):
+        """
+        参数:
+        - max_interned: 最多保留多少个可以换回的历史快照
+        - values: 初始参数
+        """
+        self.max_interned = max_interned
+        self._interned = OrderedDict()   # 内容键 -> ParamSnapshot
+        self._lock = threading.Lock()
+        self._current = None
+        self._current_key = None
+        self.update(**values)
+
+    @property
+    def current(self):
+        """当前快照（处理线程每帧取一次）"""
+        return self._current
+
+    @property
+    def version(self):
+        """当前快照的版本号"""
+        return self._current.version
+
+    def update(self, **changes):
+        """
+        修改参数，多个参数在同一个新快照中一起生效
+
+        返回:
+        - 修改后的当前快照；内容与修改前相同时返回原快照
+        """
+        with self._lock:
+            values = dict(self._current._values) if self._current is not None else {}
+            values.update((name, _freeze(value)) for name, value in changes.items())
+            key = _content_key(values)
+            if self._current is not None and key == self._current_key:
+                return self._current
+
+            snapshot = self._interned.get(key)
+            if snapshot is None:
+                snapshot = self._interned[key] = ParamSnapshot(next(_versions), values)
+                if len(self._interned) > self.max_interned:
+                    self._interned.popitem(last=False)
+            else:
+                self._interned.move_to_end(key)
+
+            self._current, self._current_key = snapshot, key
+            return snapshot
+
+
+def param_property(name, doc=None):
+    """
+    把 self.params（ParamStore）中的参数暴露为属性
+
+    读取时返回当前快照中的值，赋值时生成新快照
+    """
+    def getter(self):
+        return getattr(self.params.current, name)
+
+    def setter(self, value):
+        self.params.update(**{name: value})
+
+    return property(getter, setter, doc=doc)
@@ -0,0 +1,432 @@
+"""
+多级帧处理流水线
+
+解码 -> N 个处理线程 -> 按序重组 -> 显示/录制，各级之间用有界队列连接。
+
+两种丢帧策略:
+- lossless: 队列满时阻塞上游（反压），处理视频文件时一帧都不丢
+- latest:   队列满时丢弃最旧的帧，实时摄像头总是处理最新画面
+
+ordered 为 True 时处理线程按解码顺序逐帧调用 process（处理依赖上一帧的状态时使用，
+此时相当于单个处理线程），可以在运行中切换。
+
+每一级都会统计队列深度、丢帧数和延迟直方图，可通过 metrics() 读取:
+- decode / process: 读取、处理单帧的耗时
+- reorder: 处理完成到按序放出的等待时间
+- output: 在输出队列中等待消费者的时间
+- display / record 等消费阶段: 从解码完成到该阶段完成的端到端延迟
+"""
+import bisect
+import heapq
+import os
+import queue
+import threading
+import time
+
+POLICY_LOSSLESS = "lossless"
+POLICY_LATEST = "latest"
+
+# 流结束标记
+END_OF_STREAM = object()
+
+# 阻塞等待队列时检查停止标志的间隔（秒），决定 stop() 的响应时间（拖动时间轴时需要快速停止）
+POLL_INTERVAL = 0.02
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图（毫秒），记录为 O(1)"""
+
+    BOUNDS_MS = (0.5, 1, 2, 4, 8, 16, 33, 66, 133, 266, 533, 1066)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        """记录一次耗时（秒）"""
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p):
+        """估算百分位数，返回所在桶的上界（毫秒）"""
+        if self.count == 0:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.BOUNDS_MS[i] if i < len(self.BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        """返回统计摘要"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip([*map(str, self.BOUNDS_MS), "inf"], self.counts)),
+        }
+
+
+class StageStats:
+    """单级流水线的统计信息"""
+
+    def __init__(self, name, frame_queue=None):
+        self.name = name
+        self.frame_queue = frame_queue
+        self.frames = 0
+        self.drops = 0
+        self.histogram = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """记录一帧的处理延迟"""
+        with self._lock:
+            self.frames += 1
+            self.histogram.record(seconds)
+
+    def drop(self):
+        """记录一次丢帧"""
+        with self._lock:
+            self.drops += 1
+
+    def snapshot(self):
+        """返回统计摘要"""
+        with self._lock:
+            info = {
+                "stage": self.name,
+                "frames": self.frames,
+                "drops": self.drops,
+                "latency": self.histogram.snapshot(),
+            }
+        if self.frame_queue is not None:
+            info["queue"] = self.frame_queue.qsize()
+            info["capacity"] = self.frame_queue.maxsize
+        return info
+
+
+class FrameQueue:
+    """按策略处理溢出的有界队列"""
+
+    def __init__(self, maxsize, policy, stats, stop_event, on_drop=None):
+        """
+        参数:
+        - on_drop: on_drop(项) -> None；latest 策略丢弃一项时在放入方线程中调用，用于释放该项持有的资源
+        """
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stats = stats
+        self.on_drop = on_drop
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = stop_event
+
+    def put(self, item):
+        """
+        放入一帧；lossless 策略下阻塞等待，latest 策略下丢弃最旧的帧
+
+        返回:
+        - False 表示流水线已停止
+        """
+        if self.policy == POLICY_LATEST:
+            while not self._stop.is_set():
+                try:
+                    self._queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    try:
+                        dropped = self._queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    self.stats.drop()
+                    if self.on_drop is not None:
+                        self.on_drop(dropped)
+            return False
+        return self.put_blocking(item)
+
+    def put_blocking(self, item):
+        """阻塞放入（结束标记总是用这种方式，不会被丢弃）"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def offer(self, item):
+        """非阻塞放入，队列满时放弃"""
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout=None):
+        """取出一项，超时返回 None"""
+        try:
+            if timeout == 0:
+                return self._queue.get_nowait()
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        """当前队列深度"""
+        return self._queue.qsize()
+
+
+class PipelineFrame:
+    """在流水线中流动的一帧"""
+
+    __slots__ = ("seq", "frame", "pts", "index", "result", "t_decoded", "t_processed", "t_ready")
+
+    def __init__(self, frame, t_decoded, pts=None, index=None):
+        self.seq = -1
+        self.frame = frame
+        self.pts = pts
+        self.index = index
+        self.result = None
+        self.t_decoded = t_decoded
+        self.t_processed = None
+        self.t_ready = None
+
+
+class FramePipeline:
+    """解码 / 多线程处理 / 按序输出的帧流水线"""
+
+    def __init__(self, read_frame, process, workers=None, policy=POLICY_LOSSLESS, queue_size=8,
+                 timestamps=False, on_drop=None):
+        """
+        参数:
+        - read_frame: read_frame() -> 帧，返回 None 表示流结束；在解码线程中调用
+        - process: process(帧) -> 结果；在处理线程中并行调用，必须线程安全
+        - workers: 处理线程数，默认 CPU 核数（至少 2）
+        - policy: POLICY_LOSSLESS 或 POLICY_LATEST
+        - queue_size: 每级队列容量
+        - timestamps: 为 True 时 read_frame 返回 (帧, 显示时间戳, 帧号)，分别保存在 PipelineFrame.pts
+          与 PipelineFrame.index，并作为第二、三个参数传给 process
+        - on_drop: on_drop(PipelineFrame) -> None；latest 策略丢帧时调用。输入队列丢弃的帧 result 为 None，
+          输出队列丢弃的帧带有 process 的结果，结果持有缓冲区等资源时应在这里归还
+        """
+        self.read_frame = read_frame
+        self.process = process
+        self.workers = workers or max(2, os.cpu_count() or 1)
+        self.policy = policy
+        self.timestamps = timestamps
+        self.paused = False
+        self.ordered = False
+        self.error = None
+
+        self._stop = threading.Event()
+        self.decode_stats = StageStats("decode")
+        self.process_stats = StageStats("process")
+        self.reorder_stats = StageStats("reorder")
+        self.output_stats = StageStats("output")
+        self.consumer_stats = {}
+
+        self._input = FrameQueue(queue_size, policy, self.process_stats, self._stop, on_drop)
+        self._output = FrameQueue(queue_size, policy, self.output_stats, self._stop, on_drop)
+        self.process_stats.frame_queue = self._input
+        self.output_stats.frame_queue = self._output
+
+        self._take_lock = threading.Lock()
+        self._reorder_lock = threading.Lock()
+        self._next_seq = 0
+        self._next_out = 0
+        self._pending = []
+        self._finished_workers = 0
+        self._threads = []
+
+        # ordered 模式的轮次：编号小于 _next_done 的帧都已处理完
+        self._turn = threading.Condition()
+        self._next_done = 0
+        self._done = set()
+        self._local = threading.local()
+
+    def start(self):
+        """启动解码与处理线程"""
+        self._threads = [threading.Thread(target=self._decode_loop, name="decode", daemon=True)]
+        self._threads += [threading.Thread(target=self._process_loop, name=f"process-{i}", daemon=True)
+                          for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """停止流水线并等待线程退出"""
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+        self._threads = []
+
+    @property
+    def running(self):
+        """流水线是否仍在运行"""
+        return not self._stop.is_set()
+
+    def get(self, timeout=None):
+        """
+        按解码顺序取出处理完成的帧
+
+        流水线出错后，输出队列中剩余的帧取完即返回 END_OF_STREAM（出错时输出队列可能已满，
+        结束标记不一定放得进去）
+
+        返回:
+        - PipelineFrame；END_OF_STREAM 表示流已结束；超时返回 None
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            remaining = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.perf_counter())
+            item = self._output.get(max(remaining, 0))
+            if item is not None:
+                break
+            if self.error is not None:
+                return END_OF_STREAM
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+        if isinstance(item, PipelineFrame):
+            self.output_stats.record(time.perf_counter() - item.t_ready)
+        return item
+
+    def processing_in_order(self):
+        """当前处理线程正在处理的帧是否按解码顺序处理（在 process 中调用；非处理线程返回 False）"""
+        return getattr(self._local, "in_order", False)
+
+    def mark_consumed(self, item, stage="display"):
+        """记录某个消费阶段（显示/录制）完成，延迟从解码时刻算起"""
+        stats = self.consumer_stats.get(stage)
+        if stats is None:
+            stats = self.consumer_stats.setdefault(stage, StageStats(stage))
+        stats.record(time.perf_counter() - item.t_decoded)
+
+    def _decode_loop(self):
+        """解码线程"""
+        while not self._stop.is_set():
+            if self.paused:
+                time.sleep(0.01)
+                continue
+
+            start = time.perf_counter()
+            try:
+                frame = self.read_frame()
+            except Exception as e:
+                self._fail(e)
+                return
+            now = time.perf_counter()
+            if frame is None:
+                break
+
+            pts = index = None
+            if self.timestamps:
+                frame, pts, index = frame
+            self.decode_stats.record(now - start)
+            if not self._input.put(PipelineFrame(frame, now, pts, index)):
+                return
+
+        for _ in range(self.workers):
+            self._input.put_blocking(END_OF_STREAM)
+
+    def _process_loop(self):
+        """处理线程"""
+        while not self._stop.is_set():
+            # 取帧与编号放在同一把锁内，保证编号顺序与解码顺序一致
+            with self._take_lock:
+                item = self._input.get(timeout=POLL_INTERVAL)
+                if item is None:
+                    continue
+                if item is END_OF_STREAM:
+                    break
+                item.seq = self._next_seq
+                self._next_seq += 1
+                in_order = self.ordered
+
+            if in_order and not self._wait_turn(item.seq):
+                break
+            self._local.in_order = in_order
+            start = time.perf_counter()
+            try:
+                if self.timestamps:
+                    item.result = self.process(item.frame, item.pts, item.index)
+                else:
+                    item.result = self.process(item.frame)
+            except Exception as e:
+                self._fail(e)
+                break
+            finally:
+                self._local.in_order = False
+            item.t_processed = time.perf_counter()
+            self._finish_turn(item.seq)
+            self.process_stats.record(item.t_processed - start)
+            self._reorder(item)
+
+        with self._reorder_lock:
+            self._finished_workers += 1
+            last = self._finished_workers == self.workers
+        if last:
+            self._output.put_blocking(END_OF_STREAM)
+
+    def _wait_turn(self, seq):
+        """等待编号更小的帧都处理完（ordered 模式），流水线停止时返回 False"""
+        with self._turn:
+            while self._next_done != seq:
+                if self._stop.is_set():
+                    return False
+                self._turn.wait(POLL_INTERVAL)
+        return True
+
+    def _finish_turn(self, seq):
+        """记录一帧处理完成，唤醒等待轮次的处理线程"""
+        with self._turn:
+            self._done.add(seq)
+            while self._next_done in self._done:
+                self._done.remove(self._next_done)
+                self._next_done += 1
+            self._turn.notify_all()
+
+    def _reorder(self, item):
+        """按编号重组，连续的帧依次送入输出队列"""
+        with self._reorder_lock:
+            heapq.heappush(self._pending, (item.seq, item))
+            while self._pending and self._pending[0][0] == self._next_out:
+                _, ready = heapq.heappop(self._pending)
+                self._next_out += 1
+                ready.t_ready = time.perf_counter()
+                self.reorder_stats.record(ready.t_ready - ready.t_processed)
+                if not self._output.put(ready):
+                    return
+
+    def _fail(self, error):
+        """处理线程出错时停止流水线并通知消费者"""
+        print(f"流水线错误: {error}")
+        self.error = error
+        self._stop.set()
+        self._output.offer(END_OF_STREAM)
+
+    def metrics(self):
+        """返回各级统计信息"""
+        stages = [self.decode_stats, self.process_stats, self.reorder_stats, self.output_stats]
+        stages += list(self.consumer_stats.values())
+        return [stats.snapshot() for stats in stages]
+
+    def format_metrics(self):
+        """单行文本形式的统计摘要"""
+        parts = []
+        for info in self.metrics():
+            latency = info["latency"]
+            text = f"{info['stage']} {latency['mean_ms']:.1f}ms/p95 {latency['p95_ms']:.0f}"
+            if "queue" in info:
+                text += f" q{info['queue']}/{info['capacity']}"
+            if info["drops"]:
+                text += f" 丢{info['drops']}"
+            parts.append(text)
+        return " | ".join(parts)
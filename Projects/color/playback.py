@@ -0,0 +1,160 @@
+"""
+按显示时间戳播放的调度器
+
+旧的播放循环在处理完一帧后再固定 sleep(1/fps)，处理耗时叠加在帧间隔上，
+慢帧会让视频无限落后于真实时间。调度器改为:
+
+- 用 CAP_PROP_POS_MSEC 读取每帧的显示时间戳 (PTS)，映射到墙上时钟
+- 显示端只等待到该帧的到期时刻，不再固定 sleep
+- 解码端预计某帧处理完时已经晚于到期时刻超过一帧，就只 grab() 不 retrieve()，
+  省掉颜色转换和拷贝，直接跳过
+- 统计处理预算占用、跳帧数与显示延迟
+- 按实际 grab 的次数给每帧编号（循环时归零），帧号不从时间戳反推，VFR 或总帧数不准时也不会错位
+"""
+import time
+
+import cv2
+
+# 起播时预留的缓冲时间（帧间隔的倍数），让流水线先填充几帧
+STARTUP_LEAD_FRAMES = 2
+
+# 指数平均的平滑系数
+EMA_ALPHA = 0.1
+
+
+class PlaybackScheduler:
+    """以视频时间戳驱动的播放时钟"""
+
+    def __init__(self, fps, max_skip=None, start_position=0):
+        """
+        参数:
+        - fps: 标称帧率，只用于跳帧阈值和时间戳缺失时的估算
+        - max_skip: 最多连续跳过的帧数，默认一秒的帧数
+        - start_position: 下一次 grab 得到的帧号（从定位后的位置开始播放时传入）
+        """
+        self.fps = fps if fps and fps > 0 else 30
+        self.interval = 1.0 / self.fps
+        self.max_skip = max_skip or int(round(self.fps))
+
+        self._origin = None        # PTS 0 对应的 perf_counter 时刻
+        self._paused_at = None
+        self._offset_ms = 0.0      # 循环播放时累计的时间戳偏移
+        self._last_pts = None
+        self._looped = False
+        self._next_position = start_position
+
+        # 统计信息
+        self.decoded = 0
+        self.skipped = 0
+        self.presented = 0
+        self.process_ms = 0.0      # 单帧处理耗时（指数平均）
+        self.late_ms = 0.0         # 显示时相对到期时刻的延迟（指数平均）
+
+    def read(self, cap, lookup=None):
+        """
+        读取下一帧需要显示的帧，落后时跳过只解码不显示的帧
+
+        参数:
+        - lookup: 可选回调 lookup(pts, 帧号)，返回非 None 时直接用它代替这一帧，不再 retrieve
+
+        返回:
+        - (帧或 lookup 的结果, PTS 毫秒, 帧号)；流结束时返回 None
+        """
+        skipped_run = 0
+        while True:
+            if not cap.grab():
+                return None
+            pts = self._timestamp(cap.get(cv2.CAP_PROP_POS_MSEC))
+            position = self._next_position
+            self._next_position += 1
+            self.decoded += 1
+
+            if self._origin is None:
+                self._origin = self.now() - pts / 1000 + STARTUP_LEAD_FRAMES * self.interval
+
+            # 预计显示时已落后一帧以上，跳过这一帧
+            # （预计时间 = 处理耗时 + 最近显示的实际延迟，后者包含了排队时间）
+            ready_at = self.now() + (self.process_ms + self.late_ms) / 1000
+            if ready_at - self.due(pts) > self.interval and skipped_run < self.max_skip:
+                skipped_run += 1
+                self.skipped += 1
+                continue
+
+            if lookup is not None:
+                cached = lookup(pts, position)
+                if cached is not None:
+                    return cached, pts, position
+
+            ret, frame = cap.retrieve()
+            if ret:
+                return frame, pts, position
+
+    def _timestamp(self, raw_ms):
+        """把解码器时间戳转换为单调递增的播放时间戳"""
+        if self._last_pts is None:
+            pts = raw_ms
+        elif self._looped:
+            # 循环回到开头：接在上一轮的最后一帧之后
+            self._offset_ms = self._last_pts + self.interval * 1000 - raw_ms
+            self._looped = False
+            pts = raw_ms + self._offset_ms
+        else:
+            pts = raw_ms + self._offset_ms
+            if pts <= self._last_pts:
+                # 后端没有提供有效时间戳时按标称帧率估算
+                pts = self._last_pts + self.interval * 1000
+        self._last_pts = pts
+        return pts
+
+    def mark_loop(self):
+        """视频回到开头重新播放（调用者执行了 CAP_PROP_POS_FRAMES = 0）"""
+        self._looped = True
+        self._next_position = 0
+
+    def now(self):
+        """当前时刻，暂停期间时钟停止"""
+        return self._paused_at if self._paused_at is not None else time.perf_counter()
+
+    def due(self, pts):
+        """PTS 对应的到期时刻 (perf_counter)"""
+        if self._origin is None:
+            return self.now()
+        return self._origin + pts / 1000
+
+    def delay(self, pts):
+        """距离到期还需等待的秒数，负数表示已经迟到"""
+        return self.due(pts) - self.now()
+
+    def pause(self):
+        """暂停时钟"""
+        if self._paused_at is None:
+            self._paused_at = time.perf_counter()
+
+    def resume(self):
+        """恢复时钟，暂停的时长不计入播放时间"""
+        if self._paused_at is not None:
+            if self._origin is not None:
+                self._origin += time.perf_counter() - self._paused_at
+            self._paused_at = None
+
+    def record_processing(self, seconds):
+        """记录一帧的处理耗时"""
+        ms = seconds * 1000
+        self.process_ms = ms if self.process_ms == 0 else self.process_ms + EMA_ALPHA * (ms - self.process_ms)
+
+    def frame_presented(self, pts):
+        """记录一帧已显示"""
+        self.presented += 1
+        late = max(0.0, -self.delay(pts)) * 1000
+        self.late_ms += EMA_ALPHA * (late - self.late_ms)
+
+    @property
+    def budget_used(self):
+        """处理耗时占一帧预算的比例"""
+        return self.process_ms / (self.interval * 1000)
+
+    def summary(self):
+        """单行文本形式的统计摘要"""
+        return (f"处理预算: {self.budget_used * 100:.0f}% "
+                f"({self.process_ms:.1f}/{self.interval * 1000:.1f}ms) | "
+                f"跳帧: {self.skipped} | 延迟: {self.late_ms:.1f}ms")
@@ -0,0 +1,194 @@
+"""
+多进程突显后端
+
+处理线程中不属于 NumPy / OpenCV 内核的 Python 代码受 GIL 限制，CPU 密集的模式下
+可以改用多进程处理:
+
+- 帧放在 multiprocessing.shared_memory 中按分辨率建立的环形缓冲区里，每个槽位
+  包含输入帧、处理结果与掩码，大小固定
+- 工作进程启动时不复制任何图像，任务中只传递槽位编号与参数快照；工作进程按名称
+  映射共享内存，直接在输入槽位上计算并把结果写入输出槽位
+- 调用方（流水线的处理线程）把帧复制进空闲槽位，等待期间释放 GIL，完成后把结果
+  复制到自己的输出位置并归还槽位；槽位数不少于并发调用的线程数时不会互相等待
+- 工作进程用 spawn 方式启动，各自持有一份引擎缓冲区与查找表；参数快照的版本号
+  随任务传入，工作进程中的查找表同样按版本缓存
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from color_lut import ColorLUT, get_thread_lut_engine
+from cv_backend import BACKEND_NUMPY, get_backend_engine
+
+# 查找表引擎的名称（其余名称按 cv_backend 的后端处理）
+ENGINE_LUT = "lut"
+
+# 每个工作进程对应的槽位数（略多于 1，复制与计算可以重叠）
+DEFAULT_SLOTS_PER_WORKER = 2
+
+
+class SharedFrameRing:
+    """共享内存中固定大小的帧槽位：输入帧、处理结果与掩码"""
+
+    def __init__(self, shape, slots, name=None):
+        """
+        参数:
+        - shape: 帧形状 (高, 宽, 3)
+        - slots: 槽位数
+        - name: 已有共享内存的名称（工作进程映射时使用），None 表示新建
+        """
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        mask_bytes = frame_bytes // self.shape[2]
+        size = slots * (2 * frame_bytes + mask_bytes)
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach(name)
+        self.name = self.shm.name
+
+        buf = self.shm.buf
+        self.inputs = np.ndarray((slots,) + self.shape, np.uint8, buf)
+        self.outputs = np.ndarray((slots,) + self.shape, np.uint8, buf, offset=slots * frame_bytes)
+        self.masks = np.ndarray((slots,) + self.shape[:2], np.bool_, buf, offset=2 * slots * frame_bytes)
+
+        # 空闲槽位（只在创建方使用）
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+
+    def close(self):
+        """解除映射；创建方同时删除共享内存"""
+        self.inputs = self.outputs = self.masks = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _attach(name):
+    """映射已有的共享内存（不登记到资源跟踪器，删除由创建方负责）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python 3.12 及更早版本没有 track 参数
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _ready(delay):
+    """工作进程：预热任务（导入本模块并占用一小段时间，使所有工作进程都被启动）"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+# 工作进程中已映射的环形缓冲区: 名称 -> SharedFrameRing
+_worker_rings = {}
+_worker_lut = None
+
+
+def _process_slot(name, shape, slots, slot, params):
+    """
+    工作进程：处理一个槽位中的帧
+
+    参数:
+    - name, shape, slots: 环形缓冲区的共享内存名称、帧形状与槽位数
+    - slot: 槽位编号
+    - params: (引擎, 模式, 敏感度, 最小亮度, 自定义颜色, 参数快照版本)
+    """
+    global _worker_lut
+    ring = _worker_rings.get(name)
+    if ring is None:
+        ring = _worker_rings[name] = SharedFrameRing(shape, slots, name)
+
+    engine_name, mode, sensitivity, min_brightness, custom_color, version = params
+    if engine_name == ENGINE_LUT:
+        if _worker_lut is None:
+            _worker_lut = ColorLUT()
+        engine = get_thread_lut_engine(_worker_lut)
+    else:
+        engine = get_backend_engine(engine_name)
+
+    _, mask = engine.apply(ring.inputs[slot], mode, sensitivity, min_brightness, custom_color,
+                           out=ring.outputs[slot], version=version)
+    np.copyto(ring.masks[slot], mask)
+
+
+class ProcessHighlighter:
+    """多进程突显处理（接口与引擎的 apply 相同，可以从多个线程同时调用）"""
+
+    def __init__(self, workers=None, slots=None):
+        """
+        参数:
+        - workers: 工作进程数，默认 CPU 核数
+        - slots: 每个分辨率的槽位数，默认 工作进程数 * DEFAULT_SLOTS_PER_WORKER
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = slots or self.workers * DEFAULT_SLOTS_PER_WORKER
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+        self._rings = {}   # 帧形状 -> SharedFrameRing
+        self._lock = threading.Lock()
+
+    def _ring(self, shape):
+        """按帧形状取环形缓冲区，第一次遇到某个分辨率时创建"""
+        with self._lock:
+            ring = self._rings.get(shape)
+            if ring is None:
+                ring = self._rings[shape] = SharedFrameRing(shape, self.slots)
+            return ring
+
+    def warm_up(self):
+        """
+        启动全部工作进程（否则第一批帧要等待进程启动与模块导入）
+
+        返回:
+        - 已启动的工作进程数
+        """
+        return len(set(self._executor.map(_ready, [0.2] * self.workers)))
+
+    def apply(self, frame, mode, sensitivity, min_brightness, custom_color=None, out=None,
+              engine=BACKEND_NUMPY, version=None):
+        """
+        在工作进程中处理一帧
+
+        参数:
+        - frame: 输入帧 (BGR, uint8)
+        - mode, sensitivity, min_brightness, custom_color: 同引擎的 apply
+        - out: 处理结果的写入位置，None 时分配新图像
+        - engine: 工作进程使用的引擎：cv_backend 的后端名称或 ENGINE_LUT
+        - version: 参数快照的版本号（见 params.py）
+
+        返回:
+        - (处理结果, 掩码)；掩码为调用方独有的副本
+        """
+        ring = self._ring(frame.shape)
+        slot = ring.free.get()
+        try:
+            np.copyto(ring.inputs[slot], frame)
+            params = (engine, mode, sensitivity, min_brightness, custom_color, version)
+            self._executor.submit(_process_slot, ring.name, ring.shape, ring.slots, slot, params).result()
+
+            if out is None:
+                out = ring.outputs[slot].copy()
+            else:
+                np.copyto(out, ring.outputs[slot])
+            mask = ring.masks[slot].copy()
+        finally:
+            ring.free.put(slot)
+        return out, mask
+
+    def shutdown(self):
+        """关闭工作进程并删除共享内存"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
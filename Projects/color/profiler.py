@@ -0,0 +1,163 @@
+"""
+分阶段性能计时
+
+按阶段（采集、拆分、掩码、混合、组合、叠加信息、编码、显示）记录每次调用的耗时:
+
+- 每个阶段一个定长环形缓冲区，记录为 O(1)，均值由滑动累加和得到，不需要
+  pop(0) 或每帧 np.mean
+- 任意线程都可以记录（流水线的解码、处理线程与编码线程）
+- 可选记录 Chrome trace 格式的事件 (chrome://tracing、Perfetto、speedscope
+  都可以打开)，每个阶段一个完整事件 (ph = "X")，按线程分行
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# 固定显示顺序的阶段
+STAGES = ("capture", "split", "mask", "blend", "compose", "overlay", "encode", "display")
+
+# 每个阶段保留最近多少次的耗时
+DEFAULT_WINDOW = 120
+
+# trace 最多保留的事件数，超出后不再记录（避免长时间运行占满内存）
+MAX_TRACE_EVENTS = 2_000_000
+
+
+class StageRing:
+    """定长的耗时环形缓冲区（毫秒）"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.values = np.zeros(window, dtype=np.float64)
+        self.count = 0
+        self.total = 0
+        self._sum = 0.0
+        self._next = 0
+
+    def add(self, ms):
+        """记录一次耗时，O(1)"""
+        self._sum += ms - self.values[self._next]
+        self.values[self._next] = ms
+        self._next = (self._next + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+        self.total += 1
+
+    @property
+    def mean(self):
+        """窗口内的平均耗时"""
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def max(self):
+        """窗口内的最大耗时"""
+        return float(self.values[:self.count].max()) if self.count else 0.0
+
+    def clear(self):
+        """清空"""
+        self.values[:] = 0
+        self.count = 0
+        self._sum = 0.0
+        self._next = 0
+
+
+class Profiler:
+    """分阶段计时器（线程安全）"""
+
+    def __init__(self, window=DEFAULT_WINDOW, trace=False):
+        """
+        参数:
+        - window: 每个阶段的环形缓冲区长度
+        - trace: 是否记录 Chrome trace 事件
+        """
+        self.window = window
+        self.rings = {stage: StageRing(window) for stage in STAGES}
+        self.tracing = trace
+        self.dropped_events = 0
+        self._events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def lap(self, stage, start, frame=None):
+        """
+        记录从 start 到现在的一段耗时
+
+        参数:
+        - stage: 阶段名称
+        - start: 开始时刻 (time.perf_counter())
+        - frame: 可选的帧号，写入 trace 事件的参数
+
+        返回:
+        - 当前时刻，可以直接作为下一个阶段的开始时刻
+        """
+        now = time.perf_counter()
+        with self._lock:
+            ring = self.rings.get(stage)
+            if ring is None:
+                ring = self.rings[stage] = StageRing(self.window)
+            ring.add((now - start) * 1000)
+
+            if self.tracing:
+                if len(self._events) < MAX_TRACE_EVENTS:
+                    thread = threading.current_thread()
+                    self._thread_names.setdefault(thread.ident, thread.name)
+                    self._events.append((stage, start, now, thread.ident, frame))
+                else:
+                    self.dropped_events += 1
+        return now
+
+    def mean_ms(self, stage):
+        """阶段的平均耗时（毫秒）"""
+        ring = self.rings.get(stage)
+        return ring.mean if ring is not None else 0.0
+
+    def max_ms(self, stage):
+        """阶段在窗口内的最大耗时（毫秒）"""
+        ring = self.rings.get(stage)
+        return ring.max if ring is not None else 0.0
+
+    def breakdown(self):
+        """
+        各阶段的耗时
+
+        返回:
+        - [(阶段, 平均毫秒, 最大毫秒), ...]；固定阶段在前，没有记录的阶段省略
+        """
+        with self._lock:
+            stages = list(STAGES) + [s for s in self.rings if s not in STAGES]
+            return [(stage, self.rings[stage].mean, self.rings[stage].max)
+                    for stage in stages if self.rings[stage].count]
+
+    def reset(self):
+        """清空所有阶段的窗口（trace 事件保留）"""
+        with self._lock:
+            for ring in self.rings.values():
+                ring.clear()
+
+    def write_trace(self, path):
+        """
+        写出 Chrome trace JSON
+
+        返回:
+        - 写出的事件数
+        """
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+
+        pid = os.getpid()
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in thread_names.items()]
+        for stage, start, end, tid, frame in events:
+            event = {"name": stage, "cat": "color", "ph": "X", "pid": pid, "tid": tid,
+                     "ts": round((start - self._origin) * 1e6, 1),
+                     "dur": round((end - start) * 1e6, 1)}
+            if frame is not None:
+                event["args"] = {"frame": frame}
+            trace.append(event)
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(events)
@@ -0,0 +1,51 @@
+"""
+代理分辨率预览
+
+预览时最终只显示缩小后的画面，却先在全分辨率上做颜色处理。代理模式先把
+输入帧缩小到显示尺寸（INTER_AREA 一次完成整层降采样），再在小图上处理，
+预览成本只取决于显示尺寸而与片源分辨率无关。录制和截图仍用同样的参数在
+全分辨率原帧上重新处理。
+"""
+import threading
+
+import cv2
+import numpy as np
+
+
+def proxy_size(width, height, max_width, max_height):
+    """
+    按最大尺寸等比缩小后的代理尺寸，不会放大
+
+    返回:
+    - (宽, 高)
+    """
+    scale = min(1.0, max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class ProxyScaler:
+    """把输入帧缩小到代理尺寸（每个线程复用自己的输出缓冲区）"""
+
+    def __init__(self):
+        self._scratch = threading.local()
+
+    def downscale(self, frame, size):
+        """
+        缩小到指定尺寸
+
+        参数:
+        - frame: 输入帧
+        - size: 目标尺寸 (宽, 高)；不小于原尺寸时直接返回原帧
+
+        返回:
+        - 代理帧（线程内缓冲区，同一线程下一次调用时被覆盖）
+        """
+        height, width = frame.shape[:2]
+        if size[0] >= width or size[1] >= height:
+            return frame
+
+        small = getattr(self._scratch, "small", None)
+        if small is None or small.shape[1::-1] != size:
+            small = self._scratch.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        return small
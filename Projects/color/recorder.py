@@ -0,0 +1,255 @@
+"""
+异步录制与预录缓冲
+
+录制帧由显示循环拷贝进预分配帧槽的环形缓冲区，编码在独立线程中进行，
+编码器卡顿不会拖慢处理与显示:
+
+- 帧槽在分辨率确定时一次分配，写入时拷贝进槽位，不保留调用方数组的引用
+- 未录制时缓冲区保存最近 N 秒的录制帧（预录），开始录制时这些帧先写入文件，
+  按下录制键之前刚发生的画面也能保存下来。预录帧可以是较低分辨率的预览帧
+  （代理预览时不必为预录在原分辨率上重复处理每一帧），开始录制时放大到录制尺寸
+- 录制中缓冲区写满（编码跟不上）时丢弃新帧并计数，处理流程不会被阻塞
+- 停止录制时等待编码线程写完缓冲区中剩余的帧
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# 默认预录时长（秒），0 表示不预录
+DEFAULT_PREROLL_SECONDS = 3
+
+# 录制中除预录外额外保留的排队帧数，吸收编码器的短暂卡顿
+DEFAULT_QUEUE_FRAMES = 32
+
+# 帧槽总内存上限（MB），超出时优先缩短预录
+DEFAULT_MAX_BUFFER_MB = 512
+
+
+class FrameRing:
+    """预分配帧槽的环形缓冲区（不是线程安全的，由 AsyncRecorder 加锁访问）"""
+
+    def __init__(self, capacity, shape):
+        self.capacity = capacity
+        self.shape = shape
+        self.slots = np.empty((capacity,) + shape, dtype=np.uint8)
+        self.start = 0      # 最旧帧的槽位
+        self.count = 0
+
+    def clear(self):
+        """丢弃所有帧（帧槽保留）"""
+        self.start = 0
+        self.count = 0
+
+    def push(self, frame):
+        """
+        拷贝一帧到下一个空槽，尺寸不同时缩放到槽尺寸
+
+        返回:
+        - 是否写入（缓冲区已满时返回 False）
+        """
+        if self.count == self.capacity:
+            return False
+        slot = self.slots[(self.start + self.count) % self.capacity]
+        if frame.shape == self.shape:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=slot, interpolation=cv2.INTER_AREA)
+        self.count += 1
+        return True
+
+    def peek(self):
+        """最旧的一帧（槽位视图，pop 之前不会被覆盖）"""
+        return self.slots[self.start]
+
+    def pop(self):
+        """释放最旧的一帧"""
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+
+    def trim(self, keep):
+        """只保留最新的 keep 帧"""
+        while self.count > keep:
+            self.pop()
+
+
+class AsyncRecorder:
+    """带预录缓冲的异步视频录制器"""
+
+    def __init__(self, fps, preroll_seconds=DEFAULT_PREROLL_SECONDS, queue_frames=DEFAULT_QUEUE_FRAMES,
+                 max_buffer_mb=DEFAULT_MAX_BUFFER_MB):
+        """
+        参数:
+        - fps: 录制帧率，同时用于把预录时长换算为帧数
+        - preroll_seconds: 预录时长（秒），0 表示不预录
+        - queue_frames: 录制中额外的排队帧数
+        - max_buffer_mb: 帧槽总内存上限（MB）
+        """
+        self.fps = fps
+        self.preroll_seconds = preroll_seconds
+        self.queue_frames = queue_frames
+        self.max_buffer_mb = max_buffer_mb
+
+        self.ring = None
+        self.preroll_frames = 0     # 按帧尺寸与内存上限换算后的预录帧数
+        self.writer = None
+        self.path = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.profiler = None        # 可选的 Profiler，记录 encode 阶段
+
+        # 本次录制的统计信息
+        self.frames_written = 0
+        self.preroll_written = 0
+        self.dropped = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def is_recording(self):
+        """是否正在录制"""
+        return self.writer is not None
+
+    @property
+    def preroll_enabled(self):
+        """是否需要在未录制时也送入帧"""
+        return self.preroll_seconds > 0
+
+    def _configure(self, shape, previous=None):
+        """
+        按帧尺寸重新分配帧槽
+
+        参数:
+        - previous: 原来的缓冲区；其中最新的预录帧缩放后移入新帧槽，None 表示丢弃
+        """
+        frame_bytes = int(np.prod(shape))
+        budget = max(2, self.max_buffer_mb * 1024 * 1024 // frame_bytes)
+        wanted = int(round(self.preroll_seconds * self.fps))
+        capacity = max(2, min(wanted + self.queue_frames, budget))
+        self.preroll_frames = max(0, min(wanted, capacity - self.queue_frames))
+        self.ring = FrameRing(capacity, shape)
+
+        if previous is not None:
+            previous.trim(self.preroll_frames)
+            while previous.count:
+                self.ring.push(previous.peek())
+                previous.pop()
+
+    def push(self, frame):
+        """
+        送入一帧录制帧（在显示循环中按顺序调用）
+
+        未录制时只保留在预录缓冲区；录制中交给编码线程。
+
+        返回:
+        - 是否被缓冲（录制中缓冲区已满时丢弃并返回 False）
+        """
+        with self._cond:
+            if self.writer is None:
+                if not self.preroll_enabled:
+                    return False
+                if self.ring is None or self.ring.shape != frame.shape:
+                    self._configure(frame.shape)
+                if self.preroll_frames == 0:
+                    return False
+                self.ring.trim(self.preroll_frames - 1)
+                return self.ring.push(frame)
+
+            if not self.ring.push(frame):
+                self.dropped += 1
+                return False
+            self._cond.notify()
+            return True
+
+    def start(self, path, fourcc, size):
+        """
+        开始录制，预录缓冲区中的帧最先写入
+
+        参数:
+        - path: 输出文件路径
+        - fourcc: 编码格式
+        - size: 录制尺寸 (宽, 高)；预录帧尺寸不同时（例如代理预览下缓冲的预览帧）
+          缩放到该尺寸后写入
+
+        返回:
+        - 是否成功创建输出文件
+        """
+        with self._cond:
+            if self.writer is not None:
+                return False
+            shape = (size[1], size[0], 3)
+            if self.ring is None or self.ring.shape != shape:
+                self._configure(shape, self.ring)
+            height, width = self.ring.shape[:2]
+
+            writer = cv2.VideoWriter(path, fourcc, self.fps, (width, height))
+            if not writer.isOpened():
+                return False
+
+            self.writer = writer
+            self.path = path
+            self._stopping = False
+            self.frames_written = 0
+            self.preroll_written = self.ring.count
+            self.dropped = 0
+            self.encode_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._encode_loop, name="recorder-encode", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """
+        停止录制，等待剩余的帧写完
+
+        返回:
+        - 是否有录制被停止
+        """
+        with self._cond:
+            if self.writer is None:
+                return False
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+        with self._cond:
+            self.writer.release()
+            self.writer = None
+        return True
+
+    def _encode_loop(self):
+        """编码线程：按顺序写出缓冲区中的帧"""
+        ring = self.ring
+        while True:
+            with self._cond:
+                while ring.count == 0 and not self._stopping:
+                    self._cond.wait()
+                if ring.count == 0:
+                    return
+                # 槽位在 pop 之前不会被 push 覆盖，编码时不需要持有锁
+                frame = ring.peek()
+
+            start = time.perf_counter()
+            self.writer.write(frame)
+            elapsed = time.perf_counter() - start
+            if self.profiler is not None:
+                self.profiler.lap("encode", start)
+
+            with self._cond:
+                ring.pop()
+                self.frames_written += 1
+                self.encode_seconds += elapsed
+
+    @property
+    def buffered_seconds(self):
+        """缓冲区中的帧时长（秒）"""
+        ring = self.ring
+        return ring.count / self.fps if ring is not None and self.fps else 0.0
+
+    def summary(self):
+        """单行文本形式的录制统计"""
+        mean_ms = self.encode_seconds / self.frames_written * 1000 if self.frames_written else 0.0
+        return (f"{self.frames_written} 帧 (预录 {self.preroll_written} 帧), 丢帧 {self.dropped}, "
+                f"编码 {mean_ms:.1f}ms/帧")
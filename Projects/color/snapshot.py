@@ -0,0 +1,150 @@
+"""
+后台截图服务
+
+显示端每显示一帧就把该帧的数据放进"最近一帧"槽位（只保存引用，不拷贝），
+截图时从槽位取出，不再从流水线中取帧，显示不会因此丢帧。拼图、按原分辨率
+重新处理和 JPEG/PNG 编码都在后台线程中完成，界面线程只做一次入队。
+
+连拍模式把接下来显示的 N 帧逐帧入队保存，队列有上限，写盘跟不上时丢弃并计数。
+放进槽位的数组在发布之后、下一帧发布之前不能被修改；之后会被复用的缓冲区
+（例如布局画布）由 detach 回调在入队时复制。
+"""
+import os
+import queue
+import threading
+from datetime import datetime
+
+import cv2
+
+# 待保存队列上限（帧）
+DEFAULT_MAX_PENDING = 64
+
+# 默认连拍帧数
+DEFAULT_BURST_FRAMES = 10
+
+# JPEG 质量与 PNG 压缩级别（低压缩级别编码更快）
+JPEG_QUALITY = 95
+PNG_COMPRESSION = 1
+
+
+def _timestamp():
+    """精确到毫秒的时间戳，同一秒内的多次截图不会重名"""
+    now = datetime.now()
+    return now.strftime("%Y%m%d_%H%M%S_") + f"{now.microsecond // 1000:03d}"
+
+
+class SnapshotService:
+    """从最近一帧槽位截图，在后台线程中编码写盘"""
+
+    def __init__(self, build, save_dir="snapshots", prefix="", image_format="jpg",
+                 max_pending=DEFAULT_MAX_PENDING, detach=None):
+        """
+        参数:
+        - build: 回调，build(payload) 返回 [(名称, 图像), ...]，在后台线程中调用
+        - detach: 可选回调，detach(payload) 在入队时调用，返回复制了复用缓冲区的 payload
+        - save_dir: 保存目录
+        - prefix: 文件名前缀
+        - image_format: "jpg" 或 "png"
+        - max_pending: 待保存队列上限（帧）
+        """
+        self.build = build
+        self.detach = detach
+        self.save_dir = save_dir
+        self.prefix = prefix
+        self.image_format = image_format
+        if image_format == "png":
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+        else:
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+
+        self._lock = threading.Lock()
+        self._last = None
+        self._burst_remaining = 0
+        self._burst_tag = None
+        self._burst_index = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+
+        # 统计信息
+        self.saved = 0
+        self.dropped = 0
+
+    def publish(self, payload):
+        """放入最近显示的一帧（显示线程每帧调用，连拍时同时入队）"""
+        with self._lock:
+            self._last = payload
+            if self._burst_remaining > 0:
+                self._burst_remaining -= 1
+                self._enqueue(payload, f"{self._burst_tag}_{self._burst_index:02d}")
+                self._burst_index += 1
+
+    def capture(self):
+        """
+        保存最近显示的一帧
+
+        返回:
+        - 是否已入队（还没有显示过帧或队列已满时返回 False）
+        """
+        with self._lock:
+            if self._last is None:
+                return False
+            return self._enqueue(self._last, _timestamp())
+
+    def burst(self, count=DEFAULT_BURST_FRAMES):
+        """从下一帧开始连续保存 count 帧"""
+        with self._lock:
+            self._burst_remaining = count
+            self._burst_tag = f"{_timestamp()}_burst"
+            self._burst_index = 0
+
+    @property
+    def pending(self):
+        """等待保存的帧数"""
+        return self._queue.qsize()
+
+    def _enqueue(self, payload, tag):
+        """放入待保存队列（调用方持有锁）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="snapshot-writer", daemon=True)
+            self._thread.start()
+        if self._queue.full():
+            self.dropped += 1
+            return False
+        if self.detach is not None:
+            payload = self.detach(payload)
+        try:
+            self._queue.put_nowait((payload, tag))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _worker(self):
+        """后台线程：拼图、编码并写盘"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            payload, tag = job
+            try:
+                os.makedirs(self.save_dir, exist_ok=True)
+                paths = []
+                for name, image in self.build(payload):
+                    path = os.path.join(self.save_dir, f"{self.prefix}{name}_{tag}.{self.image_format}")
+                    if not cv2.imwrite(path, image, self.params):
+                        raise IOError(f"无法写入 {path}")
+                    paths.append(path)
+                self.saved += 1
+                print(f"截图已保存: {', '.join(paths)}")
+            except Exception as e:
+                print(f"截图保存失败: {e}")
+
+    def close(self):
+        """等待队列中的截图写完并结束后台线程"""
+        with self._lock:
+            self._burst_remaining = 0
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
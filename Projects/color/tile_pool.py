@@ -0,0 +1,87 @@
+"""
+分块并行处理
+
+把帧（或分割模式下的各个区域）切成若干横向条带，交给常驻线程池并行处理。
+每个条带都是输入帧与输出图像上的 NumPy 视图，工作线程直接写入共享的输出
+缓冲区，不需要 hstack / vstack 拼接。NumPy 的逐元素运算会释放 GIL，因此
+线程可以在多核上真正并行。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# 每个条带的最小行数，过小的条带调度开销会超过收益
+MIN_STRIPE_ROWS = 32
+
+
+def split_rows(start, stop, parts, min_rows=MIN_STRIPE_ROWS):
+    """
+    把 [start, stop) 行区间均分为最多 parts 段
+
+    返回:
+    - [(段起始行, 段结束行), ...]
+    """
+    total = stop - start
+    parts = max(1, min(parts, total // max(min_rows, 1)))
+    bounds = [start + total * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i + 1] > bounds[i]]
+
+
+class TilePool:
+    """常驻的分块处理线程池"""
+
+    def __init__(self, workers=None, stripes_per_worker=2, min_rows=MIN_STRIPE_ROWS):
+        """
+        参数:
+        - workers: 工作线程数，默认等于 CPU 核数
+        - stripes_per_worker: 每个线程分到的条带数，略大于 1 有助于负载均衡
+        - min_rows: 每个条带的最小行数
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.stripes_per_worker = stripes_per_worker
+        self.min_rows = min_rows
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="tile")
+
+    def make_tiles(self, regions):
+        """
+        把区域列表切成条带
+
+        参数:
+        - regions: [(行切片, 列切片, 附加数据), ...]，切片须为显式起止的 slice
+
+        返回:
+        - [(行切片, 列切片, 附加数据), ...]
+        """
+        total_rows = sum(rows.stop - rows.start for rows, _, _ in regions) or 1
+        target = self.workers * self.stripes_per_worker
+        tiles = []
+        for rows, cols, payload in regions:
+            # 按区域行数占比分配条带数，保证各区域条带大小相近
+            parts = max(1, round(target * (rows.stop - rows.start) / total_rows))
+            for start, stop in split_rows(rows.start, rows.stop, parts, self.min_rows):
+                tiles.append((slice(start, stop), cols, payload))
+        return tiles
+
+    def run(self, regions, func):
+        """
+        并行处理所有区域，阻塞直到全部完成
+
+        参数:
+        - regions: 同 make_tiles
+        - func: func(行切片, 列切片, 附加数据)，在工作线程中执行，应直接写入输出视图
+        """
+        tiles = self.make_tiles(regions)
+        if self.workers == 1 or len(tiles) == 1:
+            for rows, cols, payload in tiles:
+                func(rows, cols, payload)
+            return
+
+        futures = [self._executor.submit(func, rows, cols, payload)
+                   for rows, cols, payload in tiles]
+        wait(futures)
+        for future in futures:
+            future.result()  # 重新抛出工作线程中的异常
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=True)
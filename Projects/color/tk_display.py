@@ -0,0 +1,210 @@
+"""
+Tk 视频显示后端
+
+旧的 update_display 每帧都要 resize、cvtColor、Image.fromarray、新建
+ImageTk.PhotoImage，再 delete("all") 并重新 create_image。这里改为:
+
+- 画布上只保留一个 PhotoImage 和一个图像项，尺寸不变时只 paste 新像素
+- 缩放与 BGR->RGB 转换在工作线程完成，写入复用的目标缓冲区
+- 缩放比例只在画布或帧尺寸变化时重新计算
+- Tk 主线程每帧只做一次 paste，耗时记录在 ui_time_ms 中
+"""
+import queue
+import threading
+import time
+import tkinter as tk
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+# 画布尚未布局完成时使用的默认尺寸
+DEFAULT_SIZE = (640, 480)
+
+
+class PreparedFrame:
+    """已缩放并转换为 RGB 的待显示帧"""
+
+    __slots__ = ("rgb", "size", "pool")
+
+    def __init__(self, rgb, size, pool):
+        self.rgb = rgb
+        self.size = size
+        self.pool = pool
+
+    def release(self):
+        """显示完成后把缓冲区还给缓冲池"""
+        if self.pool is not None:
+            self.pool.release(self.rgb)
+            self.pool = None
+
+
+class BufferPool:
+    """固定尺寸 RGB 缓冲区的空闲链表，缺少时才分配"""
+
+    def __init__(self, size):
+        self.size = size
+        self._free = queue.SimpleQueue()
+
+    def acquire(self):
+        """取出一块缓冲区"""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            width, height = self.size
+            return np.empty((height, width, 3), dtype=np.uint8)
+
+    def release(self, buffer):
+        """归还缓冲区"""
+        self._free.put(buffer)
+
+
+class TkFrameDisplay:
+    """在 Tk 画布中央持续显示视频帧"""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.canvas_size = DEFAULT_SIZE   # 由 Tk 线程在 <Configure> 中更新
+        self.photo = None
+        self.item = None
+        self._placed_at = None
+        self.ui_time_ms = 0.0              # Tk 主线程每帧耗时（指数平均）
+
+        self._scale = (None, DEFAULT_SIZE)   # (尺寸键, 缩放后尺寸)，整体替换保证线程安全
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        self._scratch = threading.local()
+
+        canvas.bind("<Configure>", self._on_configure, add="+")
+
+    def _on_configure(self, event):
+        """画布尺寸变化（Tk 线程）"""
+        if event.width > 1 and event.height > 1:
+            self.canvas_size = (event.width, event.height)
+
+    def target_size(self, frame_width, frame_height):
+        """按画布大小等比缩放后的尺寸，只在尺寸变化时重新计算"""
+        canvas_size = self.canvas_size
+        key = (canvas_size, frame_width, frame_height)
+        cached_key, size = self._scale
+        if key != cached_key:
+            canvas_width, canvas_height = canvas_size
+            scale = min(canvas_width / frame_width, canvas_height / frame_height)
+            size = (int(frame_width * scale), int(frame_height * scale))
+            if size[0] <= 0 or size[1] <= 0:
+                size = DEFAULT_SIZE
+            self._scale = (key, size)
+        return size
+
+    def _get_pool(self, size):
+        """获取指定尺寸的缓冲池"""
+        with self._pools_lock:
+            pool = self._pools.get(size)
+            if pool is None:
+                # 尺寸变化后旧缓冲池不再使用
+                self._pools = {size: BufferPool(size)}
+                pool = self._pools[size]
+            return pool
+
+    def prepare(self, frame):
+        """
+        缩放并转换为 RGB（可在任意工作线程调用）
+
+        返回:
+        - PreparedFrame
+        """
+        frame_height, frame_width = frame.shape[:2]
+        size = self.target_size(frame_width, frame_height)
+        pool = self._get_pool(size)
+        rgb = pool.acquire()
+
+        if size == (frame_width, frame_height):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        else:
+            # 每个线程复用自己的缩放中间缓冲区
+            resized = getattr(self._scratch, "resized", None)
+            if resized is None or resized.shape[1::-1] != size:
+                resized = self._scratch.resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            cv2.resize(frame, size, dst=resized)
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        return PreparedFrame(rgb, size, pool)
+
+    def show(self, prepared):
+        """把准备好的帧贴到画布上（Tk 线程）"""
+        start = time.perf_counter()
+
+        image = Image.frombuffer("RGB", prepared.size, prepared.rgb, "raw", "RGB", 0, 1)
+        if self.photo is None or (self.photo.width(), self.photo.height()) != prepared.size:
+            # 只有尺寸变化时才重建 PhotoImage
+            self.photo = ImageTk.PhotoImage(image)
+            if self.item is None:
+                self.item = self.canvas.create_image(0, 0, anchor=tk.CENTER, image=self.photo)
+            else:
+                self.canvas.itemconfig(self.item, image=self.photo)
+        else:
+            self.photo.paste(image)
+
+        if self._placed_at != self.canvas_size:
+            canvas_width, canvas_height = self.canvas_size
+            self.canvas.coords(self.item, canvas_width // 2, canvas_height // 2)
+            self._placed_at = self.canvas_size
+        prepared.release()
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.ui_time_ms = elapsed_ms if self.ui_time_ms == 0 else self.ui_time_ms * 0.9 + elapsed_ms * 0.1
+
+    def display(self, frame):
+        """在 Tk 线程中直接准备并显示一帧（用于首帧等非播放场景）"""
+        self.show(self.prepare(frame))
+
+
+def legacy_update(canvas, frame, holder):
+    """旧版 update_display 的做法，作为对照"""
+    canvas_width, canvas_height = canvas.winfo_width(), canvas.winfo_height()
+    frame_height, frame_width = frame.shape[:2]
+    scale = min(canvas_width / frame_width, canvas_height / frame_height)
+    frame_resized = cv2.resize(frame, (int(frame_width * scale), int(frame_height * scale)))
+    frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
+    holder["image"] = ImageTk.PhotoImage(Image.fromarray(frame_rgb))
+    canvas.delete("all")
+    canvas.create_image(canvas_width // 2, canvas_height // 2, anchor=tk.CENTER, image=holder["image"])
+
+
+def main():
+    """对比旧版与新版每帧在 Tk 主线程上的耗时"""
+    frame_count = 120
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8) for _ in range(4)]
+
+    root = tk.Tk()
+    canvas = tk.Canvas(root, bg="black", width=960, height=540)
+    canvas.pack(fill=tk.BOTH, expand=True)
+    root.update()
+
+    holder = {}
+    start = time.perf_counter()
+    for i in range(frame_count):
+        legacy_update(canvas, frames[i % len(frames)], holder)
+        root.update()
+    legacy_ms = (time.perf_counter() - start) * 1000 / frame_count
+
+    display = TkFrameDisplay(canvas)
+    root.update()
+    # 新版的缩放与颜色转换在工作线程完成，这里预先准备好，只计 Tk 线程部分
+    prepared = [display.prepare(frames[i % len(frames)]) for i in range(frame_count)]
+    start = time.perf_counter()
+    for item in prepared:
+        display.show(item)
+        root.update()
+    new_ms = (time.perf_counter() - start) * 1000 / frame_count
+
+    root.destroy()
+    print(f"旧版 Tk 线程耗时: {legacy_ms:.2f}ms/帧")
+    print(f"新版 Tk 线程耗时: {new_ms:.2f}ms/帧")
+    if legacy_ms > 0:
+        print(f"减少: {(1 - new_ms / legacy_ms) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,14 @@ import numpy as np
 import time
 from datetime import datetime
 
+from capture_config import configure_capture, describe_capture
+from cv_backend import calibrate, create_engine, describe, get_backend_engine
+from highlight_engine import HighlightEngine, color_ratio
+from incremental import IncrementalHighlighter
+from multi_capture import DEFAULT_TILE_SIZE, Mosaic, MultiCapture
+from overlay import OverlayRenderer
+from region_stats import RegionAnalyzer, RegionRecorder
+
 class RedDominantCameraFilter:
     """摄像头实时红色突出滤镜"""
     
@@ -17,12 +25,32 @@ class RedDominantCameraFilter:
         self.camera_id = camera_id
         self.min_red_diff = min_red_diff
         self.cap = None
+        self.capture_config = None  # 协商后的采集模式
         self.is_running = False
         self.frame_count = 0
         self.start_time = None
         self.fps = 0
         self.red_percentage = 0
         
+        # 计算后端（NumPy 参考实现 / OpenCV 原语），启动时按本机实测选择
+        self.calibration = calibrate()
+        self.backend = self.calibration["backend"]
+        self.engine = create_engine(self.backend)
+        print(f"计算后端: {describe(self.calibration)}")
+        
+        # 增量模式：静态区域沿用上一帧结果，只重算变化的块
+        self.incremental = IncrementalHighlighter(self.engine)
+        self.use_incremental = False
+        
+        # 红色区域统计（连通域、外接框、质心与跟踪，写出逐帧记录）
+        self.region_analyzer = RegionAnalyzer()
+        self.region_recorder = None
+        self.region_count = 0
+        self.process_time = 0
+        
+        # 覆盖层文字贴图缓存
+        self.overlay = OverlayRenderer()
+        
     def initialize_camera(self):
         """初始化摄像头"""
         print("正在初始化摄像头...")
@@ -32,17 +60,10 @@ class RedDominantCameraFilter:
             print(f"错误：无法打开摄像头 {self.camera_id}")
             return False
         
-        # 设置摄像头参数（可选）
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv2.CAP_PROP_FPS, 30)
-        
-        # 获取实际设置
-        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        # 设置摄像头参数：探测可用模式，优先 MJPG 下的 640x480@30FPS，驱动内部只缓冲最新一帧
+        self.capture_config = configure_capture(self.cap, (640, 480), 30)
         
-        print(f"摄像头已打开: {width}x{height}, {fps}FPS")
+        print(f"摄像头已打开: {describe_capture(self.capture_config)}")
         print("按以下键操作:")
         print("  'q' - 退出程序")
         print("  's' - 保存当前帧")
@@ -50,6 +71,8 @@ class RedDominantCameraFilter:
         print("  '+' - 增加红色敏感度")
         print("  '-' - 降低红色敏感度")
         print("  'c' - 切换显示模式")
+        print("  't' - 切换增量模式（静态区域复用）")
+        print("  'a' - 开始/停止记录红色区域统计")
         print("-" * 50)
         
         return True
@@ -59,34 +82,18 @@ class RedDominantCameraFilter:
         处理单帧图像：红色不突出的像素转为黑白
         
         算法:
-        1. 分离BGR通道
-        2. 判断哪些像素红色突出 (R > G + diff 且 R > B + diff)
-        3. 红色突出的像素保留原色
-        4. 其他像素转为灰度
+        1. 判断哪些像素红色突出 (R > G + diff 且 R > B + diff，int16 比较不回绕)
+        2. 红色突出的像素保留原色
+        3. 其他像素转为灰度
         """
-        # 分离通道
-        b, g, r = cv2.split(frame)
-        
-        # 创建红色突出的掩码
-        red_dominant_mask = (r > g + self.min_red_diff) & (r > b + self.min_red_diff)
-        
-        # 计算灰度值 (使用标准灰度公式)
-        gray_values = (0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
-        
-        # 创建输出图像
-        result = np.zeros_like(frame)
-        
-        # 红色突出的像素保留原色
-        result[red_dominant_mask] = frame[red_dominant_mask]
-        
-        # 非红色突出的像素转为黑白
-        non_red_mask = ~red_dominant_mask
-        result[non_red_mask, 0] = gray_values[non_red_mask]  # B通道
-        result[non_red_mask, 1] = gray_values[non_red_mask]  # G通道
-        result[non_red_mask, 2] = gray_values[non_red_mask]  # R通道
+        # 一次完成掩码计算与灰度/彩色混合（结果为引擎缓冲区，下一帧覆盖）
+        if self.use_incremental:
+            result, red_dominant_mask = self.incremental.apply(frame, "red", self.min_red_diff, None)
+        else:
+            result, red_dominant_mask = self.engine.apply(frame, "red", self.min_red_diff, None)
         
         # 统计信息
-        self.red_percentage = np.sum(red_dominant_mask) / (frame.shape[0] * frame.shape[1]) * 100
+        self.red_percentage = color_ratio(red_dominant_mask)
         
         return result, red_dominant_mask
     
@@ -113,27 +120,31 @@ class RedDominantCameraFilter:
             output = frame.copy()
             title = "Original Only"
         
+        # 文字使用缓存的贴图，数值字段只在显示的文字变化时重新光栅化
+        text = self.overlay.text
+        field = self.overlay.field
+        white = (255, 255, 255)
+        
         # 添加标题
-        cv2.putText(output, title, (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        text(output, title, (10, 30), 0.7, (0, 255, 0), 2)
         
         # 添加统计信息
         info_y = 60
-        cv2.putText(output, f"Time: {current_time}", (10, info_y), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        cv2.putText(output, f"FPS: {self.fps:.1f}", (10, info_y + 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        cv2.putText(output, f"Frame: {self.frame_count}", (10, info_y + 60), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        cv2.putText(output, f"Red sensitivity: {self.min_red_diff}", (10, info_y + 90), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        cv2.putText(output, f"Red pixels: {self.red_percentage:.1f}%", (10, info_y + 120), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        field(output, "time", f"Time: {current_time}", (10, info_y), 0.6, white)
+        field(output, "fps", f"FPS: {self.fps:.1f}", (10, info_y + 30), 0.6, white)
+        field(output, "frame", f"Frame: {self.frame_count}", (10, info_y + 60), 0.6, white)
+        field(output, "sensitivity", f"Red sensitivity: {self.min_red_diff}", (10, info_y + 90), 0.6, white)
+        field(output, "red_pct", f"Red pixels: {self.red_percentage:.1f}%", (10, info_y + 120), 0.6, white)
+        text(output, f"Backend: {self.backend}", (10, info_y + 210), 0.6, white)
+        if self.region_recorder is not None:
+            field(output, "regions", f"Red regions: {self.region_count}", (10, info_y + 180), 0.6, white)
+        if self.use_incremental:
+            field(output, "recomputed", f"Recomputed: {self.incremental.recompute_ratio * 100:.1f}%",
+                  (10, info_y + 150), 0.6, white)
         
         # 添加帮助文本
-        help_text = "Q:Quit  S:Save  R:Reset  +/-:Sensitivity  C:Mode"
-        cv2.putText(output, help_text, (10, output.shape[0] - 20), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 200, 255), 1)
+        help_text = "Q:Quit  S:Save  R:Reset  +/-:Sensitivity  C:Mode  T:Incremental  A:Regions"
+        text(output, help_text, (10, output.shape[0] - 20), 0.5, (0, 200, 255))
         
         return output
     
@@ -168,6 +179,34 @@ class RedDominantCameraFilter:
         print(f"截图已保存: {original_filename}, {processed_filename}, {combined_filename}")
         return True
     
+    def start_region_stats(self):
+        """开始记录红色区域统计"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.region_recorder = RegionRecorder(f"red_regions_{timestamp}.csv")
+        self.process_time = 0
+        print(f"开始记录红色区域统计: {self.region_recorder.writer.path}")
+    
+    def stop_region_stats(self):
+        """停止记录红色区域统计"""
+        recorder = self.region_recorder
+        if recorder is None:
+            return
+        self.region_recorder = None
+        recorder.close()
+        avg_process = self.process_time / recorder.frames * 1000 if recorder.frames else 0
+        share = recorder.mean_ms / avg_process * 100 if avg_process > 0 else 0
+        print(f"红色区域统计已保存: {recorder.writer.path} ({recorder.frames} 帧, "
+              f"{recorder.mean_ms:.2f}ms/帧, 占处理时间 {share:.1f}%)")
+    
+    def record_regions(self, red_mask):
+        """分析红色连通区域并写出本帧记录"""
+        start = time.perf_counter()
+        regions = self.region_analyzer.analyze(red_mask)
+        elapsed = time.perf_counter() - start
+        time_ms = (time.time() - self.start_time) * 1000
+        self.region_recorder.record(self.frame_count, time_ms, self.red_percentage, regions, elapsed)
+        self.region_count = len(regions)
+    
     def run(self):
         """主运行循环"""
         if not self.initialize_camera():
@@ -190,7 +229,13 @@ class RedDominantCameraFilter:
                 break
             
             # 处理帧
+            process_start = time.perf_counter()
             processed_frame, red_mask = self.process_frame(frame)
+            self.process_time += time.perf_counter() - process_start
+            
+            # 红色区域统计
+            if self.region_recorder is not None:
+                self.record_regions(red_mask)
             
             # 更新计数
             self.frame_count += 1
@@ -238,6 +283,19 @@ class RedDominantCameraFilter:
                 modes = ["并排对比", "上下对比", "只显示处理", "只显示原始"]
                 print(f"显示模式: {modes[display_mode]}")
                 
+            elif key == ord('a'):
+                # 开始/停止记录红色区域统计
+                if self.region_recorder is None:
+                    self.start_region_stats()
+                else:
+                    self.stop_region_stats()
+                
+            elif key == ord('t'):
+                # 切换增量模式
+                self.use_incremental = not self.use_incremental
+                self.incremental.reset()
+                print(f"增量模式: {'开' if self.use_incremental else '关'}")
+                
             elif key == ord('m'):
                 # 显示红色掩码
                 red_mask_display = (red_mask * 255).astype(np.uint8)
@@ -258,6 +316,8 @@ class RedDominantCameraFilter:
             self.cap.release()
             print("摄像头已释放")
         
+        self.stop_region_stats()
+        
         cv2.destroyAllWindows()
         
         # 输出最终统计
@@ -268,6 +328,8 @@ class RedDominantCameraFilter:
         print(f"总时间: {total_time:.1f}秒")
         print(f"平均FPS: {self.frame_count/total_time:.1f}" if total_time > 0 else "平均FPS: N/A")
         print(f"最终红色像素比例: {self.red_percentage:.1f}%")
+        if self.incremental.frames > 0:
+            print(f"增量模式平均重算比例: {self.incremental.average_ratio * 100:.1f}%")
         print("程序结束")
         print("="*50)
 
@@ -292,6 +354,7 @@ def simple_camera_filter():
     
     frame_count = 0
     start_time = time.time()
+    engine = HighlightEngine()
     
     while True:
         ret, frame = cap.read()
@@ -301,19 +364,7 @@ def simple_camera_filter():
         frame_count += 1
         
         # 处理帧：红色不突出的转为黑白
-        b, g, r = cv2.split(frame)
-        
-        # 判断红色突出像素
-        red_dominant = (r > g) & (r > b)
-        
-        # 计算灰度值
-        gray = (0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
-        
-        # 创建结果
-        result = frame.copy()
-        result[~red_dominant, 0] = gray[~red_dominant]
-        result[~red_dominant, 1] = gray[~red_dominant]
-        result[~red_dominant, 2] = gray[~red_dominant]
+        result, red_dominant = engine.apply(frame, "red", 0, None)
         
         # 计算FPS
         elapsed = time.time() - start_time
@@ -323,7 +374,7 @@ def simple_camera_filter():
         cv2.putText(result, f"FPS: {fps:.1f}", (10, 30),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         
-        red_pct = np.sum(red_dominant) / (frame.shape[0] * frame.shape[1]) * 100
+        red_pct = color_ratio(red_dominant)
         cv2.putText(result, f"Red: {red_pct:.1f}%", (10, 60),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         
@@ -342,6 +393,74 @@ def simple_camera_filter():
     cv2.destroyAllWindows()
     print(f"处理了 {frame_count} 帧，平均FPS: {fps:.1f}")
 
+# 多摄像头版本
+def multi_camera_filter(sources, min_red_diff=10, tile_size=DEFAULT_TILE_SIZE):
+    """
+    多路摄像头（或视频文件）同步采集，红色滤镜结果拼成网格显示
+    
+    参数:
+    - sources: 摄像头ID或视频文件路径列表
+    - min_red_diff: 红色比其他通道的最小差值
+    - tile_size: 网格中每一格的尺寸 (宽, 高)
+    """
+    settings = {"min_red_diff": min_red_diff}
+    backend = calibrate()["backend"]
+    
+    def process(index, frame):
+        # 先缩小到格子尺寸再处理；引擎缓冲区按线程复用，结果复制后交给显示线程
+        small = cv2.resize(frame, tile_size, interpolation=cv2.INTER_AREA)
+        result, red_mask = get_backend_engine(backend).apply(small, "red", settings["min_red_diff"], None)
+        return result.copy(), color_ratio(red_mask)
+    
+    capture = MultiCapture(sources, process)
+    for source in capture.failed:
+        print(f"错误：无法打开视频源 {source}")
+    if not capture.sources:
+        return
+    
+    mosaic = Mosaic(len(capture.sources), tile_size)
+    print(f"已打开 {len(capture.sources)} 路视频源, 处理线程: {capture.workers}, 后端: {backend}")
+    print("按 'q' 退出，'s' 保存网格截图，'r' 重置统计，'+'/'-' 调整红色敏感度")
+    
+    capture.start()
+    try:
+        while capture.running:
+            frames = []
+            labels = []
+            for source, result in zip(capture.sources, capture.results()):
+                frame, red_pct = result if result is not None else (None, 0.0)
+                frames.append(frame)
+                labels.append(f"{source.name} | {source.fps:.1f} FPS | Drop {source.dropped} | Red {red_pct:.1f}%")
+            display = mosaic.compose(frames, labels)
+            cv2.putText(display, f"Skew: {capture.skew_ms():.1f}ms", (8, display.shape[0] - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+            cv2.imshow('Red Dominant Filter (Multi)', display)
+            
+            key = cv2.waitKey(15) & 0xFF
+            if key == ord('q') or key == 27:
+                break
+            elif key == ord('s'):
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                cv2.imwrite(f'multi_snapshot_{timestamp}.jpg', display)
+                print(f"截图已保存: multi_snapshot_{timestamp}.jpg")
+            elif key == ord('r'):
+                capture.reset_stats()
+                print("统计已重置")
+            elif key == ord('+') or key == ord('='):
+                settings["min_red_diff"] = min(settings["min_red_diff"] + 2, 100)
+                print(f"红色敏感度增加: {settings['min_red_diff']}")
+            elif key == ord('-') or key == ord('_'):
+                settings["min_red_diff"] = max(settings["min_red_diff"] - 2, 0)
+                print(f"红色敏感度降低: {settings['min_red_diff']}")
+    finally:
+        capture.stop()
+        cv2.destroyAllWindows()
+    
+    print("\n" + "="*50)
+    print("各路统计:")
+    print(capture.summary())
+    print("="*50)
+
 # 命令行界面
 def main():
     """主程序入口"""
@@ -358,9 +477,10 @@ def main():
         print("请选择模式：")
         print("1. 完整功能版（推荐）")
         print("2. 简化快速版")
-        print("3. 退出")
+        print("3. 多摄像头版")
+        print("4. 退出")
         
-        choice = input("请输入选择 (1-3): ").strip()
+        choice = input("请输入选择 (1-4): ").strip()
         
         if choice == '1':
             print("\n启动完整功能版...")
@@ -385,6 +505,12 @@ def main():
             simple_camera_filter()
             
         elif choice == '3':
+            sources = input("输入摄像头ID或视频文件，用逗号分隔 (默认 0,1): ").strip() or "0,1"
+            sources = [s.strip() for s in sources.split(",") if s.strip()]
+            print(f"\n启动多摄像头版 ({len(sources)} 路)...")
+            multi_camera_filter(sources)
+            
+        elif choice == '4':
             print("退出程序")
             break
             